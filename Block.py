@@ -1,15 +1,59 @@
+import math
 import time
 from hashlib import sha256
 import json
+import merkle
+
+# Nonces are stored as unsigned 64-bit integers (see HeaderStore)
+MAX_NONCE = 2 ** 64
+
+
+def _is_int(value):
+    """True for ints (bools are not block fields)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    """True for finite ints and floats."""
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value))
+
+
+def _is_hash(value):
+    """True for None or 64 hex digits (hashes, Merkle roots, targets)."""
+    if value is None:
+        return True
+    if not isinstance(value, str):
+        return False
+    try:
+        return len(bytes.fromhex(value)) == 32 and len(value) == 64
+    except ValueError:
+        return False
+
 
 # Multiple blocks linked together will make a blockchain
 class Block:
     """
     Block class representing a single block in the blockchain.
     Each block contains index, timestamp, transactions, previous hash, and nonce.
+    
+    Merkle-format blocks also carry the Merkle root of their transactions;
+    their hash covers a compact header with the root instead of the full
+    transaction list.
+    
+    Blocks mined with retargeting carry the target their hash must be below
+    (64 hex digits) and the seconds their proof of work took (solve_time),
+    both part of the hash. Legacy blocks have target and solve_time None
+    and are mined at the original fixed difficulty.
+    
+    Blocks use __slots__ to keep per-block memory low; serialize them
+    explicitly with to_dict() / from_dict().
     """
     
-    def __init__(self, index, transactions, prev_hash):
+    __slots__ = ("index", "_transactions", "_body_loader", "prev_hash",
+                 "timestamp", "nonce", "hash", "merkle_root", "target", "solve_time")
+    
+    def __init__(self, index, transactions, prev_hash, merkle=False, target=None, solve_time=None):
         """
         Initialize a new block.
         
@@ -17,13 +61,97 @@ class Block:
             index (int): Index/position of the block in the chain
             transactions (list): List of transactions/file data
             prev_hash (str): Hash of the previous block
+            merkle (bool): Use the Merkle-root header format
+            target (str): Target as 64 hex digits (None = legacy block)
+            solve_time (float): Seconds spent on the proof of work so far
+                (set together with target)
         """
         self.index = index
+        self._body_loader = None  # Loads transactions on demand (lazy blocks)
         self.transactions = transactions
         self.prev_hash = prev_hash
         self.timestamp = time.time()  # Unix timestamp when block was created
         self.nonce = 0  # Nonce for proof of work
         self.hash = None  # Will be set after mining
+        self.merkle_root = self.compute_merkle_root() if merkle else None
+        self.target = target
+        self.solve_time = solve_time
+    
+    @classmethod
+    def from_dict(cls, data, body_loader=None):
+        """
+        Rebuild a block from its dictionary form (DB document or peer JSON).
+        
+        Args:
+            data (dict): Block data as produced by to_dict(); may omit
+                transactions when a body_loader is given
+            body_loader (callable): Optional function hash -> transactions
+                used to load the body on demand
+            
+        Returns:
+            Block: Reconstructed block
+        """
+        block = cls(data["index"], data.get("transactions"), data["prev_hash"])
+        block.timestamp = data.get("timestamp", block.timestamp)
+        block.nonce = data.get("nonce", 0)
+        block.hash = data.get("hash")
+        block.merkle_root = data.get("merkle_root")
+        block.target = data.get("target")
+        block.solve_time = data.get("solve_time")
+        if body_loader is not None:
+            block.set_body_loader(body_loader)
+        return block
+    
+    @property
+    def transactions(self):
+        """List of transactions, loaded on demand for lazy blocks."""
+        if self._transactions is None and self._body_loader is not None:
+            return self._body_loader(self.hash)
+        return self._transactions
+    
+    @transactions.setter
+    def transactions(self, transactions):
+        self._transactions = transactions
+    
+    def set_body_loader(self, body_loader):
+        """
+        Drop the in-memory transactions and load them on demand instead.
+        
+        Args:
+            body_loader (callable): Function hash -> transactions
+        """
+        self._body_loader = body_loader
+        self._transactions = None
+    
+    def hash_fields(self):
+        """
+        Get the block fields that make up the hash preimage.
+        
+        Returns:
+            dict: Fields hashed by generate_hash()
+        """
+        if self.merkle_root is not None:
+            fields = {
+                "index": self.index,
+                "timestamp": self.timestamp,
+                "merkle_root": self.merkle_root,
+                "prev_hash": self.prev_hash,
+                "nonce": self.nonce
+            }
+        else:
+            fields = {
+                "index": self.index,
+                "timestamp": self.timestamp,
+                "transactions": self.transactions,
+                "prev_hash": self.prev_hash,
+                "nonce": self.nonce
+            }
+        # Only set on retargeted blocks, so legacy hashes are unchanged
+        if self.target is not None:
+            fields["target"] = self.target
+        if self.solve_time is not None:
+            fields["solve_time"] = self.solve_time
+        return fields
     
     def generate_hash(self):
         """
@@ -33,16 +161,62 @@ class Block:
             str: Hexadecimal hash string
         """
         # Combine all block data
-        block_string = json.dumps({
-            "index": self.index,
-            "timestamp": self.timestamp,
-            "transactions": self.transactions,
-            "prev_hash": self.prev_hash,
-            "nonce": self.nonce
-        }, sort_keys=True)
+        block_string = json.dumps(self.hash_fields(), sort_keys=True)
         
         return sha256(block_string.encode()).hexdigest()
     
+    def hash_template(self):
+        """
+        Split the generate_hash() preimage around the nonce.
+        
+        The preimage is prefix + str(nonce) + suffix, so a miner can
+        serialize the block once and only format the nonce per attempt.
+        
+        Returns:
+            tuple: (prefix, suffix) as bytes
+        """
+        fields = self.hash_fields()
+        fields["nonce"] = 0
+        block_string = json.dumps(fields, sort_keys=True)
+        
+        # Keys are sorted and every value before "nonce" is a number or a
+        # hex string, so the first match is the top-level nonce
+        marker = '"nonce": 0'
+        pos = block_string.index(marker) + len(marker) - 1
+        
+        return block_string[:pos].encode(), block_string[pos + 1:].encode()
+    
+    def hasher(self, raw=False):
+        """
+        Build a nonce -> hash function over a one-off serialization of the block.
+        
+        The SHA256 state over the bytes before the nonce is computed once and
+        copied for each attempt. The result is byte-compatible with
+        generate_hash() as long as the block is not modified meanwhile.
+        
+        Args:
+            raw (bool): Return the 32-byte digest instead of the hex hash
+        
+        Returns:
+            callable: Function taking a nonce and returning the hash
+        """
+        prefix, suffix = self.hash_template()
+        base = sha256(prefix)
+        
+        def hash_nonce(nonce):
+            h = base.copy()
+            h.update(b"%d" % nonce)
+            h.update(suffix)
+            return h.hexdigest()
+        
+        def digest_nonce(nonce):
+            h = base.copy()
+            h.update(b"%d" % nonce)
+            h.update(suffix)
+            return h.digest()
+        
+        return digest_nonce if raw else hash_nonce
+    
     def compute_hash(self):
         """
         Alias for generate_hash() for compatibility.
@@ -60,19 +234,116 @@ class Block:
             transaction: Transaction data to add
         """
         self.transactions.append(transaction)
+        if self.merkle_root is not None:
+            self.merkle_root = self.compute_merkle_root()
+    
+    def tx_hashes(self):
+        """
+        Get the Merkle leaf hash of every transaction.
+        
+        Returns:
+            list: Hexadecimal leaf hashes in transaction order
+        """
+        return [merkle.tx_hash(t) for t in self.transactions]
+    
+    def compute_merkle_root(self):
+        """
+        Compute the Merkle root of the block's transactions.
+        
+        Returns:
+            str: Hexadecimal Merkle root
+        """
+        return merkle.merkle_root(self.tx_hashes())
+    
+    def well_formed(self):
+        """
+        Check that every field has the type and range the chain expects.
+        
+        Blocks from peers are built straight from JSON, so this runs before
+        any other check: a string timestamp or a nonce outside 64 bits
+        would otherwise only fail once the block is being stored.
+        
+        Returns:
+            bool: True if the fields are usable
+        """
+        # Lazy blocks load their transactions on demand and were checked when stored
+        body_ok = self._body_loader is not None or isinstance(self._transactions, list)
+        
+        return (_is_int(self.index) and self.index >= 0
+                and _is_int(self.nonce) and 0 <= self.nonce < MAX_NONCE
+                and _is_number(self.timestamp)
+                and body_ok
+                and isinstance(self.prev_hash, str)
+                and _is_hash(self.hash)
+                and _is_hash(self.merkle_root)
+                and _is_hash(self.target)
+                and (self.solve_time is None or _is_number(self.solve_time)))
+    
+    def verify_transactions(self):
+        """
+        Check that the transactions match the Merkle root in the header.
+        Legacy blocks hash their transactions directly and always pass.
+        
+        Returns:
+            bool: True if the body matches the header
+        """
+        if self.merkle_root is None:
+            return True
+        return self.compute_merkle_root() == self.merkle_root
+    
+    def merkle_proof(self, position):
+        """
+        Build a Merkle inclusion proof for one transaction.
+        
+        Args:
+            position (int): Index of the transaction in the block
+            
+        Returns:
+            list: Proof steps, see merkle.merkle_proof()
+        """
+        return merkle.merkle_proof(self.tx_hashes(), position)
+    
+    def header(self):
+        """
+        Get the block header (everything except the transactions).
+        
+        Returns:
+            dict: Header fields
+        """
+        header = {
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "prev_hash": self.prev_hash,
+            "nonce": self.nonce,
+            "hash": self.hash
+        }
+        if self.merkle_root is not None:
+            header["merkle_root"] = self.merkle_root
+        if self.target is not None:
+            header["target"] = self.target
+        if self.solve_time is not None:
+            header["solve_time"] = self.solve_time
+        return header
     
-    def __dict__(self):
+    def to_dict(self):
         """
         Convert block to dictionary for JSON serialization.
         
         Returns:
             dict: Block data as dictionary
         """
-        return {
+        data = {
             "index": self.index,
             "timestamp": self.timestamp,
             "transactions": self.transactions,
             "prev_hash": self.prev_hash,
             "nonce": self.nonce,
             "hash": self.hash
-        }
\ No newline at end of file
+        }
+        if self.merkle_root is not None:
+            data["merkle_root"] = self.merkle_root
+        if self.target is not None:
+            data["target"] = self.target
+        if self.solve_time is not None:
+            data["solve_time"] = self.solve_time
+        return data
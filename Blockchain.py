@@ -1,84 +1,242 @@
 # Import libraries
 import random
-import requests
+import statistics
+from fractions import Fraction
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from Block import Block
+import merkle
+import metrics
+from mining import (parallel_p_o_w, CHECK_EVERY, SOLVE_TIME_STEP, difficulty_to_target,
+                    target_to_difficulty, target_to_hex, target_bytes, target_to_work)
+from PeerClient import PeerClient
+from ChainStore import ChainStore, BodyCache
+from HeaderStore import HeaderStore
+from Mempool import Mempool, MongoMempool, MempoolFull
+
+# Difficulty (number of leading zeros) of blocks that do not record their
+# own, i.e. every block mined before retargeting
+LEGACY_DIFFICULTY = 3
 
 class Blockchain:
     """
     Blockchain class managing the chain, pending transactions, and consensus.
     Implements proof of work with two different nonce generation strategies.
+    
+    Thread safety: the chain is copy-on-write. Writers (add_block,
+    add_blocks, consensus) hold self._lock and publish a new list, so a
+    reader that takes chain = self.chain once gets a consistent snapshot
+    without locking. The mempool and the peer set have their own locks.
+    
+    With shared=True, several processes (e.g. gunicorn workers) use one
+    chain and mempool through MongoDB: the mempool lives in the DB, each
+    height is written by the first process to claim it, and every process
+    follows the stored chain (see refresh_from_db and start_db_sync).
     """
     
-    # Difficulty for proof of work (number of leading zeros required)
-    difficulty = 3
+    # Retargeting: every retarget_window blocks, the target is scaled by
+    # the median solve time of the last blocks over target_block_time, by
+    # at most max_retarget_factor either way and within the targets of
+    # min_difficulty and max_difficulty. Solve times only count proof of
+    # work, not time spent waiting for transactions. These are consensus
+    # rules and must be the same on every node.
+    target_block_time = 10
+    retarget_window = 10
+    max_retarget_factor = 4
+    min_difficulty = 1
+    max_difficulty = 64
+    
+    # Timestamps: a block must be later than the median of the previous
+    # median_time_span blocks, must not start before its parent's proof of
+    # work ended, and must end at most max_future_drift seconds ahead of
+    # our clock
+    median_time_span = 11
+    max_future_drift = 15
+    
+    # Mining: seconds between renewals of the claim on the batch being
+    # mined (see MongoMempool.claim_ttl) and of the caller's keepalive
+    claim_renew_interval = 10
     
-    def __init__(self, db=None):
+    # Consensus: per-request timeout, deadline for a whole round (seconds)
+    # and maximum number of peers queried at the same time
+    peer_timeout = 2
+    consensus_timeout = 5
+    max_peer_fetches = 8
+    
+    # Header-first sync: page sizes served by /headers and /blocks, and how
+    # many of our verified blocks are re-requested to locate the fork point
+    max_headers_per_request = 2000
+    max_blocks_per_request = 100
+    sync_window = 16
+    
+    def __init__(self, db=None, workers=1, merkle=False, lazy=False, body_cache_bytes=64 * 1024 * 1024,
+                 max_pending=10000, pending_policy="reject", max_block_txs=500, shared=False,
+                 difficulty=LEGACY_DIFFICULTY, target_block_time=None, retarget_window=None,
+                 header_store=False):
         """
         Initialize blockchain with genesis block and sync with DB.
         
         Args:
             db: MongoDB database instance for persistence
+            workers (int): Number of processes used for mining (1 = single-threaded)
+            merkle (bool): Mine new blocks in the Merkle-root header format
+            lazy (bool): Keep only block headers in memory and load
+                transactions on demand (requires db)
+            body_cache_bytes (int): Memory budget for cached transactions in lazy mode
+            max_pending (int): Maximum number of pending transactions
+            pending_policy (str): "reject" or "evict_oldest" when the mempool is full
+            max_block_txs (int): Maximum number of transactions mined into one block
+            shared (bool): Share the chain and mempool with other processes
+                through the DB (requires db)
+            difficulty (int|float): Difficulty of the first block with a target
+            target_block_time (float): Seconds of proof of work per block that
+                retargeting aims for (0 = keep the difficulty fixed; None = class default)
+            retarget_window (int): Blocks between retargets (None = class default)
+            header_store (bool): Also keep every header in a columnar
+                HeaderStore to serve /headers from (see enable_header_store)
         """
-        self.pending = []  # Pending transactions waiting to be mined
-        self.chain = []  # The blockchain
+        self.shared = shared and db is not None
+        # Pending transactions waiting to be mined
+        if self.shared:
+            self.pending = MongoMempool(db, max_pending, pending_policy, max_block_txs)
+        else:
+            self.pending = Mempool(max_pending, pending_policy, max_block_txs)
+        self.chain = []  # The blockchain (copy-on-write, see class docstring)
         self.peers = set()  # Set of peer nodes for consensus
+        self._lock = threading.RLock()  # Serializes chain writers
+        self._peers_lock = threading.Lock()
         self.db = db
+        self.store = ChainStore(db) if db is not None else None
+        # Lazy mode: transactions live in the DB and an LRU cache
+        self.body_cache = BodyCache(self.store, body_cache_bytes) if lazy and self.store else None
+        self.workers = workers
+        self.merkle = merkle
+        # Per-chain difficulty schedule (see expected_target)
+        self.initial_difficulty = difficulty
+        if target_block_time is not None:
+            self.target_block_time = target_block_time
+        if retarget_window is not None:
+            self.retarget_window = retarget_window
+        
+        # Callbacks notified as callback(fork, blocks) whenever the chain
+        # changes from height fork onwards (see on_chain_update)
+        self.listeners = []
+        # Transactions that made it onto the chain leave the mempool,
+        # whether we mined them or a peer did
+        self.on_chain_update(self._drop_mined)
+        
+        # Shared keep-alive HTTP client for all peer traffic
+        self.client = PeerClient(timeout=Blockchain.peer_timeout)
+        
+        # Mined blocks waiting to be announced, sent by a single background
+        # thread so announcements never block the caller
+        self._outbox = []
+        self._outbox_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._announcer = ThreadPoolExecutor(max_workers=1)
+        
+        # Height of the last block known to be valid. Blocks up to here are
+        # not re-verified when comparing candidate chains from peers.
+        self.verified_height = -1
         
         # Try to load chain from DB
         loaded_chain = self.load_from_db() if self.db is not None else []
         
         if loaded_chain:
             self.chain = loaded_chain
+            # Persisted blocks were validated before they were saved
+            self.verified_height = len(self.chain) - 1
             print(f"Loaded blockchain from DB: {len(self.chain)} blocks")
         else:
             # Create genesis block
             genesis_block = Block(0, [], "0")
             genesis_block.hash = genesis_block.generate_hash()
             self.chain.append(genesis_block)
+            self.verified_height = 0
             
             # Save genesis to DB if sync available
-            if self.db is not None:
+            if self.shared and not self.store.insert_block(genesis_block):
+                # Another process created the chain first: use theirs
+                self.chain = self.load_from_db()
+                print(f"Loaded blockchain from DB: {len(self.chain)} blocks")
+            elif self.db is not None:
                 self.save_block_to_db(genesis_block)
                 print("Created and saved genesis block to DB")
-
-    def load_from_db(self):
-        """Load the blockchain from MongoDB."""
-        if self.db is None: return []
         
-        blocks_col = self.db["blocks"]
-        cursor = blocks_col.find().sort("index", 1)
+        # Optional columnar copy of every header (see enable_header_store)
+        self.headers = None
+        if header_store:
+            self.enable_header_store()
+    
+    def enable_header_store(self):
+        """
+        Keep a columnar copy of every header (HeaderStore) next to the chain
+        and serve /headers from it.
+        
+        The copy is kept in step with the chain, so it adds memory rather
+        than saving it: the Block objects stay in self.chain. It pays off
+        where headers are served a lot, since /headers then reads packed
+        arrays instead of formatting one Block per header.
+        """
+        with self._lock:
+            self.headers = HeaderStore.from_chain(self.chain)
+    
+    def _update_headers(self, fork, blocks):
+        """Replace the stored headers from height fork on (no-op without a header store)."""
+        if self.headers is not None:
+            self.headers.truncate(fork)
+            self.headers.extend(blocks)
+    
+    def load_from_db(self, start=0):
+        """Load the blockchain from MongoDB from a height on (headers only in lazy mode)."""
+        if self.store is None: return []
         
         chain = []
-        for b_data in cursor:
-            block = Block(
-                b_data["index"],
-                b_data["transactions"],
-                b_data["prev_hash"]
-            )
-            block.timestamp = b_data.get("timestamp", block.timestamp)
-            block.nonce = b_data.get("nonce", 0)
-            block.hash = b_data.get("hash")
-            chain.append(block)
+        if self.body_cache is not None:
+            for b_data in self.store.load_headers(start):
+                chain.append(Block.from_dict(b_data, body_loader=self.body_cache.get))
+        else:
+            for b_data in self.store.load(start):
+                chain.append(Block.from_dict(b_data))
         
         return chain
 
     def save_block_to_db(self, block):
-        """Save a validated block to the MongoDB blocks collection."""
-        if self.db is None: return
+        """Save a validated block to the MongoDB blocks collection (idempotent upsert)."""
+        if self.store is None: return
         
-        blocks_col = self.db["blocks"]
-        # Check if block already exists to avoid duplicates
-        if blocks_col.find_one({"index": block.index}):
+        self.store.save_block(block)
+        self.release_body(block)
+    
+    def release_body(self, block):
+        """
+        In lazy mode, move a persisted block's transactions into the body
+        cache so the block itself only keeps its header.
+        
+        Args:
+            block (Block): Block already saved to the DB
+        """
+        if self.body_cache is None or block.hash is None:
             return
-            
-        blocks_col.insert_one({
-            "index": block.index,
-            "timestamp": block.timestamp,
-            "transactions": block.transactions,
-            "prev_hash": block.prev_hash,
-            "nonce": block.nonce,
-            "hash": block.hash
-        })
+        
+        self.body_cache.put(block.hash, block.transactions)
+        block.set_body_loader(self.body_cache.get)
+    
+    def save_chain_to_db(self, start):
+        """
+        Persist our chain from a given height to the tip in one bulk write,
+        dropping any stored blocks past the tip.
+        
+        Args:
+            start (int): First height that changed
+        """
+        if self.store is None: return
+        
+        blocks = self.chain[start:]
+        self.store.replace_range(blocks)
+        for block in blocks:
+            self.release_body(block)
     
     def add_block(self, block, hashl):
         """
@@ -91,62 +249,253 @@ class Blockchain:
         Returns:
             bool: True if block was added, False otherwise
         """
-        if prev_hash == block.prev_hash and self.is_valid(block, hashl):
-            block.hash = hashl
-            self.chain.append(block)
-            # Sync with DB
-            self.save_block_to_db(block)
-            return True
-        return False
+        with self._lock:
+            prev_hash = self.last_block().hash
+            if prev_hash != block.prev_hash and self.shared and self.refresh_from_db():
+                # Another process extended the chain; check against its tip
+                prev_hash = self.last_block().hash
+            
+            with metrics.VALIDATION_SECONDS.time(kind="block"):
+                valid = (block.well_formed()
+                         and prev_hash == block.prev_hash and block.index == len(self.chain)
+                         and self.check_timestamp(block, self.chain)
+                         and self.check_difficulty(block, self.chain)
+                         and self.is_valid(block, hashl) and block.verify_transactions())
+            metrics.VALIDATED_BLOCKS.inc(kind="block")
+            if valid:
+                block.hash = hashl
+                return self._append([block]) == 1
+            return False
     
-    def mine(self):
+    def _append(self, blocks):
         """
-        Mine pending transactions into a new block.
+        Publish validated blocks on top of the chain, persist them and
+        notify the listeners. Must be called with self._lock held.
+        
+        In shared mode each block is only kept if no other process stored
+        a block at its height first; we then follow the stored chain.
+        
+        Args:
+            blocks (list): Validated blocks extending the current tip
+            
+        Returns:
+            int: Number of blocks appended
+        """
+        stored = len(blocks)
+        if self.shared:
+            for position, block in enumerate(blocks):
+                if not self.store.insert_block(block):
+                    stored = position
+                    break
+        
+        if stored:
+            appended = blocks[:stored]
+            fork = len(self.chain)
+            # Headers first: extend() leaves the store unchanged if it fails,
+            # so the chain is never published without its headers
+            if self.headers is not None:
+                self.headers.extend(appended)
+            self.chain = self.chain + appended
+            self.verified_height = len(self.chain) - 1
+            # Sync with DB (already stored in shared mode)
+            for block in appended:
+                if self.shared:
+                    self.release_body(block)
+                else:
+                    self.save_block_to_db(block)
+            self._notify(fork, appended)
+        
+        if stored < len(blocks):
+            # Lost a height to another process: adopt the stored chain
+            self.refresh_from_db()
+        return stored
+    
+    def on_chain_update(self, callback):
+        """
+        Register a callback for chain changes.
+        
+        The callback is called as callback(fork, blocks) after a block is
+        appended or the chain is replaced, where fork is the first height
+        that changed and blocks are the new blocks from there to the tip.
+        
+        Args:
+            callback (callable): Function to notify
+        """
+        self.listeners.append(callback)
+    
+    def _notify(self, fork, blocks):
+        """Call every chain update listener, isolating their errors."""
+        for callback in self.listeners:
+            try:
+                callback(fork, blocks)
+            except Exception as e:
+                print(f"Error in chain update listener: {e}")
+    
+    def _drop_mined(self, fork, blocks):
+        """Remove the transactions of new chain blocks from the mempool."""
+        for block in blocks:
+            self.pending.remove(block.transactions)
+    
+    def add_blocks(self, blocks):
+        """
+        Add a batch of consecutive blocks received from a peer, in order.
+        Stops at the first block that does not fit on our chain.
         
+        Args:
+            blocks (list): Blocks with their hash set
+            
         Returns:
-            int|bool: Index of mined block, or False if no pending transactions
+            int: Number of blocks added
         """
-        if len(self.pending) > 0:
-            last_block = self.last_block()
+        with self._lock:
+            if self.shared:
+                self.refresh_from_db()
+            prev_hash = self.last_block().hash
+            # Our chain followed by the blocks accepted so far, for difficulty checks
+            extended = list(self.chain)
+            accepted = []
+            with metrics.VALIDATION_SECONDS.time(kind="blocks"):
+                for block in blocks:
+                    if (not block.well_formed() or block.hash is None or block.prev_hash != prev_hash
+                            or block.index != len(extended)
+                            or not self.check_timestamp(block, extended)
+                            or not self.check_difficulty(block, extended)
+                            or not self.is_valid(block, block.hash)
+                            or not block.verify_transactions()):
+                        break
+                    accepted.append(block)
+                    extended.append(block)
+                    prev_hash = block.hash
+            metrics.VALIDATED_BLOCKS.inc(min(len(accepted) + 1, len(blocks)), kind="blocks")
             
+            return self._append(accepted) if accepted else 0
+    
+    def mine(self, cancel=None, keepalive=None):
+        """
+        Mine pending transactions into a new block.
+        At most max_block_txs transactions are taken, highest priority first;
+        the rest stay in the mempool for the next block.
+        
+        The batch is taken from the mempool atomically, so concurrent
+        miners never mine the same transactions. The proof of work is
+        abandoned as soon as the chain tip changes (a peer block or
+        consensus replaced it) or cancel is set, and the batch is put back
+        at the front of the mempool.
+        
+        While searching, the claim on the batch is renewed every
+        claim_renew_interval seconds, and so is whatever keepalive holds
+        (e.g. the miner's lease). Mining is abandoned if either was lost.
+        
+        Args:
+            cancel (threading.Event): Set to abort mining
+            keepalive (callable): Called with every renewal; returning
+                False abandons mining
+        
+        Returns:
+            Block|None: The mined block, or None if no pending transactions,
+                mining was abandoned or the block could not be added
+        """
+        # Transactions added while mining go to the next block
+        batch = self.pending.take()
+        if not batch:
+            return None
+        
+        chain = self.chain
+        last_block = chain[-1]
+        
+        renew_at = [time.monotonic() + self.claim_renew_interval]
+        
+        def stale():
+            if (cancel is not None and cancel.is_set()) or self.last_block() is not last_block:
+                return True
+            if time.monotonic() >= renew_at[0]:
+                renew_at[0] = time.monotonic() + self.claim_renew_interval
+                if self.pending.renew(batch) < len(batch):
+                    return True
+                if keepalive is not None and not keepalive():
+                    return True
+            return False
+        
+        mined = False
+        start = time.perf_counter()
+        try:
             # Create new block
             new_block = Block(
                 last_block.index + 1,
-                self.pending,
-                last_block.hash
+                list(batch),
+                last_block.hash,
+                merkle=self.merkle,
+                target=target_to_hex(self.expected_target(chain, len(chain))),
+                solve_time=0.0
             )
+            # A block cannot start before its parent's proof of work ended,
+            # even if the parent's miner's clock runs ahead of ours
+            new_block.timestamp = max(new_block.timestamp,
+                                      last_block.timestamp + (last_block.solve_time or 0))
             
-            # Run proof of work (using random nonce by default)
-            hashl = self.p_o_w(new_block)
-            
-            # Add block to chain
-            self.add_block(new_block, hashl)
-            
-            # Clear pending transactions
-            self.pending = []
+            # Run proof of work (random nonce, or parallel search if configured)
+            if self.workers > 1:
+                hashl = self.p_o_w_parallel(new_block, stop=stale)
+            else:
+                hashl = self.p_o_w(new_block, stop=stale)
             
-            return new_block.index
-        return False
+            # Add block to chain; the mined transactions leave the mempool
+            # through the chain update listener
+            mined = hashl is not None and self.add_block(new_block, hashl)
+        finally:
+            if not mined:
+                self.pending.requeue(batch)
+            metrics.MINING_SECONDS.observe(time.perf_counter() - start,
+                                           outcome="mined" if mined else "abandoned")
+        
+        return new_block if mined else None
     
-    def p_o_w(self, block):
+    def p_o_w(self, block, stop=None):
         """
         Proof of Work using random nonce generation.
         This method provides better security and performance at higher difficulties.
         
+        Blocks that record a solve time get it updated every SOLVE_TIME_STEP
+        seconds while searching, so it ends up close to the time the search took.
+        
         Args:
             block (Block): Block to mine
+            stop (callable): Polled every CHECK_EVERY attempts; returning
+                True abandons the search
             
         Returns:
-            str: Valid hash meeting difficulty requirement
+            str|None: Valid hash below the block's target, or None if stopped
         """
-        block.nonce = 0
-        get_hash = block.generate_hash()
+        # Serialize the block once; each attempt only formats the nonce and
+        # compares the raw digest with the target bytes
+        hash_nonce = block.hasher(raw=True)
+        target = target_bytes(self.block_target(block))
         
-        while not get_hash.startswith("0" * Blockchain.difficulty):
-            block.nonce = random.randint(0, 99999999)
-            get_hash = block.generate_hash()
+        start = time.perf_counter()
+        solve_time = block.solve_time
+        next_step = start + SOLVE_TIME_STEP
+        nonce = 0
+        digest = hash_nonce(nonce)
         
-        return get_hash
+        attempts = 0
+        while digest >= target:
+            attempts += 1
+            if attempts % CHECK_EVERY == 0:
+                if stop is not None and stop():
+                    metrics.observe_pow("random", attempts, time.perf_counter() - start)
+                    return None
+                now = time.perf_counter()
+                if solve_time is not None and now >= next_step:
+                    # New solve time, new preimage
+                    block.solve_time = round(solve_time + now - start, 2)
+                    hash_nonce = block.hasher(raw=True)
+                    next_step = now + SOLVE_TIME_STEP
+            nonce = random.randint(0, 99999999)
+            digest = hash_nonce(nonce)
+        
+        metrics.observe_pow("random", attempts + 1, time.perf_counter() - start)
+        block.nonce = nonce
+        return digest.hex()
     
     def p_o_w_2(self, block):
         """
@@ -157,29 +506,88 @@ class Blockchain:
             block (Block): Block to mine
             
         Returns:
-            str: Valid hash meeting difficulty requirement
+            str: Valid hash below the block's target
+        """
+        hash_nonce = block.hasher(raw=True)
+        target = target_bytes(self.block_target(block))
+        
+        start = time.perf_counter()
+        nonce = 0
+        digest = hash_nonce(nonce)
+        
+        while digest >= target:
+            nonce += 1
+            digest = hash_nonce(nonce)
+        
+        metrics.observe_pow("incremental", nonce + 1, time.perf_counter() - start)
+        block.nonce = nonce
+        return digest.hex()
+    
+    def p_o_w_parallel(self, block, stop=None):
+        """
+        Proof of Work using a multi-process nonce search.
+        The nonce space is split into disjoint ranges across self.workers
+        processes; the first valid hash stops the others.
+        
+        Blocks that record a solve time get it updated every SOLVE_TIME_STEP
+        seconds, restarting the workers on the new hash template.
+        
+        Args:
+            block (Block): Block to mine
+            stop (callable): Polled while searching; returning True abandons the search
+            
+        Returns:
+            str|None: Valid hash below the block's target, or None if stopped
         """
-        block.nonce = 0
-        get_hash = block.generate_hash()
+        start = time.perf_counter()
+        solve_time = block.solve_time
         
-        while not get_hash.startswith("0" * Blockchain.difficulty):
-            block.nonce += 1
-            get_hash = block.generate_hash()
+        while True:
+            round_start = time.perf_counter()
+            stepped = []
+            
+            def halt():
+                if stop is not None and stop():
+                    return True
+                if solve_time is not None and time.perf_counter() - round_start >= SOLVE_TIME_STEP:
+                    stepped.append(True)
+                    return True
+                return False
+            
+            result = parallel_p_o_w(block, self.block_target(block), self.workers, stop=halt)
+            if result is not None:
+                break
+            if not stepped:
+                return None
+            block.solve_time = round(solve_time + time.perf_counter() - start, 2)
+        
+        nonce, get_hash = result
+        # Workers scan the nonce space from 0 in round-robin chunks, so
+        # roughly every nonce below the winner was tried in the last round
+        metrics.observe_pow("parallel", nonce + 1, time.perf_counter() - round_start)
+        block.nonce = nonce
         
         return get_hash
     
-    def add_pending(self, transaction):
+    def add_pending(self, transaction, priority=0):
         """
-        Add a new transaction to pending list.
+        Add a new transaction to the mempool.
         
         Args:
             transaction: Transaction data to add
+            priority (int): Higher priorities are mined first
+            
+        Returns:
+            bool: True if added, False if it was already pending
+            
+        Raises:
+            MempoolFull: The mempool is full and rejects new transactions
         """
-        self.pending.append(transaction)
+        return self.pending.add(transaction, priority)
     
     def check_chain_validity(self, chain):
         """
-        Check if a given chain is valid.
+        Check if a given chain is valid, starting from genesis.
         
         Args:
             chain (list): List of blocks to validate
@@ -187,21 +595,101 @@ class Blockchain:
         Returns:
             bool: True if chain is valid, False otherwise
         """
-        result = True
         prev_hash = "0"
         
-        for block in chain:
-            block_hash = block.hash
+        with metrics.VALIDATION_SECONDS.time(kind="chain"):
+            for position, block in enumerate(chain):
+                if not self.verify_block(block, prev_hash, position, chain):
+                    return False
+                prev_hash = block.hash
+        metrics.VALIDATED_BLOCKS.inc(len(chain), kind="chain")
+        
+        return True
+    
+    def verify_block(self, block, prev_hash, position, chain):
+        """
+        Verify a single block given the hash of the block before it.
+        
+        The genesis block is not mined, so it only has to hash correctly.
+        
+        Args:
+            block (Block): Block to verify
+            prev_hash (str): Hash of the preceding block ("0" for genesis)
+            position (int): Expected index of the block
+            chain (list): Chain the block belongs to (at least up to position - 1),
+                used to check its timestamp and difficulty
+            
+        Returns:
+            bool: True if the block is valid at this position
+        """
+        if (not block.well_formed() or block.index != position or block.prev_hash != prev_hash
+                or block.hash is None):
+            return False
+        
+        if position == 0:
+            hash_ok = block.generate_hash() == block.hash
+        else:
+            hash_ok = (self.check_timestamp(block, chain) and self.check_difficulty(block, chain)
+                       and self.is_valid(block, block.hash))
+        
+        # Verify the body matches the header
+        return hash_ok and block.verify_transactions()
+    
+    def fork_point(self, chain, ours=None):
+        """
+        Find how many leading blocks a candidate chain shares with ours.
+        
+        Only our verified blocks are considered, and blocks are compared by
+        hash. Since every hash commits to the previous one, the shared part
+        is a prefix and can be found by binary search.
+        
+        Args:
+            chain (list): Candidate chain
+            ours (list): Snapshot of our chain (defaults to the current one)
             
-            # Verify hash validity and linkage
-            if self.is_valid(block, block.hash) and prev_hash == block.prev_hash:
-                block.hash = block_hash
-                prev_hash = block_hash
+        Returns:
+            int: Length of the common prefix
+        """
+        ours = self.chain if ours is None else ours
+        lo = 0
+        hi = min(len(chain), self.verified_height + 1, len(ours))
+        
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if chain[mid - 1].hash == ours[mid - 1].hash:
+                lo = mid
             else:
-                result = False
-                break
+                hi = mid - 1
+        
+        return lo
+    
+    def validate_candidate(self, chain, ours=None):
+        """
+        Incrementally validate a candidate chain against our verified chain.
+        
+        Blocks in the common prefix are taken from our own chain, so only
+        the blocks past the fork point are verified.
+        
+        Args:
+            chain (list): Candidate chain (full, from genesis)
+            ours (list): Snapshot of our chain (defaults to the current one)
+            
+        Returns:
+            list|None: The validated chain, or None if it is invalid
+        """
+        ours = self.chain if ours is None else ours
+        fork = self.fork_point(chain, ours)
+        prev_hash = ours[fork - 1].hash if fork > 0 else "0"
+        
+        with metrics.VALIDATION_SECONDS.time(kind="candidate"):
+            for position in range(fork, len(chain)):
+                block = chain[position]
+                metrics.VALIDATED_BLOCKS.inc(kind="candidate")
+                if not self.verify_block(block, prev_hash, position, chain):
+                    return None
+                prev_hash = block.hash
         
-        return result
+        return ours[:fork] + chain[fork:]
     
     def is_valid(self, block, block_hash):
         """
@@ -214,12 +702,199 @@ class Blockchain:
         Returns:
             bool: True if hash is valid, False otherwise
         """
-        # Check if hash meets difficulty requirement
-        if block_hash.startswith("0" * Blockchain.difficulty):
-            # Verify hash matches block data
-            if block.generate_hash() == block_hash:
-                return True
-        return False
+        # Verify hash matches block data
+        if block.generate_hash() != block_hash:
+            return False
+        # Check the hash is below the target the block was mined at; for
+        # legacy blocks this is the same as the leading-zeros check
+        return int(block_hash, 16) < self.block_target(block)
+    
+    @staticmethod
+    def block_target(block):
+        """
+        Get the target a block's hash has to be below.
+        
+        Args:
+            block (Block): Block to check
+            
+        Returns:
+            int: The block's target, or the one of LEGACY_DIFFICULTY for legacy blocks
+        """
+        if block.target is not None:
+            return int(block.target, 16)
+        return difficulty_to_target(LEGACY_DIFFICULTY)
+    
+    @property
+    def difficulty(self):
+        """Difficulty (leading hex zeros, fractional) of the next block mined on our chain."""
+        chain = self.chain
+        return target_to_difficulty(self.expected_target(chain, len(chain)))
+    
+    def _retarget_solve_time(self, chain, height):
+        """
+        Get the median solve time of the blocks before a retarget height.
+        
+        Args:
+            chain (list): Blocks up to at least height - 1
+            height (int): Height of the block
+            
+        Returns:
+            float|None: Median solve time in seconds, or None if the target
+                does not change at this height
+        """
+        window = self.retarget_window
+        if not self.target_block_time or window < 1 or height % window != 0 or height - window < 1:
+            return None
+        
+        # Genesis and legacy blocks record no solve time
+        solve_times = [chain[i].solve_time for i in range(height - window, height)]
+        if None in solve_times:
+            return None
+        return statistics.median(solve_times)
+    
+    def expected_target(self, chain, height):
+        """
+        Compute the target a block at a height must be mined at.
+        
+        The first block with a target, after genesis or legacy blocks,
+        starts at the initial difficulty. After that every block keeps its parent's target,
+        except at multiples of retarget_window: there the target is scaled
+        by the median solve time of the last retarget_window blocks over
+        target_block_time, by at most max_retarget_factor either way.
+        
+        Args:
+            chain (list): Blocks up to at least height - 1
+            height (int): Height of the block (at least 1)
+            
+        Returns:
+            int: Required target
+        """
+        parent = chain[height - 1]
+        if parent.target is None:
+            return difficulty_to_target(self.initial_difficulty)
+        
+        target = int(parent.target, 16)
+        solve_time = self._retarget_solve_time(chain, height)
+        if solve_time is None:
+            return target
+        
+        # Exact rational arithmetic, so every node computes the same target
+        factor = Fraction(self.max_retarget_factor)
+        ratio = Fraction(solve_time) / Fraction(self.target_block_time) if solve_time > 0 else 1 / factor
+        ratio = max(1 / factor, min(factor, ratio))
+        target = target * ratio.numerator // ratio.denominator
+        
+        return max(difficulty_to_target(self.max_difficulty), min(difficulty_to_target(self.min_difficulty), target))
+    
+    def check_difficulty(self, block, chain):
+        """
+        Check that a block declares the target expected at its height.
+        
+        Legacy blocks (no target) are only accepted on top of genesis or
+        other legacy blocks, so old chains still validate but a chain cannot
+        go back to the fixed difficulty once it retargets. Blocks with a
+        target must record their solve time, which later retargets use.
+        
+        Args:
+            block (Block): Block to check (not genesis)
+            chain (list): Chain the block extends (at least up to block.index - 1)
+            
+        Returns:
+            bool: True if the target is the expected one
+        """
+        if block.target is None:
+            return block.solve_time is None and chain[block.index - 1].target is None
+        return (block.solve_time is not None
+                and block.target == target_to_hex(self.expected_target(chain, block.index)))
+    
+    def check_timestamp(self, block, chain):
+        """
+        Check that a block's timestamp is later than the median timestamp
+        of the median_time_span blocks before it (fewer near genesis) and
+        not earlier than the end of its parent's proof of work (timestamp
+        plus solve time), and that its solve time is not negative and does
+        not end more than max_future_drift seconds ahead of our clock.
+        
+        The median lets honest clocks disagree a little. Chaining each
+        block's start to its parent's end means the solve times claimed
+        along a chain add up to at most the time that really passed since
+        genesis, plus max_future_drift, so a miner cannot claim more solve
+        time than it spent to lower the difficulty.
+        
+        Args:
+            block (Block): Block to check (not genesis)
+            chain (list): Chain the block extends (at least up to block.index - 1)
+        
+        Returns:
+            bool: True if the timestamp is acceptable
+        """
+        start = max(0, block.index - self.median_time_span)
+        past = statistics.median(chain[i].timestamp for i in range(start, block.index))
+        parent = chain[block.index - 1]
+        parent_end = parent.timestamp + (parent.solve_time or 0)
+        solve_time = block.solve_time or 0
+        return (past < block.timestamp and parent_end <= block.timestamp and solve_time >= 0
+                and block.timestamp + solve_time <= time.time() + self.max_future_drift)
+    
+    def chain_work(self, blocks):
+        """
+        Sum the proof of work that went into blocks.
+        
+        Args:
+            blocks (iterable): Blocks or part of a chain (genesis counts nothing)
+        
+        Returns:
+            int: Expected number of hashes, see mining.target_to_work()
+        """
+        return sum(target_to_work(self.block_target(block)) for block in blocks if block.index > 0)
+    
+    def work_gain(self, chain, ours=None):
+        """
+        Get how much more work a candidate chain has than ours.
+        Only the blocks past the common prefix are summed.
+        
+        Args:
+            chain (list): Candidate chain (full, from genesis)
+            ours (list): Snapshot of our chain (defaults to the current one)
+        
+        Returns:
+            int: Work of the candidate minus ours (positive if it is heavier)
+        """
+        ours = self.chain if ours is None else ours
+        fork = self.fork_point(chain, ours)
+        return self.chain_work(chain[fork:]) - self.chain_work(ours[fork:])
+    
+    def merkle_proof(self, block_index, position):
+        """
+        Build an inclusion proof for one transaction of a Merkle-format block.
+        
+        Args:
+            block_index (int): Index of the block in the chain
+            position (int): Index of the transaction within the block
+        
+        Returns:
+            dict|None: Block header, transaction, leaf hash and proof steps,
+                or None if the block/transaction does not exist or the block
+                uses the legacy format
+        """
+        chain = self.chain
+        if block_index < 0 or block_index >= len(chain):
+            return None
+        
+        block = chain[block_index]
+        if block.merkle_root is None:
+            return None
+        if position < 0 or position >= len(block.transactions):
+            return None
+        
+        transaction = block.transactions[position]
+        return {
+            "block": block.header(),
+            "position": position,
+            "transaction": transaction,
+            "tx_hash": merkle.tx_hash(transaction),
+            "proof": block.merkle_proof(position)
+        }
     
     def last_block(self):
         """
@@ -230,6 +905,103 @@ class Blockchain:
         """
         return self.chain[-1]
     
+    # ========== SHARED STATE ==========
+    
+    def refresh_from_db(self):
+        """
+        Catch up with the chain stored in the DB by other processes.
+        
+        Compares the stored tip with ours (one indexed query) and, if they
+        differ, loads the stored blocks from the fork point on. Stored
+        blocks were validated by the process that wrote them, but one may
+        have been written on top of a parent that another process replaced
+        in the meantime: blocks from the first one that does not link to
+        the block below it are dropped from the store instead.
+        
+        Returns:
+            bool: True if our chain changed
+        """
+        if self.store is None:
+            return False
+        
+        tip = self.store.tip()
+        chain = self.chain
+        if tip is None or (tip["index"] == len(chain) - 1 and tip["hash"] == chain[-1].hash):
+            return False
+        
+        with self._lock:
+            chain = self.chain
+            # Look for the fork near our tip first, then further back
+            window = Blockchain.sync_window
+            while True:
+                start = max(0, min(len(chain), tip["index"] + 1) - window)
+                stored = self.load_from_db(start)
+                fork = start
+                for block in stored:
+                    if block.index >= len(chain) or block.hash != chain[block.index].hash:
+                        break
+                    fork = block.index + 1
+                if fork > start or start == 0:
+                    break
+                window *= 2
+            
+            blocks = [block for block in stored if block.index >= fork]
+            prev_hash = chain[fork - 1].hash if fork > 0 else "0"
+            for position, block in enumerate(blocks):
+                if block.prev_hash != prev_hash:
+                    print(f"Dropping stored blocks from height {block.index}: not linked to the chain")
+                    self.store.delete_blocks(blocks[position:])
+                    blocks = blocks[:position]
+                    break
+                prev_hash = block.hash
+            if (not blocks and fork == len(chain)) or fork + len(blocks) == 0:
+                return False
+            
+            self.chain = chain[:fork] + blocks
+            self._update_headers(fork, blocks)
+            self.verified_height = len(self.chain) - 1
+            for block in blocks:
+                self.release_body(block)
+            self._notify(fork, blocks)
+            return True
+    
+    def start_db_sync(self, interval=1.0):
+        """
+        Follow the stored chain in a background thread.
+        
+        Uses a MongoDB change stream when the server supports it (replica
+        sets, Atlas) so new blocks are picked up right away, and checks the
+        stored tip every interval seconds in any case.
+        
+        Args:
+            interval (float): Seconds between checks
+        """
+        thread = threading.Thread(target=self._db_sync_loop, args=(interval,),
+                                  name="chain-db-sync", daemon=True)
+        thread.start()
+        return thread
+    
+    def _db_sync_loop(self, interval):
+        """Background loop of start_db_sync()."""
+        try:
+            with self.store.col.watch(max_await_time_ms=int(interval * 1000)) as stream:
+                while True:
+                    stream.try_next()
+                    self._safe_refresh()
+        except Exception as e:
+            print(f"Change stream unavailable ({e}), polling the chain tip every {interval}s")
+        
+        while True:
+            time.sleep(interval)
+            self._safe_refresh()
+    
+    def _safe_refresh(self):
+        """refresh_from_db() for background use: errors are logged, not raised."""
+        try:
+            self.refresh_from_db()
+        except Exception as e:
+            print(f"Error refreshing chain from DB: {e}")
+    
     # ========== CONSENSUS MECHANISM ==========
     
     def register_peer(self, peer_address):
@@ -239,76 +1011,343 @@ class Blockchain:
         Args:
             peer_address (str): URL of peer node (e.g., "http://127.0.0.1:8801")
         """
-        self.peers.add(peer_address)
+        with self._peers_lock:
+            self.peers.add(peer_address)
+    
+    def peer_list(self):
+        """
+        Get a snapshot of the registered peers.
+        
+        Returns:
+            list: Peer URLs
+        """
+        with self._peers_lock:
+            return list(self.peers)
+    
+    def get_headers(self, start, limit=None):
+        """
+        Get block headers starting at a given height.
+        
+        Args:
+            start (int): Height of the first header
+            limit (int): Maximum number of headers (capped by max_headers_per_request)
+            
+        Returns:
+            list: Header dictionaries, see Block.header()
+        """
+        limit = min(limit or Blockchain.max_headers_per_request, Blockchain.max_headers_per_request)
+        start = max(start, 0)
+        if self.headers is None:
+            return [block.header() for block in self.chain[start:start + limit]]
+        with self._lock:
+            return self.headers.headers(start, limit)
+    
+    def get_blocks(self, start, end=None):
+        """
+        Get full blocks (with transactions) for a height range.
+        
+        Args:
+            start (int): Height of the first block
+            end (int): Height after the last block (capped by max_blocks_per_request)
+            
+        Returns:
+            list: Block dictionaries
+        """
+        chain = self.chain
+        start = max(start, 0)
+        end = min(end if end is not None else len(chain), start + Blockchain.max_blocks_per_request)
+        return [block.to_dict() for block in chain[start:end]]
+    
+    def _fetch_headers(self, peer, start):
+        """
+        Page through a peer's headers from a given height to its tip.
+        
+        Args:
+            peer (str): URL of peer node
+            start (int): Height of the first header
+            
+        Returns:
+            tuple: (headers, peer chain length), or (None, None) if the peer
+                does not serve headers
+        """
+        headers = []
+        length = None
+        
+        while length is None or start + len(headers) < length:
+            response = self.client.get(peer, "/headers",
+                                       params={"start": start + len(headers)},
+                                       timeout=Blockchain.peer_timeout)
+            if response.status_code != 200:
+                return None, None
+            
+            data = response.json()
+            length = data["length"]
+            if not data["headers"]:
+                break
+            headers.extend(data["headers"])
+        
+        return headers, length
+    
+    def _header_fork(self, headers, start, chain):
+        """
+        Find the length of the common prefix between our chain and a
+        peer's headers starting at height start.
+        
+        Returns:
+            int|None: Common prefix length, or None if no header in the
+                range matches one of our verified blocks
+        """
+        top = min(start + len(headers), self.verified_height + 1, len(chain))
+        
+        for height in range(top - 1, start - 1, -1):
+            if headers[height - start]["hash"] == chain[height].hash:
+                return height + 1
+        
+        return None
+    
+    def sync_peer_chain(self, peer):
+        """
+        Header-first sync with one peer.
+        
+        Fetches the peer's headers near our tip to locate the fork point,
+        widening the window if the fork is deeper, then downloads only the
+        block bodies past it. Falls back to the full /chain for peers
+        without the header API.
+        
+        Args:
+            peer (str): URL of peer node
+            
+        Returns:
+            list|None: Our prefix followed by the peer's blocks past the fork,
+                or None if the peer has no chain with more work to offer
+        """
+        try:
+            chain = self.chain
+            tip = min(self.verified_height, len(chain) - 1)
+            window = Blockchain.sync_window
+            
+            while True:
+                start = max(0, tip - window + 1)
+                headers, length = self._fetch_headers(peer, start)
+                if headers is None:
+                    candidate = self.fetch_peer_chain(peer)
+                    return candidate if candidate and self.work_gain(candidate, chain) > 0 else None
+                if start + len(headers) != length:
+                    return None
+                
+                fork = self._header_fork(headers, start, chain)
+                if fork is not None or start == 0:
+                    break
+                # Fork is older than the window: look twice as far back
+                window *= 2
+            fork = fork or 0
+            
+            # Only download bodies if the peer's headers past the fork claim
+            # more work than our blocks there (checked again on the bodies)
+            claimed = self.chain_work(Block.from_dict(header) for header in headers[fork - start:])
+            if claimed <= self.chain_work(chain[fork:]):
+                return None
+            
+            # Download only the bodies past the fork point
+            bodies = []
+            while fork + len(bodies) < length:
+                height = fork + len(bodies)
+                response = self.client.get(peer, "/blocks",
+                                           params={"start": height, "end": length},
+                                           timeout=Blockchain.peer_timeout)
+                if response.status_code != 200:
+                    return None
+                
+                page = response.json()["blocks"]
+                if not page:
+                    return None
+                
+                for block_data in page:
+                    block = Block.from_dict(block_data)
+                    # The peer's chain must not have changed under us
+                    if block.hash != headers[fork + len(bodies) - start]["hash"]:
+                        return None
+                    bodies.append(block)
+            
+            candidate = chain[:fork] + bodies
+            return candidate if self.work_gain(candidate, chain) > 0 else None
+        except Exception as e:
+            # Skip peer if unreachable
+            print(f"Error syncing with peer {peer}: {e}")
+            return None
+    
+    def fetch_peer_chain(self, peer):
+        """
+        Download and rebuild a peer's full chain through /chain.
+        
+        Args:
+            peer (str): URL of peer node
+            
+        Returns:
+            list|None: The peer's chain, or None if it could not be fetched
+        """
+        try:
+            response = self.client.get(peer, "/chain", timeout=Blockchain.peer_timeout)
+            if response.status_code != 200:
+                return None
+            
+            data = response.json()
+            chain_data = data['chain']
+            if data['length'] != len(chain_data):
+                return None
+            
+            # Reconstruct chain from JSON
+            chain = []
+            for block_data in chain_data:
+                chain.append(Block.from_dict(block_data))
+            return chain
+        except Exception as e:
+            # Skip peer if unreachable
+            print(f"Error connecting to peer {peer}: {e}")
+            return None
     
     def consensus(self):
         """
-        Consensus algorithm - longest chain wins.
-        Replaces our chain with the longest valid chain from peers.
+        Consensus algorithm - the chain with the most work wins.
+        Replaces our chain with the valid peer chain with the most
+        cumulative proof of work (sum of about 2**256 / target per block),
+        so a longer chain of easy blocks does not beat a harder one.
+        
+        All peers are queried at once, bounded by max_peer_fetches, and
+        the round is cut off after consensus_timeout seconds. Each peer is
+        synced header-first, so only blocks past the fork are downloaded.
+        Candidate chains are then validated heaviest-first until one passes.
         
         Returns:
             bool: True if chain was replaced, False otherwise
         """
-        longest_chain = None
-        current_len = len(self.chain)
+        peers = self.peer_list()
+        if not peers:
+            return False
         
-        # Check all peer nodes
-        for peer in self.peers:
-            try:
-                response = requests.get(f"{peer}/chain", timeout=2)
-                if response.status_code == 200:
-                    data = response.json()
-                    length = data['length']
-                    chain_data = data['chain']
-                    
-                    # Reconstruct chain from JSON
-                    chain = []
-                    for block_data in chain_data:
-                        block = Block(
-                            block_data['index'],
-                            block_data['transactions'],
-                            block_data['prev_hash']
-                        )
-                        block.timestamp = block_data.get('timestamp', block.timestamp)
-                        block.nonce = block_data['nonce']
-                        block.hash = block_data['hash']
-                        chain.append(block)
-                    
-                    # Keep track of longest valid chain
-                    if length > current_len and self.check_chain_validity(chain):
-                        current_len = length
-                        longest_chain = chain
-            except Exception as e:
-                # Skip peer if unreachable
-                print(f"Error connecting to peer {peer}: {e}")
-                continue
+        with metrics.CONSENSUS_SECONDS.time():
+            return self._consensus_round(peers)
+    
+    def _consensus_round(self, peers):
+        """
+        Run one consensus round against the given peers (see consensus).
         
-        # Replace chain if longer valid chain found
-        if longest_chain:
-            self.chain = longest_chain
-            return True
+        Args:
+            peers (list): URLs of the peers to query
+            
+        Returns:
+            bool: True if chain was replaced, False otherwise
+        """
+        executor = ThreadPoolExecutor(max_workers=min(len(peers), Blockchain.max_peer_fetches))
+        futures = {executor.submit(self._timed_sync, peer): peer for peer in peers}
+        done, not_done = wait(futures, timeout=Blockchain.consensus_timeout)
+        # Don't wait for stragglers; their requests time out on their own
+        executor.shutdown(wait=False, cancel_futures=True)
+        
+        for future in not_done:
+            print(f"Peer {futures[future]} missed the consensus deadline")
+        
+        ours = self.chain
+        candidates = [future.result() for future in done if future.result()]
+        candidates.sort(key=lambda chain: self.work_gain(chain, ours), reverse=True)
+        
+        for chain in candidates:
+            ours = self.chain
+            if self.work_gain(chain, ours) <= 0:
+                break
+            
+            # Only the blocks past the common prefix are re-verified, and
+            # without holding the lock
+            validated = self.validate_candidate(chain, ours)
+            if not validated:
+                continue
+            
+            with self._lock:
+                if self.shared:
+                    self.refresh_from_db()
+                if self.chain is not ours:
+                    # Our chain changed while validating: check against the new one
+                    if self.work_gain(chain) <= 0:
+                        break
+                    validated = self.validate_candidate(chain)
+                    if not validated:
+                        continue
+                
+                fork = self.fork_point(validated)
+                # Read the replaced blocks' transactions now: in lazy mode
+                # they are loaded from the DB, where the bulk write below
+                # overwrites them
+                orphaned = [block.transactions for block in self.chain[fork:]]
+                self.chain = validated
+                self._update_headers(fork, validated[fork:])
+                self.verified_height = len(self.chain) - 1
+                # Persist the replaced range in one bulk write
+                self.save_chain_to_db(fork)
+                self._notify(fork, validated[fork:])
+                self._restore_orphans(orphaned, validated[fork:])
+                return True
         
         return False
     
+    def _timed_sync(self, peer):
+        """sync_peer_chain, recording how long the peer took."""
+        start = time.perf_counter()
+        chain = self.sync_peer_chain(peer)
+        metrics.observe_consensus_peer(peer, "candidate" if chain else "none", time.perf_counter() - start)
+        return chain
+    
+    def _restore_orphans(self, orphaned, adopted):
+        """
+        Return transactions of blocks dropped by a chain replacement to the
+        mempool, unless the adopted blocks already contain them.
+        
+        Args:
+            orphaned (list): Transaction lists of our blocks that were replaced
+            adopted (list): Blocks that replaced them
+        """
+        confirmed = {Mempool.key(trans) for block in adopted for trans in block.transactions}
+        for transactions in orphaned:
+            for trans in transactions:
+                if Mempool.key(trans) in confirmed:
+                    continue
+                try:
+                    self.pending.add(trans)
+                except MempoolFull:
+                    print("Mempool full, dropping transaction from an orphaned block")
+                    return
+    
     def announce_block(self, block):
         """
         Announce a newly mined block to all peers.
         
+        Returns immediately; delivery happens in the background. Blocks
+        mined while an announcement round is still in flight are queued
+        and sent together as one batch in the next round.
+        
         Args:
             block (Block): Block to announce
         """
-        for peer in self.peers:
-            try:
-                url = f"{peer}/add_block"
-                block_data = {
-                    "index": block.index,
-                    "timestamp": block.timestamp,
-                    "transactions": block.transactions,
-                    "prev_hash": block.prev_hash,
-                    "nonce": block.nonce,
-                    "hash": block.hash
-                }
-                requests.post(url, json=block_data, timeout=2)
-            except Exception as e:
-                print(f"Error announcing block to {peer}: {e}")
-                continue
+        with self._outbox_lock:
+            self._outbox.append(block)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        
+        self._announcer.submit(self._flush_announcements)
+    
+    def _flush_announcements(self):
+        """Send every queued block to all peers, in parallel across peers."""
+        with self._outbox_lock:
+            blocks = self._outbox
+            self._outbox = []
+            self._flush_scheduled = False
+        
+        peers = self.peer_list()
+        if not blocks or not peers:
+            return
+        
+        if len(blocks) == 1:
+            self.client.broadcast(peers, "/add_block", blocks[0].to_dict())
+        else:
+            payload = {"blocks": [block.to_dict() for block in blocks]}
+            self.client.broadcast(peers, "/add_blocks", payload)
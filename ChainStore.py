@@ -0,0 +1,250 @@
+# Import libraries
+import threading
+from collections import OrderedDict
+import bson
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, DeleteMany
+from pymongo.errors import PyMongoError, DuplicateKeyError
+
+
+class ChainStore:
+    """
+    MongoDB persistence for blocks.
+    Blocks are keyed by their index; every write is an idempotent upsert,
+    and adopting a new chain rewrites the replaced range in one bulk write.
+    """
+
+    def __init__(self, db, collection="blocks"):
+        """
+        Initialize the store and make sure its indexes exist.
+
+        Args:
+            db: MongoDB database instance
+            collection (str): Name of the blocks collection
+        """
+        self.col = db[collection]
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        """Create unique indexes on block index and hash (no-op if present)."""
+        try:
+            self.col.create_index([("index", ASCENDING)], unique=True)
+            self.col.create_index([("hash", ASCENDING)], unique=True)
+        except PyMongoError as e:
+            # e.g. duplicates left behind by older versions
+            print(f"Could not create block indexes: {e}")
+
+    def load(self, start=0):
+        """
+        Load every stored block from a height on, in chain order.
+
+        Args:
+            start (int): Height of the first block
+
+        Returns:
+            list: Block documents sorted by index
+        """
+        return list(self.col.find({"index": {"$gte": start}}, {"_id": 0}).sort("index", ASCENDING))
+
+    def load_headers(self, start=0):
+        """
+        Load every stored block from a height on without its transactions,
+        in chain order.
+
+        Args:
+            start (int): Height of the first block
+
+        Returns:
+            list: Block documents (no "transactions" field) sorted by index
+        """
+        return list(self.col.find({"index": {"$gte": start}}, {"_id": 0, "transactions": 0}).sort("index", ASCENDING))
+
+    def load_transaction_fields(self, fields, start=0):
+        """
+        Load a few fields of every stored transaction from a height on,
+        without reading the rest of the bodies, in chain order.
+
+        Args:
+            fields (iterable): Transaction fields to load
+            start (int): Height of the first block
+
+        Returns:
+            list: {"index", "hash", "transactions"} documents sorted by index,
+                where each transaction only has the requested fields it sets
+        """
+        projection = {"_id": 0, "index": 1, "hash": 1}
+        projection.update({"transactions." + field: 1 for field in fields})
+        return list(self.col.find({"index": {"$gte": start}}, projection).sort("index", ASCENDING))
+
+    def tip(self):
+        """
+        Get the index and hash of the highest stored block.
+
+        Returns:
+            dict|None: {"index", "hash"}, or None if nothing is stored
+        """
+        return self.col.find_one({}, {"_id": 0, "index": 1, "hash": 1}, sort=[("index", DESCENDING)])
+
+    def load_transactions(self, block_hash):
+        """
+        Load the transactions of one block.
+
+        Args:
+            block_hash (str): Hash of the block
+
+        Returns:
+            list|None: Transactions, or None if the block is not stored
+        """
+        doc = self.col.find_one({"hash": block_hash}, {"_id": 0, "transactions": 1})
+        return doc["transactions"] if doc else None
+
+    def save_block(self, block):
+        """
+        Upsert a single block by index.
+
+        Args:
+            block (Block): Block to save
+        """
+        self.col.replace_one({"index": block.index}, block.to_dict(), upsert=True)
+
+    def insert_block(self, block):
+        """
+        Store a new block unless one is already stored at its index.
+        Used when several processes append to the same chain: the first
+        writer of each height wins, and only on top of the stored parent
+        (another process may have replaced it since we validated).
+
+        Args:
+            block (Block): Block to save
+
+        Returns:
+            bool: True if stored, False if the height was already taken or
+                the stored block below it is not the block's parent
+        """
+        if block.index > 0:
+            parent = self.col.find_one({"index": block.index - 1}, {"_id": 0, "hash": 1})
+            if parent is None or parent["hash"] != block.prev_hash:
+                return False
+        try:
+            self.col.insert_one(block.to_dict())
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def delete_blocks(self, blocks):
+        """
+        Delete stored blocks, matched by hash so that blocks another
+        process has written at the same heights since are kept.
+
+        Args:
+            blocks (list): Blocks to delete
+        """
+        if blocks:
+            self.col.delete_many({"hash": {"$in": [block.hash for block in blocks]}})
+
+    def replace_range(self, blocks):
+        """
+        Persist the blocks of an adopted chain from the fork point to the tip.
+
+        All blocks are upserted and any stored block past the new tip is
+        removed, in a single ordered bulk write.
+
+        Args:
+            blocks (list): Consecutive blocks, ending at the new tip
+        """
+        if not blocks:
+            return
+
+        ops = [ReplaceOne({"index": block.index}, block.to_dict(), upsert=True) for block in blocks]
+        ops.append(DeleteMany({"index": {"$gt": blocks[-1].index}}))
+        self.col.bulk_write(ops, ordered=True)
+
+
+class BodyCache:
+    """
+    LRU cache of block transactions with a fixed memory budget.
+    Used by lazily loaded chains: blocks keep only their header in memory
+    and fetch their transactions through get().
+    """
+
+    def __init__(self, store, max_bytes=64 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            store (ChainStore): Store to load missing bodies from
+            max_bytes (int): Memory budget, measured as BSON size of the bodies
+        """
+        self.store = store
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # block hash -> (transactions, size)
+        self._lock = threading.Lock()
+
+    def get(self, block_hash):
+        """
+        Get the transactions of a block, loading them from the store on a miss.
+
+        Args:
+            block_hash (str): Hash of the block
+
+        Returns:
+            list: Transactions ([] if the block is not stored)
+        """
+        with self._lock:
+            entry = self._entries.get(block_hash)
+            if entry is not None:
+                self._entries.move_to_end(block_hash)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        transactions = self.store.load_transactions(block_hash)
+        if transactions is None:
+            return []
+
+        self.put(block_hash, transactions)
+        return transactions
+
+    def put(self, block_hash, transactions):
+        """
+        Add a body to the cache, evicting least recently used bodies
+        until the cache fits its budget.
+
+        Args:
+            block_hash (str): Hash of the block
+            transactions (list): Block transactions
+        """
+        size = len(bson.encode({"transactions": transactions}))
+
+        with self._lock:
+            old = self._entries.pop(block_hash, None)
+            if old is not None:
+                self.size -= old[1]
+
+            # Bodies larger than the whole budget are served but not kept
+            if size > self.max_bytes:
+                return
+
+            self._entries[block_hash] = (transactions, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def stats(self):
+        """
+        Get cache usage counters.
+
+        Returns:
+            dict: entries, bytes, max_bytes, hits, misses
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
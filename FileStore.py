@@ -0,0 +1,245 @@
+# Import libraries
+import base64
+import hashlib
+import io
+import os
+import time
+import uuid
+import gridfs
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Read/write granularity; matches the GridFS default chunk size
+CHUNK_SIZE = 255 * 1024
+
+
+class FileStore:
+    """
+    Content-addressed, deduplicating storage for uploaded file bodies.
+
+    Bodies are keyed by the SHA-256 of their content. Each distinct body is
+    stored once in a GridFS bucket and once on disk (named by its hash),
+    and a "blobs" document counts how many files reference it. Uploads are
+    streamed in fixed-size chunks, so memory use per upload does not depend
+    on the file size.
+    """
+
+    def __init__(self, db, upload_folder, bucket_name="file_bodies", chunk_size=CHUNK_SIZE):
+        """
+        Initialize the store.
+
+        Args:
+            db: MongoDB database instance
+            upload_folder (str): Local directory for the disk copies
+            bucket_name (str): GridFS bucket holding the file bodies
+            chunk_size (int): Bytes read and written per step
+        """
+        self.upload_folder = upload_folder
+        self.chunk_size = chunk_size
+        self.bucket = gridfs.GridFSBucket(db, bucket_name=bucket_name, chunk_size_bytes=chunk_size)
+        self.blobs = db["blobs"]  # sha256 -> {gridfs_id, size, refcount}
+
+    def path_for(self, sha256):
+        """
+        Get the disk path of a body.
+
+        Args:
+            sha256 (str): Content hash
+
+        Returns:
+            str: Path in the upload folder
+        """
+        return os.path.join(self.upload_folder, sha256)
+
+    def ingest(self, stream):
+        """
+        Store an upload, deduplicating by content.
+
+        The stream is hashed while it is copied to a temporary file on disk.
+        If the content is already stored, its reference count is increased
+        and the temporary copy is dropped; otherwise the body is uploaded to
+        GridFS from the disk copy.
+
+        Args:
+            stream: Readable binary stream (e.g. FileStorage.stream)
+
+        Returns:
+            dict: {"sha256", "size", "gridfs_id", "deduplicated"}
+        """
+        os.makedirs(self.upload_folder, exist_ok=True)
+        tmp_path = os.path.join(self.upload_folder, f".upload-{uuid.uuid4().hex}")
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+
+            return self._commit(tmp_path, digest.hexdigest(), size)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _commit(self, tmp_path, sha256, size):
+        """
+        Reference an existing body or store a new one from a temporary file.
+
+        Args:
+            tmp_path (str): Temporary disk copy of the content
+            sha256 (str): Content hash
+            size (int): Content size in bytes
+
+        Returns:
+            dict: {"sha256", "size", "gridfs_id", "deduplicated"}
+        """
+        blob = self._add_ref(sha256)
+        deduplicated = blob is not None
+
+        if blob is None:
+            with open(tmp_path, "rb") as f:
+                gridfs_id = self._upload(f, sha256)
+            try:
+                self.blobs.insert_one({
+                    "_id": sha256,
+                    "gridfs_id": gridfs_id,
+                    "size": size,
+                    "refcount": 1,
+                    "created_at": time.time()
+                })
+                blob = {"gridfs_id": gridfs_id}
+            except DuplicateKeyError:
+                # Same content committed concurrently: keep the other copy
+                self.bucket.delete(gridfs_id)
+                blob = self._add_ref(sha256)
+                deduplicated = True
+
+        # Keep exactly one disk copy per content
+        path = self.path_for(sha256)
+        if not os.path.exists(path):
+            os.replace(tmp_path, path)
+
+        return {"sha256": sha256, "size": size, "gridfs_id": blob["gridfs_id"], "deduplicated": deduplicated}
+
+    def _add_ref(self, sha256):
+        """Increment the reference count of a stored body; None if not stored."""
+        return self.blobs.find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"refcount": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _upload(self, stream, filename):
+        """
+        Copy a stream into GridFS chunk by chunk.
+
+        Args:
+            stream: Readable binary stream
+            filename (str): GridFS file name
+
+        Returns:
+            ObjectId: GridFS file id
+        """
+        grid_in = self.bucket.open_upload_stream(filename)
+        try:
+            while True:
+                chunk = stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                grid_in.write(chunk)
+        except Exception:
+            grid_in.abort()
+            raise
+        grid_in.close()
+
+        return grid_in._id
+
+    def release(self, sha256):
+        """
+        Drop one reference to a body, deleting it once nothing references it.
+
+        Args:
+            sha256 (str): Content hash
+
+        Returns:
+            int: References left (0 if the body was deleted)
+        """
+        blob = self.blobs.find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is None:
+            return 0
+        if blob["refcount"] > 0:
+            return blob["refcount"]
+
+        # Only the caller that removes the document deletes the body
+        if self.blobs.delete_one({"_id": sha256, "refcount": {"$lte": 0}}).deleted_count:
+            try:
+                self.bucket.delete(blob["gridfs_id"])
+            except gridfs.NoFile:
+                pass
+            path = self.path_for(sha256)
+            if os.path.exists(path):
+                os.remove(path)
+        return 0
+
+    def open(self, gridfs_id):
+        """
+        Open a stored body for streaming.
+
+        Args:
+            gridfs_id: GridFS file id
+
+        Returns:
+            gridfs.GridOut: Readable, seekable file (raises gridfs.NoFile if missing)
+        """
+        return self.bucket.open_download_stream(gridfs_id)
+
+    def migrate_base64(self, files_col):
+        """
+        Move file bodies stored as base64 strings in files_col into the store.
+
+        Each migrated document is pointed at its content-addressed body
+        (secure_name, gridfs_id, sha256, file_size) and loses its
+        file_content field. Documents are processed one at a time, so only
+        one decoded body is held in memory.
+
+        Args:
+            files_col: MongoDB collection with the file metadata
+
+        Returns:
+            int: Number of documents migrated
+        """
+        migrated = 0
+        cursor = files_col.find({"file_content": {"$exists": True}}, {"_id": 1})
+
+        for ref in cursor:
+            doc = files_col.find_one({"_id": ref["_id"]}, {"file_content": 1})
+            if doc is None or "file_content" not in doc:
+                continue
+
+            content = io.BytesIO(base64.b64decode(doc["file_content"]))
+            stored = self.ingest(content)
+
+            files_col.update_one(
+                {"_id": doc["_id"]},
+                {
+                    "$set": {
+                        "secure_name": stored["sha256"],
+                        "gridfs_id": stored["gridfs_id"],
+                        "sha256": stored["sha256"],
+                        "file_size": stored["size"]
+                    },
+                    "$unset": {"file_content": ""}
+                }
+            )
+            migrated += 1
+
+        return migrated
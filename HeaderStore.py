@@ -0,0 +1,262 @@
+# Import libraries
+import math
+import struct
+from array import array
+
+# Serialized form: magic, format version, number of headers, flags
+# (_HAS_MERKLE, _HAS_TARGETS, _HAS_SOLVE_TIMES), genesis prev_hash length, then the genesis
+# prev_hash and each column
+_PREAMBLE = struct.Struct("<4sBQBH")
+_MAGIC = b"HDRS"
+_VERSION = 1
+_HAS_MERKLE = 1
+_HAS_TARGETS = 2
+_HAS_SOLVE_TIMES = 4
+_ZERO_HASH = bytes(32)
+
+
+class HeaderStore:
+    """
+    Columnar, in-memory store of block headers for a whole chain.
+
+    Headers are kept in parallel arrays (index, timestamp, nonce) plus
+    packed raw 32-byte hashes, about 56 bytes per header (88 with Merkle
+    roots, 40 more with targets and solve times), instead of one Python
+    object per block.
+    A block's prev_hash is the hash of the header before it, so it is not
+    stored except for genesis.
+
+    Blockchain keeps one next to its list of Block objects only when
+    asked to (Blockchain.enable_header_store), to serve /headers from.
+    """
+
+    def __init__(self):
+        """Initialize an empty header store."""
+        self.indexes = array("q")
+        self.timestamps = array("d")
+        self.nonces = array("Q")
+        self.hashes = bytearray()  # 32 bytes per header
+        self.merkle_roots = None  # bytearray, allocated on the first Merkle header
+        self.targets = None  # bytearray, allocated on the first header with a target
+        self.solve_times = None  # array("d"), NaN where a header has none
+        self.genesis_prev_hash = "0"
+
+    @classmethod
+    def from_chain(cls, chain):
+        """
+        Build a header store from a list of blocks.
+
+        Args:
+            chain (list): Blocks in chain order
+
+        Returns:
+            HeaderStore: Store holding every block's header
+        """
+        store = cls()
+        store.extend(chain)
+        return store
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def append(self, block):
+        """
+        Append the header of a block.
+
+        Args:
+            block (Block): Block with its hash set, extending the stored chain
+
+        Raises:
+            TypeError, ValueError, OverflowError: A field does not fit its
+                column; the store is left unchanged
+        """
+        self.extend([block])
+
+    def _append(self, block):
+        """Append one header to every column (see extend for rollback)."""
+        if len(self) == 0:
+            self.genesis_prev_hash = block.prev_hash
+
+        self.indexes.append(block.index)
+        self.timestamps.append(block.timestamp)
+        self.nonces.append(block.nonce)
+        self.hashes += bytes.fromhex(block.hash)
+
+        if block.merkle_root is not None and self.merkle_roots is None:
+            # Backfill zeros for the legacy headers stored so far
+            self.merkle_roots = bytearray(32 * (len(self) - 1))
+        if self.merkle_roots is not None:
+            root = block.merkle_root
+            self.merkle_roots += bytes.fromhex(root) if root is not None else _ZERO_HASH
+
+        if block.target is not None and self.targets is None:
+            self.targets = bytearray(32 * (len(self) - 1))
+        if self.targets is not None:
+            target = block.target
+            self.targets += bytes.fromhex(target) if target is not None else _ZERO_HASH
+
+        if block.solve_time is not None and self.solve_times is None:
+            self.solve_times = array("d", [math.nan] * (len(self) - 1))
+        if self.solve_times is not None:
+            solve_time = block.solve_time
+            self.solve_times.append(solve_time if solve_time is not None else math.nan)
+
+    def extend(self, blocks):
+        """
+        Append the headers of several blocks, all or none.
+
+        Args:
+            blocks (list): Blocks in chain order
+
+        Raises:
+            TypeError, ValueError, OverflowError: A field does not fit its
+                column; the store is left unchanged
+        """
+        length = len(self)
+        genesis_prev_hash = self.genesis_prev_hash
+        try:
+            for block in blocks:
+                self._append(block)
+        except Exception:
+            # Some columns may already hold part of the failing header
+            self.truncate(length)
+            self.genesis_prev_hash = genesis_prev_hash
+            raise
+
+    def truncate(self, length):
+        """
+        Drop every header at or above a height.
+
+        Args:
+            length (int): Number of headers to keep
+        """
+        del self.indexes[length:]
+        del self.timestamps[length:]
+        del self.nonces[length:]
+        del self.hashes[32 * length:]
+        if self.merkle_roots is not None:
+            del self.merkle_roots[32 * length:]
+        if self.targets is not None:
+            del self.targets[32 * length:]
+        if self.solve_times is not None:
+            del self.solve_times[length:]
+
+    def hash_at(self, height):
+        """
+        Get the hash of the header at a height.
+
+        Args:
+            height (int): Height of the header
+
+        Returns:
+            str: Hexadecimal block hash
+        """
+        return self.hashes[32 * height:32 * (height + 1)].hex()
+
+    def header(self, height):
+        """
+        Get one header in the same form as Block.header().
+
+        Args:
+            height (int): Height of the header
+
+        Returns:
+            dict: Header fields
+        """
+        header = {
+            "index": self.indexes[height],
+            "timestamp": self.timestamps[height],
+            "prev_hash": self.hash_at(height - 1) if height > 0 else self.genesis_prev_hash,
+            "nonce": self.nonces[height],
+            "hash": self.hash_at(height)
+        }
+        if self.merkle_roots is not None:
+            root = self.merkle_roots[32 * height:32 * (height + 1)]
+            if root != _ZERO_HASH:
+                header["merkle_root"] = root.hex()
+        if self.targets is not None:
+            target = self.targets[32 * height:32 * (height + 1)]
+            if target != _ZERO_HASH:
+                header["target"] = target.hex()
+        if self.solve_times is not None and not math.isnan(self.solve_times[height]):
+            header["solve_time"] = self.solve_times[height]
+        return header
+
+    def headers(self, start, limit):
+        """
+        Get a range of headers.
+
+        Args:
+            start (int): Height of the first header
+            limit (int): Maximum number of headers
+
+        Returns:
+            list: Header dictionaries
+        """
+        return [self.header(height) for height in range(start, min(start + limit, len(self)))]
+
+    def to_bytes(self):
+        """
+        Serialize the store to a compact binary form.
+
+        Returns:
+            bytes: Serialized headers
+        """
+        genesis_prev = self.genesis_prev_hash.encode()
+        flags = ((_HAS_MERKLE if self.merkle_roots is not None else 0)
+                 | (_HAS_TARGETS if self.targets is not None else 0)
+                 | (_HAS_SOLVE_TIMES if self.solve_times is not None else 0))
+        parts = [
+            _PREAMBLE.pack(_MAGIC, _VERSION, len(self), flags, len(genesis_prev)),
+            genesis_prev,
+            self.indexes.tobytes(),
+            self.timestamps.tobytes(),
+            self.nonces.tobytes(),
+            bytes(self.hashes)
+        ]
+        if self.merkle_roots is not None:
+            parts.append(bytes(self.merkle_roots))
+        if self.targets is not None:
+            parts.append(bytes(self.targets))
+        if self.solve_times is not None:
+            parts.append(self.solve_times.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Rebuild a store from the output of to_bytes().
+
+        Args:
+            data (bytes): Serialized headers
+
+        Returns:
+            HeaderStore: Restored store
+        """
+        magic, version, count, flags, prev_len = _PREAMBLE.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a serialized header store")
+
+        store = cls()
+        pos = _PREAMBLE.size
+        store.genesis_prev_hash = data[pos:pos + prev_len].decode()
+        pos += prev_len
+
+        for column in (store.indexes, store.timestamps, store.nonces):
+            size = count * column.itemsize
+            column.frombytes(data[pos:pos + size])
+            pos += size
+
+        store.hashes = bytearray(data[pos:pos + 32 * count])
+        pos += 32 * count
+        if flags & _HAS_MERKLE:
+            store.merkle_roots = bytearray(data[pos:pos + 32 * count])
+            pos += 32 * count
+        if flags & _HAS_TARGETS:
+            store.targets = bytearray(data[pos:pos + 32 * count])
+            pos += 32 * count
+        if flags & _HAS_SOLVE_TIMES:
+            store.solve_times = array("d")
+            store.solve_times.frombytes(data[pos:pos + 8 * count])
+
+        return store
@@ -0,0 +1,56 @@
+# Import libraries
+import os
+import socket
+import time
+import uuid
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class Lease:
+    """
+    Named, expiring lock held in MongoDB.
+
+    Lets one process out of several (e.g. gunicorn workers) do a job at a
+    time. A lease that is not released expires after ttl seconds, so a
+    process that dies while holding it does not block the others forever.
+    """
+
+    def __init__(self, db, name, ttl=60, collection="leases"):
+        """
+        Initialize the lease (does not acquire it).
+
+        Args:
+            db: MongoDB database instance
+            name (str): Lease name, shared by every competing process
+            ttl (float): Seconds a lease stays valid without renewal
+            collection (str): Name of the leases collection
+        """
+        self.col = db[collection]
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def acquire(self):
+        """
+        Take or renew the lease.
+
+        Returns:
+            bool: True if this process now holds the lease
+        """
+        now = time.time()
+        try:
+            doc = self.col.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.ttl}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Held by another process: the filter missed and the upsert collided
+            return False
+        return doc is not None and doc["owner"] == self.owner
+
+    def release(self):
+        """Give the lease up if this process holds it."""
+        self.col.delete_one({"_id": self.name, "owner": self.owner})
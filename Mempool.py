@@ -0,0 +1,501 @@
+# Import libraries
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError, DuplicateKeyError
+import merkle
+
+# What add() does when the pool is full
+REJECT = "reject"
+EVICT_OLDEST = "evict_oldest"
+
+
+class MempoolFull(Exception):
+    """Raised by Mempool.add() when the pool is full and the policy is reject."""
+
+
+class ClaimedBatch(list):
+    """
+    Batch returned by MongoMempool.take(): the transactions, plus the token
+    of the claim that renew() and requeue() act on.
+    """
+
+    def __init__(self, transactions, token):
+        super().__init__(transactions)
+        self.token = token
+
+
+class Mempool:
+    """
+    Bounded pool of transactions waiting to be mined.
+
+    Transactions are keyed by their file_key (or by their hash when they
+    have none), so the same transaction is only queued once. Each priority
+    level is a FIFO queue; batches are taken from the highest priority
+    first and are capped at max_block_txs transactions per block.
+
+    All operations are atomic. A miner take()s a batch, which leaves the
+    queues but still counts against the size cap and for deduplication
+    until it is either removed (mined) or requeue()d at the front.
+    """
+
+    def __init__(self, max_size=10000, policy=REJECT, max_block_txs=500):
+        """
+        Initialize an empty pool.
+
+        Args:
+            max_size (int): Maximum number of queued transactions
+            policy (str): "reject" new transactions or "evict_oldest" queued
+                ones (lowest priority first) when the pool is full
+            max_block_txs (int): Maximum number of transactions per block
+        """
+        if policy not in (REJECT, EVICT_OLDEST):
+            raise ValueError(f"Unknown mempool policy: {policy}")
+
+        self.max_size = max_size
+        self.policy = policy
+        self.max_block_txs = max_block_txs
+        self.evicted = 0
+        self._queues = {}  # priority -> OrderedDict(key -> transaction)
+        self._priority = {}  # key -> priority
+        self._taken = {}  # key -> (priority, transaction) for batches being mined
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._priority)
+
+    def __contains__(self, transaction):
+        key = Mempool.key(transaction)
+        return key in self._priority or key in self._taken
+
+    def __iter__(self):
+        return iter(self.list())
+
+    @staticmethod
+    def key(transaction):
+        """
+        Get the deduplication key of a transaction.
+
+        Args:
+            transaction (dict): Transaction data
+
+        Returns:
+            str: file_key if set, otherwise the transaction hash
+        """
+        return transaction.get("file_key") or merkle.tx_hash(transaction)
+
+    def full(self):
+        """Check whether the pool (queued and taken) is at its size cap."""
+        return len(self._priority) + len(self._taken) >= self.max_size
+
+    def accepting(self):
+        """Check whether add() would currently accept a new transaction."""
+        return self.policy == EVICT_OLDEST or not self.full()
+
+    def add(self, transaction, priority=0):
+        """
+        Queue a transaction.
+
+        Args:
+            transaction (dict): Transaction data
+            priority (int): Higher priorities are mined first
+
+        Returns:
+            bool: True if queued, False if it was already queued
+
+        Raises:
+            MempoolFull: The pool is full and the policy is reject
+        """
+        key = Mempool.key(transaction)
+
+        with self._lock:
+            if key in self._priority or key in self._taken:
+                return False
+
+            if len(self._priority) + len(self._taken) >= self.max_size:
+                if self.policy == REJECT or not self._priority:
+                    raise MempoolFull(f"Mempool is full ({self.max_size} transactions)")
+                self._evict_oldest()
+
+            self._queues.setdefault(priority, OrderedDict())[key] = transaction
+            self._priority[key] = priority
+            return True
+
+    def _evict_oldest(self):
+        """Drop the oldest transaction of the lowest priority."""
+        priority = min(self._queues)
+        queue = self._queues[priority]
+        key, _ = queue.popitem(last=False)
+        del self._priority[key]
+        if not queue:
+            del self._queues[priority]
+        self.evicted += 1
+
+    def take(self, limit=None):
+        """
+        Atomically remove the next batch to mine from the queues.
+
+        The batch keeps its place in the size cap and deduplication until
+        it is passed to remove() once mined or to requeue() if mining fails.
+
+        Args:
+            limit (int): Maximum number of transactions (default max_block_txs)
+
+        Returns:
+            list: Transactions, highest priority first, FIFO within a priority
+        """
+        limit = self.max_block_txs if limit is None else limit
+
+        with self._lock:
+            batch = []
+            for priority in sorted(self._queues, reverse=True):
+                queue = self._queues[priority]
+                while queue and len(batch) < limit:
+                    key, transaction = queue.popitem(last=False)
+                    del self._priority[key]
+                    self._taken[key] = (priority, transaction)
+                    batch.append(transaction)
+                if not queue:
+                    del self._queues[priority]
+                if len(batch) >= limit:
+                    break
+            return batch
+
+    def requeue(self, transactions):
+        """
+        Put a taken batch back at the front of its queues.
+        Transactions removed in the meantime (mined by a peer) are skipped.
+
+        Args:
+            transactions (list): Batch returned by take()
+
+        Returns:
+            int: Number of transactions requeued
+        """
+        requeued = 0
+        with self._lock:
+            # Reversed, so each one moved to the front keeps the batch order
+            for transaction in reversed(transactions):
+                key = Mempool.key(transaction)
+                entry = self._taken.pop(key, None)
+                if entry is None:
+                    continue
+                priority, transaction = entry
+                queue = self._queues.setdefault(priority, OrderedDict())
+                queue[key] = transaction
+                queue.move_to_end(key, last=False)
+                self._priority[key] = priority
+                requeued += 1
+        return requeued
+
+    def renew(self, transactions):
+        """
+        Keep a taken batch claimed while it is being mined.
+        Claims in memory do not expire, so this only counts them.
+
+        Args:
+            transactions (list): Batch returned by take()
+
+        Returns:
+            int: Number of transactions of the batch still claimed
+        """
+        with self._lock:
+            return sum(1 for transaction in transactions if Mempool.key(transaction) in self._taken)
+
+    def remove(self, transactions):
+        """
+        Drop transactions from the pool (e.g. once they are mined).
+
+        Args:
+            transactions (list): Transactions to drop; unknown ones are ignored
+
+        Returns:
+            int: Number of transactions dropped
+        """
+        removed = 0
+        with self._lock:
+            for transaction in transactions:
+                key = Mempool.key(transaction)
+                if self._taken.pop(key, None) is not None:
+                    removed += 1
+                    continue
+                priority = self._priority.pop(key, None)
+                if priority is None:
+                    continue
+                queue = self._queues[priority]
+                del queue[key]
+                if not queue:
+                    del self._queues[priority]
+                removed += 1
+        return removed
+
+    def page(self, page=1, per_page=100):
+        """
+        Get one page of queued transactions in mining order.
+
+        Args:
+            page (int): Page number, starting at 1
+            per_page (int): Transactions per page
+
+        Returns:
+            list: Transactions
+        """
+        start = max(page - 1, 0) * per_page
+        with self._lock:
+            return list(itertools.islice(self._ordered(), start, start + per_page))
+
+    def list(self):
+        """Get every queued transaction in mining order."""
+        with self._lock:
+            return list(self._ordered())
+
+    def _ordered(self):
+        """Iterate over the queued transactions in mining order (lock held)."""
+        for priority in sorted(self._queues, reverse=True):
+            yield from self._queues[priority].values()
+
+    def stats(self):
+        """
+        Get pool usage counters.
+
+        Returns:
+            dict: count, mining (taken, not yet mined), max_size, policy,
+                max_block_txs, evicted
+        """
+        return {
+            "count": len(self._priority),
+            "mining": len(self._taken),
+            "max_size": self.max_size,
+            "policy": self.policy,
+            "max_block_txs": self.max_block_txs,
+            "evicted": self.evicted
+        }
+
+
+class MongoMempool:
+    """
+    Mempool shared by every process of a node, stored in MongoDB.
+
+    Same interface and semantics as Mempool. Each pending transaction is one
+    document keyed by its deduplication key, so concurrent adds of the same
+    transaction collapse into one. take() claims a batch with a per-call
+    token; claims older than claim_ttl seconds (a miner that died) are
+    released again. renew() and requeue() only act on documents still
+    claimed with the batch's token, so a miner whose claim expired and
+    was taken over cannot keep or release the new claim.
+    """
+
+    # Mining order: highest priority first, FIFO within a priority
+    _ORDER = [("priority", DESCENDING), ("seq", ASCENDING)]
+
+    def __init__(self, db, max_size=10000, policy=REJECT, max_block_txs=500,
+                 collection="mempool", claim_ttl=300):
+        """
+        Initialize the pool and make sure its indexes exist.
+
+        Args:
+            db: MongoDB database instance
+            max_size (int): Maximum number of queued transactions
+            policy (str): "reject" or "evict_oldest" when the pool is full
+            max_block_txs (int): Maximum number of transactions per block
+            collection (str): Name of the mempool collection
+            claim_ttl (float): Seconds after which a taken batch is released
+        """
+        if policy not in (REJECT, EVICT_OLDEST):
+            raise ValueError(f"Unknown mempool policy: {policy}")
+
+        self.col = db[collection]
+        self.max_size = max_size
+        self.policy = policy
+        self.max_block_txs = max_block_txs
+        self.claim_ttl = claim_ttl
+        self.evicted = 0
+        try:
+            self.col.create_index([("taken", ASCENDING), ("priority", DESCENDING), ("seq", ASCENDING)])
+        except PyMongoError as e:
+            print(f"Could not create mempool index: {e}")
+
+    def __len__(self):
+        return self.col.count_documents({"taken": None})
+
+    def __contains__(self, transaction):
+        return self.col.count_documents({"_id": Mempool.key(transaction)}, limit=1) > 0
+
+    def __iter__(self):
+        return iter(self.list())
+
+    def full(self):
+        """Check whether the pool (queued and taken) is at its size cap."""
+        return self.col.estimated_document_count() >= self.max_size
+
+    def accepting(self):
+        """Check whether add() would currently accept a new transaction."""
+        return self.policy == EVICT_OLDEST or not self.full()
+
+    def add(self, transaction, priority=0):
+        """
+        Queue a transaction.
+
+        Args:
+            transaction (dict): Transaction data
+            priority (int): Higher priorities are mined first
+
+        Returns:
+            bool: True if queued, False if it was already queued
+
+        Raises:
+            MempoolFull: The pool is full and the policy is reject
+        """
+        if self.full() and transaction not in self:
+            if self.policy == REJECT or not self._evict_oldest():
+                raise MempoolFull(f"Mempool is full ({self.max_size} transactions)")
+
+        try:
+            self.col.insert_one({
+                "_id": Mempool.key(transaction),
+                "priority": priority,
+                "seq": time.time(),
+                "taken": None,
+                "taken_at": None,
+                "tx": transaction
+            })
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def _evict_oldest(self):
+        """Drop the oldest queued transaction of the lowest priority."""
+        doc = self.col.find_one_and_delete(
+            {"taken": None},
+            sort=[("priority", ASCENDING), ("seq", ASCENDING)]
+        )
+        if doc is None:
+            return False
+        self.evicted += 1
+        return True
+
+    def take(self, limit=None):
+        """
+        Atomically claim the next batch to mine.
+
+        Args:
+            limit (int): Maximum number of transactions (default max_block_txs)
+
+        Returns:
+            ClaimedBatch: Transactions, highest priority first, FIFO within
+                a priority
+        """
+        limit = self.max_block_txs if limit is None else limit
+
+        # Release batches of miners that never finished
+        self.col.update_many(
+            {"taken": {"$ne": None}, "taken_at": {"$lt": time.time() - self.claim_ttl}},
+            {"$set": {"taken": None, "taken_at": None}}
+        )
+
+        ids = [doc["_id"] for doc in self.col.find({"taken": None}, {"_id": 1}).sort(self._ORDER).limit(limit)]
+        if not ids:
+            return []
+
+        # Only documents still unclaimed are ours; others lost the race
+        token = uuid.uuid4().hex
+        self.col.update_many(
+            {"_id": {"$in": ids}, "taken": None},
+            {"$set": {"taken": token, "taken_at": time.time()}}
+        )
+        return ClaimedBatch([doc["tx"] for doc in self.col.find({"taken": token}).sort(self._ORDER)], token)
+
+    def requeue(self, transactions):
+        """
+        Put a taken batch back; it keeps its original place in the order.
+
+        Args:
+            transactions (ClaimedBatch): Batch returned by take()
+
+        Returns:
+            int: Number of transactions requeued (those still claimed by the batch)
+        """
+        keys = [Mempool.key(transaction) for transaction in transactions]
+        token = getattr(transactions, "token", None)
+        if not keys or token is None:
+            return 0
+        result = self.col.update_many(
+            {"_id": {"$in": keys}, "taken": token},
+            {"$set": {"taken": None, "taken_at": None}}
+        )
+        return result.modified_count
+
+    def renew(self, transactions):
+        """
+        Keep a taken batch claimed while it is being mined, so it is not
+        released to other miners after claim_ttl seconds.
+
+        Args:
+            transactions (ClaimedBatch): Batch returned by take()
+
+        Returns:
+            int: Number of transactions of the batch still claimed by it
+        """
+        keys = [Mempool.key(transaction) for transaction in transactions]
+        token = getattr(transactions, "token", None)
+        if not keys or token is None:
+            return 0
+        result = self.col.update_many(
+            {"_id": {"$in": keys}, "taken": token},
+            {"$set": {"taken_at": time.time()}}
+        )
+        return result.matched_count
+
+    def remove(self, transactions):
+        """
+        Drop transactions from the pool (e.g. once they are mined).
+
+        Args:
+            transactions (list): Transactions to drop; unknown ones are ignored
+
+        Returns:
+            int: Number of transactions dropped
+        """
+        keys = [Mempool.key(transaction) for transaction in transactions]
+        if not keys:
+            return 0
+        return self.col.delete_many({"_id": {"$in": keys}}).deleted_count
+
+    def page(self, page=1, per_page=100):
+        """
+        Get one page of queued transactions in mining order.
+
+        Args:
+            page (int): Page number, starting at 1
+            per_page (int): Transactions per page
+
+        Returns:
+            list: Transactions
+        """
+        start = max(page - 1, 0) * per_page
+        cursor = self.col.find({"taken": None}, {"tx": 1}).sort(self._ORDER).skip(start).limit(per_page)
+        return [doc["tx"] for doc in cursor]
+
+    def list(self):
+        """Get every queued transaction in mining order."""
+        return [doc["tx"] for doc in self.col.find({"taken": None}, {"tx": 1}).sort(self._ORDER)]
+
+    def stats(self):
+        """
+        Get pool usage counters.
+
+        Returns:
+            dict: count, mining (taken, not yet mined), max_size, policy,
+                max_block_txs, evicted (by this process)
+        """
+        return {
+            "count": len(self),
+            "mining": self.col.count_documents({"taken": {"$ne": None}}),
+            "max_size": self.max_size,
+            "policy": self.policy,
+            "max_block_txs": self.max_block_txs,
+            "evicted": self.evicted
+        }
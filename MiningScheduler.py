@@ -0,0 +1,207 @@
+# Import libraries
+import itertools
+import threading
+import time
+from collections import deque
+
+
+class MiningScheduler:
+    """
+    Background miner for a Blockchain.
+
+    A single thread mines a block whenever the mempool holds at least
+    threshold transactions, when interval seconds have passed since the
+    last block with transactions still pending, or when trigger() is called
+    (e.g. by /mine). Mined blocks are announced to the peers. A job is
+    abandoned when the chain tip changes under it (see Blockchain.mine);
+    its transactions stay pending and are picked up by the next job.
+
+    With a lease (see Lease), only the process holding it mines, so several
+    workers sharing one chain take turns instead of racing each other. The
+    lease is renewed while a job runs, however long it takes.
+    """
+
+    def __init__(self, blockchain, threshold=500, interval=30, poll=0.5, history=20, lease=None):
+        """
+        Initialize the scheduler (call start() to run it).
+
+        Args:
+            blockchain (Blockchain): Chain to mine on
+            threshold (int): Pending transactions that trigger a job (0 = off)
+            interval (float): Seconds after which any pending transaction
+                triggers a job (0 = off)
+            poll (float): Seconds between checks of the mempool
+            history (int): Finished jobs kept for status()
+            lease (Lease): Lease to hold while mining (None = always mine)
+        """
+        self.blockchain = blockchain
+        self.lease = lease
+        self.threshold = threshold
+        self.interval = interval
+        self.poll = poll
+
+        self.job = None  # Job currently mining
+        self.history = deque(maxlen=history)  # Finished jobs, newest last
+        self.mined = 0
+        self.abandoned = 0
+        self.last_mined_at = time.time()
+
+        self._ids = itertools.count(1)
+        self._wake = threading.Event()
+        self._requested = False
+        self._stop = threading.Event()
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the background thread (no-op if already running)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mining-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the background thread, abandoning the current job.
+
+        Args:
+            timeout (float): Seconds to wait for the thread to exit
+        """
+        self._stop.set()
+        with self._lock:
+            self._cancel.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def trigger(self):
+        """
+        Ask for a block to be mined as soon as possible.
+
+        Returns:
+            dict: Current status (see status())
+        """
+        with self._lock:
+            self._requested = True
+        self._wake.set()
+        return self.status()
+
+    def status(self):
+        """
+        Get the state of the scheduler.
+
+        Returns:
+            dict: running, job (current job or None), last_job, pending,
+                threshold, interval, mined, abandoned
+        """
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "job": dict(self.job) if self.job else None,
+                "last_job": dict(self.history[-1]) if self.history else None,
+                "requested": self._requested,
+                "pending": len(self.blockchain.pending),
+                "threshold": self.threshold,
+                "interval": self.interval,
+                "mined": self.mined,
+                "abandoned": self.abandoned
+            }
+
+    def _due(self):
+        """Check whether a job should start now."""
+        pending = len(self.blockchain.pending)
+        if pending == 0:
+            return False
+        if self._requested:
+            return True
+        if self.threshold and pending >= self.threshold:
+            return True
+        return bool(self.interval) and time.time() - self.last_mined_at >= self.interval
+
+    def _run(self):
+        """Thread loop: wait for work, mine, repeat until stopped."""
+        while not self._stop.is_set():
+            self._wake.wait(self.poll)
+            self._wake.clear()
+
+            try:
+                self._mine_due()
+            except Exception as e:
+                # E.g. the DB behind the mempool or the lease is unreachable;
+                # keep the thread alive and retry on the next poll
+                print(f"Mining scheduler error: {e}")
+
+    def _mine_due(self):
+        """Run jobs while one is due and we may mine."""
+        while not self._stop.is_set() and self._due():
+            if self.lease is not None and not self.lease.acquire():
+                # Another process is mining; try again on the next poll
+                break
+            try:
+                state = self._mine_once()
+            finally:
+                if self.lease is not None:
+                    self.lease.release()
+            if state == "failed":
+                break
+
+    def _mine_once(self):
+        """
+        Run one mining job and record its outcome.
+
+        Returns:
+            str: Final job state ("mined", "abandoned" or "failed")
+        """
+        blockchain = self.blockchain
+        job = {
+            "id": next(self._ids),
+            "state": "mining",
+            "height": len(blockchain.chain),
+            "pending": len(blockchain.pending),
+            "started_at": time.time(),
+            "finished_at": None,
+            "block_index": None,
+            "hash": None
+        }
+        cancel = threading.Event()
+        with self._lock:
+            self._requested = False
+            self.job = job
+            self._cancel = cancel
+            if self._stop.is_set():
+                cancel.set()
+
+        try:
+            # Long jobs keep the lease (and the mempool claim) alive
+            keepalive = self.lease.acquire if self.lease is not None else None
+            # The block itself, not chain[index]: consensus may already have
+            # replaced it with a shorter chain
+            block = blockchain.mine(cancel=cancel, keepalive=keepalive)
+        except Exception as e:
+            block = None
+            job["error"] = str(e)
+            print(f"Mining job {job['id']} failed: {e}")
+
+        job["finished_at"] = time.time()
+        if block is not None:
+            job.update(state="mined", block_index=block.index, hash=block.hash)
+            blockchain.announce_block(block)
+        else:
+            # Tip changed or we were stopped; the transactions stay pending
+            job["state"] = "failed" if "error" in job else "abandoned"
+
+        with self._lock:
+            self.job = None
+            self.history.append(job)
+            if block is not None:
+                self.mined += 1
+                self.last_mined_at = job["finished_at"]
+            else:
+                self.abandoned += 1
+                # Retry on the new tip unless we are shutting down
+                if job["state"] == "abandoned" and not self._stop.is_set():
+                    self._requested = True
+
+        return job["state"]
@@ -0,0 +1,129 @@
+# Import libraries
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PeerClient:
+    """
+    HTTP client shared by all peer traffic of a node.
+    Keeps pooled keep-alive connections to every peer, sends to many peers
+    in parallel and records per-peer delivery latency.
+    """
+
+    def __init__(self, timeout=2, pool_size=16, max_workers=8):
+        """
+        Initialize the client.
+
+        Args:
+            timeout (float): Per-request timeout in seconds
+            pool_size (int): Keep-alive connections kept per peer
+            max_workers (int): Peers contacted at the same time
+        """
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.latency = {}  # peer -> delivery stats
+        self._lock = threading.Lock()
+
+    def get(self, peer, path, **kwargs):
+        """
+        Send a GET request to a peer over the shared session.
+
+        Args:
+            peer (str): URL of peer node
+            path (str): Endpoint path (e.g. "/chain")
+
+        Returns:
+            requests.Response: Peer response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(f"{peer}{path}", **kwargs)
+
+    def post(self, peer, path, **kwargs):
+        """
+        Send a POST request to a peer and record how long delivery took.
+
+        Args:
+            peer (str): URL of peer node
+            path (str): Endpoint path (e.g. "/add_block")
+
+        Returns:
+            requests.Response|None: Peer response, or None if delivery failed
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        try:
+            response = self.session.post(f"{peer}{path}", **kwargs)
+        except Exception as e:
+            self.record_latency(peer, time.perf_counter() - start, ok=False)
+            print(f"Error posting {path} to {peer}: {e}")
+            return None
+
+        self.record_latency(peer, time.perf_counter() - start, ok=True)
+        return response
+
+    def broadcast(self, peers, path, payload):
+        """
+        POST the same JSON payload to every peer in parallel and wait for all.
+
+        Args:
+            peers (iterable): Peer URLs
+            path (str): Endpoint path
+            payload: JSON-serializable body
+
+        Returns:
+            dict: peer -> response (None for failed deliveries)
+        """
+        futures = {self.executor.submit(self.post, peer, path, json=payload): peer for peer in peers}
+        wait(futures)
+        return {peer: future.result() for future, peer in futures.items()}
+
+    def record_latency(self, peer, seconds, ok=True):
+        """
+        Record one delivery attempt to a peer.
+
+        Args:
+            peer (str): URL of peer node
+            seconds (float): Time the request took
+            ok (bool): Whether the peer answered
+        """
+        with self._lock:
+            stats = self.latency.setdefault(peer, {
+                "count": 0,
+                "errors": 0,
+                "total": 0.0,
+                "last": 0.0,
+                "max": 0.0
+            })
+            stats["count"] += 1
+            if not ok:
+                stats["errors"] += 1
+            stats["total"] += seconds
+            stats["last"] = seconds
+            stats["max"] = max(stats["max"], seconds)
+
+    def latency_stats(self):
+        """
+        Get per-peer delivery latency in milliseconds.
+
+        Returns:
+            dict: peer -> {"count", "errors", "avg_ms", "last_ms", "max_ms"}
+        """
+        with self._lock:
+            return {
+                peer: {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "avg_ms": round(stats["total"] / stats["count"] * 1000, 2),
+                    "last_ms": round(stats["last"] * 1000, 2),
+                    "max_ms": round(stats["max"] * 1000, 2)
+                }
+                for peer, stats in self.latency.items()
+            }
@@ -0,0 +1,217 @@
+# Import libraries
+import bisect
+import heapq
+import itertools
+import threading
+
+
+class TxIndex:
+    """
+    Incrementally maintained index of on-chain transactions.
+
+    Keeps the order the home page has always used (grouped by block,
+    blocks sorted by prev_hash descending, transactions in block order) so
+    a page can be served without walking and sorting the whole chain.
+    Only block references and transaction counts are kept; transaction
+    bodies are read from the blocks when a page is built.
+
+    Secondary indexes map user, file_key and v_file values to the
+    (height, position) of every matching transaction, and block timestamps
+    are kept sorted for time range queries.
+    """
+
+    # Transaction fields with a secondary index
+    FIELDS = ("user", "file_key", "v_file")
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self._keys = []  # prev_hash of every indexed block, ascending
+        self._blocks = {}  # prev_hash -> (block, number of transactions)
+        self._heights = []  # prev_hash by block height
+        self.count = 0  # Total number of indexed transactions
+        self._fields = {field: {} for field in TxIndex.FIELDS}  # field -> value -> {(height, position)}
+        self._postings = []  # by height: [(field, value, position)] added for that block
+        self._times = []  # (timestamp, height), sorted
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def rebuild(self, chain, store=None):
+        """
+        Index a whole chain from scratch.
+
+        With a store, the indexed fields are read from it in one projected
+        query instead of loading every block body, which matters for lazy
+        chains whose bodies are not in memory.
+
+        Args:
+            chain (list): Blocks in chain order
+            store (ChainStore): Store holding the chain's blocks (optional)
+        """
+        bodies = None
+        if store is not None:
+            docs = store.load_transaction_fields(TxIndex.FIELDS)
+            # Blocks the store does not have (or has in another version)
+            # fall back to their own transactions
+            stored = {doc["hash"]: doc.get("transactions", []) for doc in docs}
+            bodies = [stored.get(block.hash) for block in chain]
+        self.apply(0, chain, bodies)
+
+    def apply(self, fork, blocks, bodies=None):
+        """
+        Update the index after the chain changed from a given height.
+
+        Args:
+            fork (int): First height that changed
+            blocks (list): New blocks from that height to the tip
+            bodies (list): Transactions to index for each block, with at
+                least the indexed fields (None = read block.transactions)
+        """
+        with self._lock:
+            # Forget every block at or above the fork point
+            for height in range(len(self._heights) - 1, fork - 1, -1):
+                key = self._heights[height]
+                block, n = self._blocks.pop(key)
+                self._keys.pop(bisect.bisect_left(self._keys, key))
+                self.count -= n
+
+                for field, value, position in self._postings[height]:
+                    matches = self._fields[field][value]
+                    matches.discard((height, position))
+                    if not matches:
+                        del self._fields[field][value]
+                self._times.pop(bisect.bisect_left(self._times, (block.timestamp, height)))
+            del self._heights[fork:]
+            del self._postings[fork:]
+
+            for i, block in enumerate(blocks):
+                height = len(self._heights)
+                transactions = bodies[i] if bodies is not None else None
+                if transactions is None:
+                    transactions = block.transactions
+                n = len(transactions)
+                self._blocks[block.prev_hash] = (block, n)
+                bisect.insort(self._keys, block.prev_hash)
+                self._heights.append(block.prev_hash)
+                self.count += n
+
+                postings = []
+                for position, trans in enumerate(transactions):
+                    for field in TxIndex.FIELDS:
+                        value = trans.get(field)
+                        if isinstance(value, str):
+                            self._fields[field].setdefault(value, set()).add((height, position))
+                            postings.append((field, value, position))
+                self._postings.append(postings)
+                bisect.insort(self._times, (block.timestamp, height))
+
+    def page(self, page=1, per_page=100):
+        """
+        Get one page of transactions.
+
+        Args:
+            page (int): Page number, starting at 1
+            per_page (int): Transactions per page
+
+        Returns:
+            list: Transaction copies with "index" (block index) and
+                "hash" (block prev_hash) added
+        """
+        skip = max(page - 1, 0) * per_page
+        result = []
+
+        with self._lock:
+            for key in reversed(self._keys):
+                block, n = self._blocks[key]
+                if skip >= n:
+                    skip -= n
+                    continue
+
+                for trans in block.transactions[skip:skip + per_page - len(result)]:
+                    trans_copy = trans.copy()
+                    trans_copy["index"] = block.index
+                    trans_copy["hash"] = block.prev_hash
+                    result.append(trans_copy)
+                skip = 0
+
+                if len(result) >= per_page:
+                    break
+
+        return result
+
+    def query(self, user=None, file_key=None, v_file=None, since=None, until=None, limit=100):
+        """
+        Find on-chain transactions by field values and/or block time range.
+
+        Args:
+            user (str): Match the transaction's user
+            file_key (str): Match the transaction's file_key
+            v_file (str): Match the transaction's file name
+            since (float): Earliest block timestamp (inclusive)
+            until (float): Latest block timestamp (inclusive)
+            limit (int): Maximum number of results
+
+        Returns:
+            list: Newest first, each {"block_index", "block_hash",
+                "timestamp", "position", "transaction"}
+        """
+        filters = {"user": user, "file_key": file_key, "v_file": v_file}
+        lo = float("-inf") if since is None else since
+        hi = float("inf") if until is None else until
+
+        with self._lock:
+            candidate_sets = [
+                self._fields[field].get(value, set())
+                for field, value in filters.items() if value is not None
+            ]
+
+            if candidate_sets:
+                # Scan the most selective index, check the others, and
+                # keep only the newest limit hits
+                candidate_sets.sort(key=len)
+                smallest, others = candidate_sets[0], candidate_sets[1:]
+                hits = heapq.nlargest(limit, (
+                    (height, position) for height, position in smallest
+                    if all((height, position) in other for other in others)
+                    and lo <= self._block_at(height).timestamp <= hi
+                ))
+            else:
+                hits = list(itertools.islice(self._newest(lo, hi), limit))
+
+            result = []
+            for height, position in hits:
+                block = self._block_at(height)
+                result.append({
+                    "block_index": block.index,
+                    "block_hash": block.hash,
+                    "timestamp": block.timestamp,
+                    "position": position,
+                    "transaction": block.transactions[position]
+                })
+
+        return result
+
+    def _newest(self, lo, hi):
+        """
+        Yield (height, position) of every transaction in blocks with a
+        timestamp in [lo, hi], newest first. Must be called with the lock held.
+        """
+        if lo == float("-inf") and hi == float("inf"):
+            heights = range(len(self._heights) - 1, -1, -1)
+        else:
+            # Heights of the blocks in the time range, popped highest first
+            start = bisect.bisect_left(self._times, (lo, -1))
+            end = bisect.bisect_right(self._times, (hi, len(self._heights)))
+            heap = [-height for _, height in self._times[start:end]]
+            heapq.heapify(heap)
+            heights = (-heapq.heappop(heap) for _ in range(len(heap)))
+
+        for height in heights:
+            n = self._blocks[self._heights[height]][1]
+            for position in range(n - 1, -1, -1):
+                yield height, position
+
+    def _block_at(self, height):
+        """Get the indexed block at a height."""
+        return self._blocks[self._heights[height]][0]
@@ -1,23 +1,40 @@
 import base64
 import json
+import logging
 import os
+import random
 import requests
+import threading
+import time
 import uuid
-from flask import render_template, redirect, request, send_file, session, flash, url_for, jsonify
+from collections import OrderedDict
+from flask import render_template, redirect, request, send_file, session, flash, url_for, jsonify, g, Response
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
 from app import app
 from timeit import default_timer as timer
 from pymongo import MongoClient
+from gridfs.errors import NoFile
 from dotenv import load_dotenv
 # Import blockchain classes for peer functionality
 from Blockchain import Blockchain as BlockchainClass
 from Block import Block
+from FileStore import FileStore
+from Mempool import MempoolFull
+from MiningScheduler import MiningScheduler
+from Lease import Lease
+from TxIndex import TxIndex
+import metrics
 
 # Load environment variables from the root .env file (2 levels up)
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env')
 load_dotenv(dotenv_path)
 
+# LOG_LEVEL=DEBUG shows per-request details (uploads, shares, restores)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+log = logging.getLogger(__name__)
+
 app.secret_key = "super_secret_key_for_hackathon" # Set a secret key for sessions
 
 # Production-ready CORS configuration
@@ -28,53 +45,151 @@ CORS(app, resources={
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"],
         "supports_credentials": False,  # Set to False when using origins="*"
-        "expose_headers": ["Content-Type"]
+        "expose_headers": ["Content-Type", "X-Profile-Id"]
     }
 })
 
 # MongoDB Connection
 MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017/file_storage")
-client = MongoClient(MONGODB_URI)
+# Command latencies are recorded for /metrics
+client = MongoClient(MONGODB_URI, event_listeners=[metrics.MongoCommandListener()])
 db = client["file_storage"] # Explicitly use file_storage database
 users_col = db["users"]
 files_col = db["files"]
 
 # Initialize Blockchain (for peer functionality)
-blockchain = BlockchainClass(db=db)
+# MINING_WORKERS > 1 enables the multi-process nonce search
+MINING_WORKERS = int(os.environ.get("MINING_WORKERS", 1))
+# MERKLE_BLOCKS=1 mines new blocks in the Merkle-root header format
+MERKLE_BLOCKS = os.environ.get("MERKLE_BLOCKS", "0") == "1"
+# LAZY_CHAIN=1 loads only block headers at startup; transactions are read
+# on demand through an LRU cache of BODY_CACHE_MB megabytes
+LAZY_CHAIN = os.environ.get("LAZY_CHAIN", "0") == "1"
+BODY_CACHE_MB = int(os.environ.get("BODY_CACHE_MB", 64))
+# HEADER_STORE=1 also keeps every header in a columnar HeaderStore and
+# serves /headers from it (more memory, cheaper /headers)
+HEADER_STORE = os.environ.get("HEADER_STORE", "0") == "1"
+# Mempool: at most MEMPOOL_SIZE pending transactions; when full, new ones
+# are rejected (MEMPOOL_POLICY=reject) or the oldest are dropped
+# (MEMPOOL_POLICY=evict_oldest). Each block takes at most MAX_BLOCK_TXS.
+MEMPOOL_SIZE = int(os.environ.get("MEMPOOL_SIZE", 10000))
+MEMPOOL_POLICY = os.environ.get("MEMPOOL_POLICY", "reject")
+MAX_BLOCK_TXS = int(os.environ.get("MAX_BLOCK_TXS", 500))
+# SHARED_STATE=1 makes every worker process (e.g. gunicorn -w N) use one
+# chain and mempool through MongoDB; each worker follows the stored chain
+# every CHAIN_SYNC_INTERVAL seconds (instantly where change streams work)
+# and only one worker mines at a time
+SHARED_STATE = os.environ.get("SHARED_STATE", "0") == "1"
+CHAIN_SYNC_INTERVAL = float(os.environ.get("CHAIN_SYNC_INTERVAL", 1))
+# Difficulty retargeting: every RETARGET_WINDOW blocks the difficulty is
+# adjusted towards TARGET_BLOCK_TIME seconds of proof of work per block
+# (0 = fixed). Idle time between blocks (see MINE_INTERVAL) does not count.
+# Every node of a network must use the same values.
+TARGET_BLOCK_TIME = float(os.environ.get("TARGET_BLOCK_TIME", BlockchainClass.target_block_time))
+RETARGET_WINDOW = int(os.environ.get("RETARGET_WINDOW", BlockchainClass.retarget_window))
+blockchain = BlockchainClass(db=db, workers=MINING_WORKERS, merkle=MERKLE_BLOCKS,
+                             lazy=LAZY_CHAIN, body_cache_bytes=BODY_CACHE_MB * 1024 * 1024,
+                             max_pending=MEMPOOL_SIZE, pending_policy=MEMPOOL_POLICY,
+                             max_block_txs=MAX_BLOCK_TXS, shared=SHARED_STATE,
+                             target_block_time=TARGET_BLOCK_TIME, retarget_window=RETARGET_WINDOW,
+                             header_store=HEADER_STORE)
+
+# Index of on-chain transactions, kept up to date as blocks are added or
+# the chain is replaced by consensus
+tx_index = TxIndex()
+# Lazy chains keep bodies in the DB: read just the indexed fields from there
+tx_index.rebuild(blockchain.chain, blockchain.store if LAZY_CHAIN else None)
+blockchain.on_chain_update(tx_index.apply)
+if SHARED_STATE:
+    blockchain.start_db_sync(CHAIN_SYNC_INTERVAL)
+
+# Background miner: mines once MINE_THRESHOLD transactions are pending or
+# MINE_INTERVAL seconds after the last block (0 disables either trigger);
+# /mine asks for a block right away
+MINE_THRESHOLD = int(os.environ.get("MINE_THRESHOLD", MAX_BLOCK_TXS))
+MINE_INTERVAL = float(os.environ.get("MINE_INTERVAL", 30))
+miner = MiningScheduler(blockchain, threshold=MINE_THRESHOLD, interval=MINE_INTERVAL,
+                        lease=Lease(db, "miner") if SHARED_STATE else None)
+miner.start()
+
+# Transactions shown per home page
+TX_PAGE_SIZE = 100
+# Most transactions returned by one /api/transactions query
+TX_QUERY_MAX = 1000
 
-# Stores all the post transaction in the node
-request_tx = []
 #store filename
 files = {}
 #destiantion for upload files
 UPLOAD_FOLDER = "app/static/Uploads"
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Chunked file body storage (disk copy + GridFS)
+file_store = FileStore(db, UPLOAD_FOLDER)
 # store  address
 ADDR = os.environ.get("BLOCKCHAIN_NODE_ADDR", "http://127.0.0.1:8800")
 
+# Sampling profiler: with PROFILING=1 a request is profiled when it asks
+# for it (?profile=1 or an "X-Profile: 1" header), and a random
+# PROFILE_SAMPLE_RATE fraction of all requests is profiled too. The last
+# PROFILE_HISTORY profiles are kept for /profiles.
+PROFILING = os.environ.get("PROFILING", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+PROFILE_HISTORY = int(os.environ.get("PROFILE_HISTORY", 50))
+profiles = OrderedDict()  # id -> profile, oldest first
+profiles_lock = threading.Lock()  # requests are handled on several threads
+
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.profiler = None
+    if PROFILING and (request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1"
+                      or (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE)):
+        g.profiler = metrics.SamplingProfiler(interval=PROFILE_INTERVAL).start()
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get("request_start")
+    if start is not None:
+        # Route names, not paths, so file keys don't become labels
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=request.endpoint or "unmatched",
+                                     method=request.method, status=response.status_code)
+    
+    profiler = g.get("profiler")
+    if profiler is not None:
+        profiler.stop()
+        profile_id = uuid.uuid4().hex[:12]
+        with profiles_lock:
+            profiles[profile_id] = {
+                "id": profile_id,
+                "method": request.method,
+                "path": request.full_path.rstrip("?"),
+                "status": response.status_code,
+                "profiler": profiler
+            }
+            while len(profiles) > PROFILE_HISTORY:
+                profiles.popitem(last=False)
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
 #create a list of requests that peers has send to upload files
-def get_tx_req():
-    global request_tx
+def get_tx_req(page=1):
+    """Get one home page of on-chain transactions (a new list per request)"""
     try:
-        # Get chain data directly from blockchain object (no HTTP call needed)
-        content = []
-        for block in blockchain.chain:
-            # block.transactions is a list of transaction dicts
-            for trans in block.transactions:
-                trans_copy = trans.copy()
-                trans_copy["index"] = block.index
-                trans_copy["hash"] = block.prev_hash
-                content.append(trans_copy)
-        request_tx = sorted(content, key=lambda k: k["hash"], reverse=True)
+        # Served from the incremental index (no chain walk or sort)
+        return tx_index.page(page, TX_PAGE_SIZE)
     except Exception as e:
-        print(f"DEBUG: Error in get_tx_req: {e}")
-        request_tx = []
+        log.warning("Error in get_tx_req: %s", e)
+        return []
 
 
 # Loads and runs the home page
 @app.route("/")
 def index():
-    get_tx_req()
+    page = max(request.args.get("page", 1, type=int), 1)
+    request_tx = get_tx_req(page)
+    has_next = page * TX_PAGE_SIZE < len(tx_index)
     user_key = session.get("user_key")
     username = session.get("username")
     
@@ -82,7 +197,7 @@ def index():
     
     if user_key:
         # Find my files
-        cursor = files_col.find({"owner": user_key})
+        cursor = files_col.find({"owner": user_key}, {"filename": 1, "file_key": 1})
         for f_data in cursor:
             my_files.append({
                 "filename": f_data["filename"],
@@ -94,6 +209,8 @@ def index():
                            subtitle="A Decentralized Network for File Storage/Sharing",
                            node_address=ADDR,
                            request_tx=request_tx,
+                           page=page,
+                           has_next=has_next,
                            user_key=user_key,
                            username=username,
                            my_files=my_files)
@@ -109,22 +226,22 @@ def get_key(username):
 @app.route("/register", methods=["POST"])
 def register():
     username = request.form["username"]
-    print(f"DEBUG: Registering user: {username}")
+    log.debug("Registering user: %s", username)
     
     user = users_col.find_one({"username": username})
     
     if user:
-        print(f"DEBUG: User found. Key: {user['key']}")
+        log.debug("User found. Key: %s", user["key"])
         session["user_key"] = user["key"]
         session["username"] = username
     else:
-        print("DEBUG: User NOT found. Creating new key.")
+        log.debug("User not found. Creating new key.")
         # Generate new key
         new_key = str(uuid.uuid4())
         users_col.insert_one({"username": username, "key": new_key})
         session["user_key"] = new_key
         session["username"] = username
-        print(f"DEBUG: New key generated: {new_key}")
+        log.debug("New key generated: %s", new_key)
         
     return redirect("/")
 
@@ -141,70 +258,74 @@ def submit():
     username_from_form = request.form.get("username")
     
     if not user_key:
-        print("DEBUG: No userKey in form data during submit")
+        log.debug("No userKey in form data during submit")
         return jsonify({"error": "Missing userKey"}), 400
         
-    start = timer()
     # Get username from form or session
     user = username_from_form or session.get("username", "unknown")
-    print(f"DEBUG: Submitting file for user: {user}, Key: {user_key}")
+    log.debug("Submitting file for user: %s, Key: %s", user, user_key)
 
     up_file = request.files.get("v_file")
     
     if not up_file or up_file.filename == '':
         return jsonify({"error": "No file provided"}), 400
 
-    # Read file content upfront to avoid stream exhaustion
-    file_content = up_file.read()
-    file_size = len(file_content)
-    
-    # Create a unique filename to avoid collisions
-    timestamp = int(timer() * 1000)
-    unique_id = str(uuid.uuid4())[:8]
     original_filename = up_file.filename
-    secure_name = f"{timestamp}_{unique_id}_{secure_filename(original_filename)}"
     
-    # Save the uploaded file in destination (for immediate access)
-    upload_path = os.path.join("app/static/Uploads/", secure_name)
-    os.makedirs(os.path.dirname(upload_path), exist_ok=True)
-    with open(upload_path, "wb") as f:
-        f.write(file_content)
+    # Refuse before storing anything if the transaction could not be queued
+    if not blockchain.pending.accepting():
+        return jsonify({"error": "Too many pending transactions, try again later"}), 503
         
     # Generate File Key
     file_key = str(uuid.uuid4())
     
-    # Store file content in MongoDB for persistence across server restarts
-    # This is critical for Render's ephemeral filesystem
-    file_base64 = base64.b64encode(file_content).decode('utf-8')
+    # Stream the upload in chunks while hashing it. Bodies are stored once
+    # per content (on disk for immediate access, in GridFS for persistence
+    # across server restarts - critical for Render's ephemeral filesystem),
+    # so re-uploading identical bytes only adds a reference.
+    start = time.perf_counter()
+    stored = file_store.ingest(up_file.stream)
+    metrics.observe_transfer("upload", stored["size"], time.perf_counter() - start)
+    file_size = stored["size"]
+    # The disk copy is named by its content hash
+    secure_name = stored["sha256"]
+    if stored["deduplicated"]:
+        log.debug("Content %s already stored, added a reference", secure_name)
     
-    # Save Metadata + Content to MongoDB
+    # Save Metadata to MongoDB (the body lives in GridFS)
     files_col.insert_one({
         "file_key": file_key,
         "filename": original_filename, 
         "secure_name": secure_name,   
         "owner": user_key,
         "shared_with": [],
-        "file_content": file_base64,
+        "gridfs_id": stored["gridfs_id"],
+        "sha256": stored["sha256"],
         "file_size": file_size,
         "created_at": timer()
     })
-    print(f"DEBUG: File saved to MongoDB. FileKey: {file_key}, Owner: {user_key}")
+    log.debug("File saved to MongoDB. FileKey: %s, Owner: %s", file_key, user_key)
 
     # Create a transaction object
     post_object = {
         "user": user,
         "v_file" : original_filename,
         "file_key": file_key,
+        "content_hash": stored["sha256"],
         "file_data" : "Binary Content Stored in DB", # Placeholder for chain view
         "file_size" : file_size
     }
    
     # Submit transaction directly to blockchain
-    blockchain.add_pending(post_object)
-    print(f"DEBUG: Transaction added to blockchain pending transactions")
+    try:
+        blockchain.add_pending(post_object)
+    except MempoolFull:
+        # Filled up while the file was uploading: undo the upload
+        files_col.delete_one({"file_key": file_key})
+        file_store.release(stored["sha256"])
+        return jsonify({"error": "Too many pending transactions, try again later"}), 503
+    log.debug("Transaction added to blockchain pending transactions")
     
-    end = timer()
-    print(f"DEBUG: Upload completed in {end - start}s")
     return jsonify({"success": True, "message": "File uploaded successfully", "file_key": file_key}), 200
 
 @app.route("/share", methods=["POST"])
@@ -217,7 +338,7 @@ def share_file():
     if not file_key or not recipient_key or not owner_key:
         return jsonify({"error": "Missing required fields"}), 400
     
-    print(f"DEBUG: Sharing file {file_key} from {owner_key} to {recipient_key}")
+    log.debug("Sharing file %s from %s to %s", file_key, owner_key, recipient_key)
     
     # Check ownership and share
     result = files_col.update_one(
@@ -226,14 +347,14 @@ def share_file():
     )
     
     if result.matched_count == 0:
-        print(f"DEBUG: File not found or not owned by {owner_key}")
+        log.debug("File not found or not owned by %s", owner_key)
         return jsonify({"error": "File not found or not owned by you"}), 404
     
     if result.modified_count > 0:
-        print(f"DEBUG: File shared successfully")
+        log.debug("File shared successfully")
         return jsonify({"success": True, "message": "File shared successfully"}), 200
     else:
-        print(f"DEBUG: File already shared with this user")
+        log.debug("File already shared with this user")
         return jsonify({"success": True, "message": "File already shared with this user"}), 200
 
 
@@ -249,7 +370,8 @@ def view_shared():
     shared_files = []
     
     # Find files shared by sender_key with my_key
-    cursor = files_col.find({"owner": sender_key, "shared_with": my_key})
+    cursor = files_col.find({"owner": sender_key, "shared_with": my_key},
+                            {"filename": 1, "file_key": 1, "secure_name": 1})
     for f_val in cursor:
         shared_files.append({
             "filename": f_val["filename"],
@@ -264,30 +386,109 @@ def view_shared():
     # If called from Flask template, render HTML
     return render_template("shared_files.html", files=shared_files)
 
+def send_grid_file(grid_out, download_name, etag=None):
+    """
+    Stream a GridFS file to the client with Range and conditional support.
+    
+    Args:
+        grid_out: Open, seekable GridFS file
+        download_name (str): File name offered to the client
+        etag (str): Strong ETag (the content hash), if known
+        
+    Returns:
+        Response: 200, 206 (partial content) or 304 (not modified)
+    """
+    rv = send_file(grid_out, as_attachment=True, download_name=download_name,
+                   conditional=False, etag=False)
+    rv.content_length = grid_out.length
+    if etag:
+        rv.set_etag(etag)
+    # Handles Range/If-Range (seeking the GridFS file) and If-None-Match
+    return rv.make_conditional(request.environ, accept_ranges=True, complete_length=grid_out.length)
+
+
+def track_download(rv, start):
+    """
+    Record a download's throughput once its body has been sent.
+    
+    Args:
+        rv (Response): Response returned by the download route
+        start (float): time.perf_counter() when the request started
+        
+    Returns:
+        Response: rv
+    """
+    size = rv.content_length
+    if rv.status_code not in (200, 206) or not size:
+        return rv
+    
+    def record():
+        metrics.observe_transfer("download", size, time.perf_counter() - start)
+    
+    # send_file bodies are passed straight to the WSGI server (which may use
+    # sendfile), so Response.call_on_close never runs for them. The server
+    # does close the body once it is sent: record the download from there.
+    body = rv.response
+    body_close = getattr(body, "close", None)
+    
+    def close():
+        try:
+            if body_close is not None:
+                body_close()
+        finally:
+            record()
+    
+    try:
+        body.close = close
+    except AttributeError:
+        rv.call_on_close(record)
+    return rv
+
+
 #creates a download link for the file
 @app.route("/download/<string:file_key>", methods = ["GET"])
 def download_file_key(file_key):
-    f_data = files_col.find_one({"file_key": file_key})
+    start = time.perf_counter()
+    # Never pull legacy base64 bodies along with the metadata
+    f_data = files_col.find_one({"file_key": file_key}, {"file_content": 0})
     
     if f_data:
         p = os.path.join(app.root_path, "static" , "Uploads", f_data["secure_name"])
+        # Content hash makes a strong ETag; older documents fall back to
+        # Werkzeug's mtime/size based one
+        etag = f_data.get("sha256", True)
         
-        # Check if file exists on disk. If not, restore from MongoDB.
-        if not os.path.exists(p):
-            print(f"DEBUG: File {p} missing from disk. Restoring from MongoDB.")
-            if "file_content" in f_data:
-                try:
-                    os.makedirs(os.path.dirname(p), exist_ok=True)
-                    content = base64.b64decode(f_data["file_content"])
-                    with open(p, "wb") as f:
-                        f.write(content)
-                except Exception as e:
-                    print(f"DEBUG: Error restoring file: {e}")
-                    return "Error restoring file from cloud storage", 500
-            else:
+        # Served with sendfile by the WSGI server; supports Range and
+        # If-None-Match (304)
+        if os.path.exists(p):
+            return track_download(send_file(p, as_attachment=True, download_name=f_data["filename"],
+                                            conditional=True, etag=etag), start)
+        
+        # Not on disk: stream the body straight from GridFS, chunk by chunk
+        if "gridfs_id" in f_data:
+            log.debug("File %s missing from disk. Streaming from GridFS.", p)
+            try:
+                grid_out = file_store.open(f_data["gridfs_id"])
+            except NoFile:
                 return "File content not found in database", 404
-                
-        return send_file(p, as_attachment=True, download_name=f_data["filename"])
+            return track_download(send_grid_file(grid_out, f_data["filename"], f_data.get("sha256")), start)
+        
+        # Legacy documents still holding base64 content (see migrate_files.py)
+        legacy = files_col.find_one({"file_key": file_key}, {"file_content": 1})
+        if legacy and "file_content" in legacy:
+            log.debug("File %s missing from disk. Restoring from MongoDB.", p)
+            try:
+                os.makedirs(os.path.dirname(p), exist_ok=True)
+                content = base64.b64decode(legacy["file_content"])
+                with open(p, "wb") as f:
+                    f.write(content)
+            except Exception as e:
+                log.warning("Error restoring file: %s", e)
+                return "Error restoring file from cloud storage", 500
+            return track_download(send_file(p, as_attachment=True, download_name=f_data["filename"],
+                                            conditional=True, etag=etag), start)
+        
+        return "File content not found in database", 404
             
     return "File not found or access denied"
 
@@ -309,36 +510,102 @@ def new_transaction():
         if not file_data.get(field):
             return "Transaction does not have valid fields!", 404
     
-    blockchain.add_pending(file_data)
+    try:
+        blockchain.add_pending(file_data)
+    except MempoolFull:
+        return "Too many pending transactions, try again later", 503
     return "Success", 201
 
 
 @app.route("/chain", methods=["GET"])
 def get_chain():
     """Get the entire blockchain"""
+    if SHARED_STATE:
+        # Serve the latest stored chain even if another worker just extended it
+        blockchain.refresh_from_db()
     chain = []
     for block in blockchain.chain:
-        # Call __dict__() as a method, not attribute
-        chain.append(block.__dict__())
+        chain.append(block.to_dict())
     
-    print("Chain Len: {0}".format(len(chain)))
+    log.debug("Chain Len: %d", len(chain))
     return json.dumps({"length": len(chain), "chain": chain})
 
 
+@app.route("/headers", methods=["GET"])
+def get_headers():
+    """Get block headers starting at ?start= (no transactions)"""
+    start = request.args.get("start", 0, type=int)
+    limit = request.args.get("limit", None, type=int)
+    headers = blockchain.get_headers(start, limit)
+    return json.dumps({"length": len(blockchain.chain), "headers": headers})
+
+
+@app.route("/blocks", methods=["GET"])
+def get_blocks():
+    """Get full blocks for the height range ?start=&end="""
+    start = request.args.get("start", 0, type=int)
+    end = request.args.get("end", None, type=int)
+    blocks = blockchain.get_blocks(start, end)
+    return json.dumps({"length": len(blockchain.chain), "blocks": blocks})
+
+
 @app.route("/mine", methods=["GET"])
 def mine_unconfirmed_transactions():
-    """Mine pending transactions"""
-    result = blockchain.mine()
-    if result:
-        return "Block #{0} mined successfully.".format(result)
-    else:
+    """Ask the background miner to mine pending transactions"""
+    if len(blockchain.pending) == 0:
         return "No pending transactions to mine."
+    miner.trigger()
+    return "Mining scheduled, see /mining/status.", 202
+
+
+@app.route("/mining/status", methods=["GET"])
+def mining_status():
+    """Get the background miner's current and last job"""
+    return jsonify(miner.status()), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Get this process's metrics in the Prometheus text format"""
+    metrics.CHAIN_HEIGHT.set(len(blockchain.chain))
+    metrics.MEMPOOL_SIZE.set(len(blockchain.pending))
+    metrics.DIFFICULTY.set(blockchain.difficulty)
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/profiles", methods=["GET"])
+def list_profiles():
+    """List the kept request profiles (PROFILING=1), newest first"""
+    with profiles_lock:
+        kept = list(profiles.values())
+    result = []
+    for profile in reversed(kept):
+        entry = {k: v for k, v in profile.items() if k != "profiler"}
+        entry.update(profile["profiler"].summary(top=5))
+        result.append(entry)
+    return jsonify({"enabled": PROFILING, "profiles": result}), 200
+
+
+@app.route("/profiles/<string:profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """Get one request profile; ?format=folded returns flame graph input"""
+    with profiles_lock:
+        profile = profiles.get(profile_id)
+    if profile is None:
+        return jsonify({"error": "Profile not found"}), 404
+    if request.args.get("format") == "folded":
+        return Response(profile["profiler"].folded(), mimetype="text/plain")
+    entry = {k: v for k, v in profile.items() if k != "profiler"}
+    entry.update(profile["profiler"].summary())
+    return jsonify(entry), 200
 
 
 @app.route("/pending_tx")
 def get_pending_tx():
-    """Get pending transactions"""
-    return json.dumps(blockchain.pending)
+    """Get pending transactions in mining order, paged with ?page=&per_page="""
+    page = request.args.get("page", 1, type=int)
+    per_page = min(max(request.args.get("per_page", TX_PAGE_SIZE, type=int), 1), TX_QUERY_MAX)
+    return json.dumps(blockchain.pending.page(page, per_page))
 
 
 @app.route("/add_block", methods=["POST"])
@@ -347,12 +614,11 @@ def validate_and_add_block():
     block_data = request.get_json()
     
     # Create a new block with the received data
-    block = Block(
-        block_data["index"],
-        block_data["transactions"],
-        block_data["prev_hash"]
-    )
-    hashl = block_data["hash"]
+    try:
+        block = Block.from_dict(block_data)
+    except (KeyError, TypeError, AttributeError):
+        return "The Block was discarded by the node.", 400
+    hashl = block.hash
     
     # Try to add the block
     added = blockchain.add_block(block, hashl)
@@ -361,3 +627,57 @@ def validate_and_add_block():
         return "The Block was discarded by the node.", 400
     
     return "The block was added to the chain.", 201
+
+
+@app.route("/add_blocks", methods=["POST"])
+def validate_and_add_blocks():
+    """Validate and add a batch of consecutive blocks"""
+    blocks_data = request.get_json().get("blocks", [])
+    try:
+        blocks = [Block.from_dict(block_data) for block_data in blocks_data]
+    except (KeyError, TypeError, AttributeError):
+        return "The blocks were discarded by the node.", 400
+    
+    added = blockchain.add_blocks(blocks)
+    
+    if added == 0 and blocks:
+        return "The blocks were discarded by the node.", 400
+    
+    return "{0} of {1} blocks were added to the chain.".format(added, len(blocks)), 201
+
+
+@app.route("/merkle_proof/<int:block_index>/<int:tx_index>", methods=["GET"])
+def get_merkle_proof(block_index, tx_index):
+    """Get a Merkle inclusion proof for one transaction"""
+    proof = blockchain.merkle_proof(block_index, tx_index)
+    if proof is None:
+        return jsonify({"error": "No Merkle proof for this block/transaction"}), 404
+    return jsonify(proof), 200
+
+
+@app.route("/merkle_proof/file/<string:file_key>", methods=["GET"])
+def get_file_merkle_proof(file_key):
+    """Get a Merkle inclusion proof for the transaction that stored a file"""
+    matches = tx_index.query(file_key=file_key, limit=1)
+    if not matches:
+        return jsonify({"error": "Transaction not found on chain"}), 404
+
+    proof = blockchain.merkle_proof(matches[0]["block_index"], matches[0]["position"])
+    if proof is None:
+        return jsonify({"error": "Block does not use the Merkle format"}), 404
+    return jsonify(proof), 200
+
+
+@app.route("/api/transactions", methods=["GET"])
+def query_transactions():
+    """Find on-chain transactions by ?user=, ?file_key=, ?v_file= and/or ?since=&until= (timestamps)"""
+    limit = min(max(request.args.get("limit", TX_PAGE_SIZE, type=int), 1), TX_QUERY_MAX)
+    matches = tx_index.query(
+        user=request.args.get("user"),
+        file_key=request.args.get("file_key"),
+        v_file=request.args.get("v_file"),
+        since=request.args.get("since", None, type=float),
+        until=request.args.get("until", None, type=float),
+        limit=limit
+    )
+    return jsonify({"count": len(matches), "transactions": matches}), 200
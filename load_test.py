@@ -0,0 +1,408 @@
+# End-to-end load test for the Flask node. Drives a weighted mix of
+#   index (GET /), chain (GET /chain), submit (POST /submit),
+#   download (GET /download/<file_key>) and view_shared (POST /view_shared)
+# from concurrent clients, after seeding users, shared files and a chain of
+# the requested length, and reports per endpoint: requests, errors, RPS,
+# p50/p90/p99 latency and (in-process only) memory allocated per request.
+#
+# The app runs in-process by default, against mongomock (pip install
+# mongomock) or against the MongoDB in MONGODB_URI with --mongo. Use a
+# throwaway database: the run writes users, files and blocks. --url load
+# tests a running node over HTTP instead.
+#
+# Usage: python load_test.py [--duration 30] [--concurrency 8] [--mix submit=1,download=4]
+#        python load_test.py --url http://127.0.0.1:9000 --output results.json
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from timeit import default_timer as timer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+UPLOADS = os.path.join(ROOT, "app", "static", "Uploads")
+
+DEFAULT_MIX = "index=3,chain=1,submit=2,download=4,view_shared=2"
+
+
+class InProcessClient:
+    """Flask test client with the same interface as HttpClient."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        body = response.get_data()
+        response.close()
+        return response.status_code, body
+
+    def post(self, path, data=None, files=None):
+        form = dict(data or {})
+        for field, (name, content) in (files or {}).items():
+            form[field] = (io.BytesIO(content), name)
+        response = self.client.post(path, data=form, content_type="multipart/form-data")
+        body = response.get_data()
+        response.close()
+        return response.status_code, body
+
+    def post_json(self, path, payload):
+        response = self.client.post(path, json=payload)
+        body = response.get_data()
+        response.close()
+        return response.status_code, body
+
+
+class HttpClient:
+    """Keep-alive HTTP client for a running node."""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def get(self, path):
+        response = self.session.get(self.base_url + path)
+        return response.status_code, response.content
+
+    def post(self, path, data=None, files=None):
+        files = {field: (name, content) for field, (name, content) in (files or {}).items()} or None
+        response = self.session.post(self.base_url + path, data=data, files=files)
+        return response.status_code, response.content
+
+    def post_json(self, path, payload):
+        response = self.session.post(self.base_url + path, json=payload)
+        return response.status_code, response.content
+
+
+def start_in_process_app(use_mongomock):
+    """
+    Import the app with MongoClient pointed at mongomock if requested.
+
+    Returns:
+        module: app.views
+    """
+    if use_mongomock:
+        try:
+            import mongomock
+            import mongomock.gridfs
+        except ImportError:
+            sys.exit("mongomock is not installed: pip install mongomock (or use --mongo / --url)")
+        import pymongo
+        mongomock.gridfs.enable_gridfs_integration()
+        pymongo.MongoClient = mongomock.MongoClient
+
+    # The app resolves its upload folder relative to the working directory
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    from app import views
+    return views
+
+
+def parse_size(text):
+    """Parse "512", "64k" or "2m" into bytes."""
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    text = text.strip().lower()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def parse_mix(text):
+    """Parse "name=weight,..." into a dict."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        sys.exit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+class Workload:
+    """Shared state of a run: users, their files and the file size range."""
+
+    def __init__(self, args):
+        self.min_size, self.max_size = args.file_size
+        self.users = []  # (username, key)
+        self.files = []  # (file_key, owner index)
+        self.lock = threading.Lock()
+
+    def file_content(self, rng):
+        # Random bytes, so every upload is new content (no deduplication)
+        return rng.randbytes(rng.randint(self.min_size, self.max_size))
+
+
+def op_index(client, work, rng, user):
+    return client.get("/")
+
+
+def op_chain(client, work, rng, user):
+    return client.get("/chain")
+
+
+def op_submit(client, work, rng, user):
+    username, key = work.users[user]
+    status, body = client.post("/submit", data={"userKey": key, "username": username},
+                               files={"v_file": (f"load-{rng.getrandbits(32):08x}.bin", work.file_content(rng))})
+    if status == 200:
+        with work.lock:
+            work.files.append((json.loads(body)["file_key"], user))
+    return status, body
+
+
+def op_download(client, work, rng, user):
+    file_key, _ = rng.choice(work.files)
+    return client.get(f"/download/{file_key}")
+
+
+def op_view_shared(client, work, rng, user):
+    # Seeded files are shared with the next user
+    sender = (user - 1) % len(work.users)
+    return client.post("/view_shared", data={"sender_key": work.users[sender][1], "userKey": work.users[user][1]})
+
+
+OPERATIONS = {
+    "index": op_index,
+    "chain": op_chain,
+    "submit": op_submit,
+    "download": op_download,
+    "view_shared": op_view_shared
+}
+
+
+def seed(args, make_client, views):
+    """Create users, shared files and a chain of at least args.chain_length blocks."""
+    work = Workload(args)
+    client = make_client()
+
+    for i in range(args.users):
+        username = f"load-user-{args.seed}-{i}"
+        client.post("/register", data={"username": username})
+        _, body = client.get(f"/api/get_key/{username}")
+        work.users.append((username, json.loads(body)["user_key"]))
+
+    rng = random.Random(args.seed)
+    for user in range(args.users):
+        for _ in range(args.files_per_user):
+            status, body = op_submit(client, work, rng, user)
+            if status != 200:
+                sys.exit(f"Seeding upload failed with {status}: {body[:200]!r}")
+            file_key = work.files[-1][0]
+            client.post("/share", data={"file_key": file_key, "userKey": work.users[user][1],
+                                        "recipient_key": work.users[(user + 1) % args.users][1]})
+
+    # Grow the chain with small transactions
+    blockchain = views.blockchain if views else None
+    counter = 0
+    while chain_length(client, blockchain) < args.chain_length:
+        for _ in range(args.txs_per_block):
+            counter += 1
+            transaction = {"user": "load", "v_file": f"seed-{counter}", "file_key": f"seed-{args.seed}-{counter}",
+                           "file_data": "Binary Content Stored in DB", "file_size": 1}
+            client.post_json("/new_transaction", transaction)
+        if blockchain is not None:
+            blockchain.mine()
+        else:
+            # The node mines in the background
+            client.get("/mine")
+            time.sleep(0.2)
+
+    return work
+
+
+def chain_length(client, blockchain):
+    if blockchain is not None:
+        return len(blockchain.chain)
+    _, body = client.get("/headers?start=0&limit=1")
+    return json.loads(body)["length"]
+
+
+def run_load(args, make_client, work, mix):
+    """Run the concurrent phase; returns per-operation samples and wall time."""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: {"latency": [], "errors": 0, "bytes": 0} for name in names}
+    samples_lock = threading.Lock()
+    deadline = timer() + args.duration
+    remaining = [args.requests] if args.requests else None
+
+    def worker(index):
+        client = make_client()
+        rng = random.Random(f"{args.seed}-{index}")
+        user = index % len(work.users)
+        # Each in-process client keeps its own session cookie
+        client.post("/register", data={"username": work.users[user][0]})
+
+        while timer() < deadline:
+            if remaining is not None:
+                with samples_lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+
+            name = rng.choices(names, weights)[0]
+            start = timer()
+            try:
+                status, body = OPERATIONS[name](client, work, rng, user)
+                failed = status >= 400
+            except Exception:
+                status, body, failed = None, b"", True
+            elapsed = timer() - start
+
+            with samples_lock:
+                entry = samples[name]
+                entry["latency"].append(elapsed)
+                entry["bytes"] += len(body)
+                if failed:
+                    entry["errors"] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    started = timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, timer() - started
+
+
+def measure_memory(make_client, work, mix, repeats):
+    """
+    Peak Python memory allocated per request, by operation. Runs requests one
+    at a time so allocations can be attributed to a single endpoint.
+    """
+    client = make_client()
+    rng = random.Random("memory")
+    client.post("/register", data={"username": work.users[0][0]})
+    result = {}
+
+    tracemalloc.start()
+    try:
+        for name in mix:
+            peaks = []
+            for _ in range(repeats):
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                OPERATIONS[name](client, work, rng, 0)
+                _, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+            result[name] = {"peak_kb_mean": statistics.fmean(peaks) / 1024, "peak_kb_max": max(peaks) / 1024}
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else None
+
+
+def report(samples, wall, memory):
+    endpoints = {}
+    for name, entry in samples.items():
+        latency = sorted(entry["latency"])
+        count = len(latency)
+        endpoints[name] = {
+            "requests": count,
+            "errors": entry["errors"],
+            "rps": count / wall if wall else 0.0,
+            "mb_per_sec": entry["bytes"] / wall / 1024 ** 2 if wall else 0.0,
+            "latency_ms": {
+                "mean": statistics.fmean(latency) * 1000 if latency else None,
+                "p50": percentile(latency, 50) * 1000 if latency else None,
+                "p90": percentile(latency, 90) * 1000 if latency else None,
+                "p99": percentile(latency, 99) * 1000 if latency else None,
+                "max": latency[-1] * 1000 if latency else None
+            }
+        }
+        if memory and name in memory:
+            endpoints[name]["memory"] = memory[name]
+
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "wall_sec": wall,
+        "requests": total,
+        "rps": total / wall if wall else 0.0,
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024),
+        "endpoints": endpoints
+    }
+
+
+def print_table(result, out):
+    print(f"{'endpoint':<12} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'mem kb':>8}", file=out)
+    for name, e in result["endpoints"].items():
+        lat = e["latency_ms"]
+        mem = e.get("memory", {}).get("peak_kb_mean")
+        print(f"{name:<12} {e['requests']:>7} {e['errors']:>5} {e['rps']:>8.1f} "
+              f"{lat['p50'] or 0:>8.1f} {lat['p99'] or 0:>8.1f} {'' if mem is None else f'{mem:.0f}':>8}", file=out)
+    print(f"total: {result['requests']} requests in {result['wall_sec']:.1f}s ({result['rps']:.1f} rps), "
+          f"max RSS {result['max_rss_mb']:.0f} MB", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the file storage node")
+    parser.add_argument("--url", help="Test a running node over HTTP instead of in-process")
+    parser.add_argument("--mongo", action="store_true", help="In-process: use MONGODB_URI instead of mongomock")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0 = no limit)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted operations, e.g. submit=1,download=4")
+    parser.add_argument("--file-size", default="1k-64k", help="Upload size or range, e.g. 4k or 1k-1m")
+    parser.add_argument("--users", type=int, default=4, help="Users to create")
+    parser.add_argument("--files-per-user", type=int, default=5, help="Files each user uploads and shares before the run")
+    parser.add_argument("--chain-length", type=int, default=50, help="Blocks on the chain before the run")
+    parser.add_argument("--txs-per-block", type=int, default=10, help="Transactions per seeded block")
+    parser.add_argument("--memory-repeats", type=int, default=5, help="In-process: requests per endpoint for memory sampling (0 = skip)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for users, files and the request mix")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own output")
+    args = parser.parse_args()
+
+    low, _, high = args.file_size.partition("-")
+    args.file_size = (parse_size(low), parse_size(high or low))
+    mix = parse_mix(args.mix)
+    out = sys.stdout
+    existing_uploads = set(os.listdir(UPLOADS)) if os.path.isdir(UPLOADS) else set()
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        if args.url:
+            views = None
+            make_client = lambda: HttpClient(args.url)
+        else:
+            views = start_in_process_app(use_mongomock=not args.mongo)
+            make_client = lambda: InProcessClient(views.app)
+
+        work = seed(args, make_client, views)
+        samples, wall = run_load(args, make_client, work, mix)
+        memory = measure_memory(make_client, work, mix, args.memory_repeats) if views and args.memory_repeats else None
+
+    result = report(samples, wall, memory)
+    result["parameters"] = {k: v for k, v in vars(args).items()}
+
+    if views is not None and not args.mongo:
+        # mongomock runs leave nothing in a database; drop their disk copies too
+        for name in set(os.listdir(UPLOADS)) - existing_uploads:
+            os.remove(os.path.join(UPLOADS, name))
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print_table(result, out)
+    else:
+        print(output, file=out)
+        print_table(result, sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Merkle tree helpers for block transactions.
+
+Leaves and inner nodes are hashed with different one-byte prefixes
+(0x00 / 0x01) so a leaf can never be passed off as an inner node. An odd
+node at the end of a level is promoted unchanged instead of being
+duplicated.
+"""
+
+import json
+from hashlib import sha256
+
+# Root of a block without transactions
+EMPTY_ROOT = sha256(b"").hexdigest()
+
+
+def tx_hash(transaction):
+    """
+    Hash a single transaction as a Merkle leaf.
+
+    Args:
+        transaction (dict): Transaction data
+
+    Returns:
+        str: Hexadecimal leaf hash
+    """
+    tx_string = json.dumps(transaction, sort_keys=True)
+    return sha256(b"\x00" + tx_string.encode()).hexdigest()
+
+
+def _hash_pair(left, right):
+    """Hash two hex node hashes into their parent node."""
+    return sha256(b"\x01" + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def _next_level(level):
+    """Combine one level of the tree into the level above it."""
+    parents = []
+    for i in range(0, len(level) - 1, 2):
+        parents.append(_hash_pair(level[i], level[i + 1]))
+    if len(level) % 2 == 1:
+        parents.append(level[-1])
+    return parents
+
+
+def merkle_root(tx_hashes):
+    """
+    Compute the Merkle root of a list of leaf hashes.
+
+    Args:
+        tx_hashes (list): Leaf hashes from tx_hash()
+
+    Returns:
+        str: Hexadecimal root hash
+    """
+    if not tx_hashes:
+        return EMPTY_ROOT
+
+    level = list(tx_hashes)
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0]
+
+
+def merkle_proof(tx_hashes, position):
+    """
+    Build an inclusion proof for the leaf at the given position.
+
+    Args:
+        tx_hashes (list): Leaf hashes from tx_hash()
+        position (int): Index of the leaf to prove
+
+    Returns:
+        list: Sibling steps from leaf to root, each {"hash": str, "side": "left"|"right"}
+    """
+    if position < 0 or position >= len(tx_hashes):
+        raise IndexError("transaction position out of range")
+
+    proof = []
+    level = list(tx_hashes)
+    while len(level) > 1:
+        sibling = position ^ 1
+        # A promoted odd node has no sibling at this level
+        if sibling < len(level):
+            side = "left" if sibling < position else "right"
+            proof.append({"hash": level[sibling], "side": side})
+        level = _next_level(level)
+        position //= 2
+    return proof
+
+
+def verify_proof(leaf_hash, proof, root):
+    """
+    Check that a leaf hash is included under a Merkle root.
+
+    Args:
+        leaf_hash (str): Hash of the transaction, from tx_hash()
+        proof (list): Steps returned by merkle_proof()
+        root (str): Expected Merkle root
+
+    Returns:
+        bool: True if the proof leads to the root
+    """
+    node = leaf_hash
+    try:
+        for step in proof:
+            if step["side"] == "left":
+                node = _hash_pair(step["hash"], node)
+            else:
+                node = _hash_pair(node, step["hash"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return node == root
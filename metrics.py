@@ -0,0 +1,408 @@
+# Import libraries
+import bisect
+import collections
+import itertools
+import os
+import sys
+import threading
+import time
+from pymongo import monitoring
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Default histogram buckets (seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Hashes per second, and bytes per second
+HASH_RATE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 5e7)
+THROUGHPUT_BUCKETS = (1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8, 5e8, 1e9)
+
+# Distinct peers labelled by URL; any peer after that is labelled "other".
+# Peers come from the unauthenticated /register_node, so their number is
+# not bounded
+MAX_PEER_LABELS = 32
+MAX_PEER_LABEL_LENGTH = 200
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in itertools.chain(zip(names, values), extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class: one named metric with a child per label combination."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        """
+        Format the metric in the Prometheus text exposition format.
+
+        Returns:
+            list: Lines of text
+        """
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+            for key, child in children:
+                lines.extend(self._render_child(key, child))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def _render_child(self, key, value):
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = value
+
+    def _render_child(self, key, value):
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                # Per-bucket counts (last one is +Inf), sum
+                child = self._children[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            child[0][slot] += 1
+            child[1] += value
+
+    def time(self, **labels):
+        """
+        Context manager observing the seconds spent in its body.
+
+        Returns:
+            Timer: Context manager
+        """
+        return Timer(self, labels)
+
+    def _render_child(self, key, child):
+        counts, total = child
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = (("le", _number(float(bound))),)
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_number(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Timer:
+    """Context manager that observes elapsed seconds into a histogram."""
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = None
+        self.elapsed = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed, **self.labels)
+        return False
+
+
+class Registry:
+    """Collection of metrics rendered together by /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """
+        Format every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: Exposition text
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry and the metrics recorded by the node
+REGISTRY = Registry()
+
+MINING_SECONDS = REGISTRY.histogram(
+    "blockchain_mining_seconds", "Time spent mining one block", ("outcome",), DURATION_BUCKETS)
+HASH_RATE = REGISTRY.histogram(
+    "blockchain_pow_hashes_per_second", "Proof-of-work hash rate of one search", ("method",), HASH_RATE_BUCKETS)
+POW_ATTEMPTS = REGISTRY.counter(
+    "blockchain_pow_attempts_total", "Nonces tried by proof of work", ("method",))
+VALIDATION_SECONDS = REGISTRY.histogram(
+    "blockchain_validation_seconds", "Time spent validating blocks", ("kind",))
+VALIDATED_BLOCKS = REGISTRY.counter(
+    "blockchain_validated_blocks_total", "Blocks checked by validation", ("kind",))
+CONSENSUS_SECONDS = REGISTRY.histogram(
+    "blockchain_consensus_round_seconds", "Duration of a whole consensus round", (), DURATION_BUCKETS)
+CONSENSUS_PEER_SECONDS = REGISTRY.histogram(
+    "blockchain_consensus_peer_seconds", "Time to sync with one peer during consensus", ("peer", "outcome"))
+MONGO_SECONDS = REGISTRY.histogram(
+    "mongodb_command_seconds", "Latency of MongoDB commands", ("command", "outcome"))
+TRANSFER_RATE = REGISTRY.histogram(
+    "file_transfer_bytes_per_second", "Throughput of file uploads and downloads", ("direction",), THROUGHPUT_BUCKETS)
+TRANSFER_BYTES = REGISTRY.counter(
+    "file_transfer_bytes_total", "Bytes of file bodies uploaded and downloaded", ("direction",))
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "Time spent handling HTTP requests", ("endpoint", "method", "status"))
+CHAIN_HEIGHT = REGISTRY.gauge("blockchain_height", "Number of blocks in the chain")
+MEMPOOL_SIZE = REGISTRY.gauge("blockchain_mempool_transactions", "Transactions in the mempool")
+DIFFICULTY = REGISTRY.gauge("blockchain_difficulty", "Difficulty of the next block")
+
+
+def observe_pow(method, attempts, elapsed):
+    """
+    Record one proof-of-work search.
+
+    Args:
+        method (str): "random", "incremental" or "parallel"
+        attempts (int): Nonces tried
+        elapsed (float): Seconds the search took
+    """
+    POW_ATTEMPTS.inc(attempts, method=method)
+    if elapsed > 0:
+        HASH_RATE.observe(attempts / elapsed, method=method)
+
+
+_peer_labels = set()
+_peer_labels_lock = threading.Lock()
+
+
+def peer_label(peer):
+    """
+    Get the label value for a peer URL, keeping the number of series bounded.
+
+    Args:
+        peer (str): URL of peer node
+
+    Returns:
+        str: The URL (without a trailing slash) for the first
+            MAX_PEER_LABELS distinct peers, "other" for the rest
+    """
+    peer = str(peer).rstrip("/")
+    if len(peer) > MAX_PEER_LABEL_LENGTH:
+        return "other"
+    with _peer_labels_lock:
+        if peer in _peer_labels or len(_peer_labels) < MAX_PEER_LABELS:
+            _peer_labels.add(peer)
+            return peer
+    return "other"
+
+
+def observe_consensus_peer(peer, outcome, elapsed):
+    """
+    Record how long one peer took to sync during consensus.
+
+    Args:
+        peer (str): URL of peer node
+        outcome (str): "candidate" or "none"
+        elapsed (float): Seconds the sync took
+    """
+    CONSENSUS_PEER_SECONDS.observe(elapsed, peer=peer_label(peer), outcome=outcome)
+
+
+def observe_transfer(direction, size, elapsed):
+    """
+    Record one file upload or download.
+
+    Args:
+        direction (str): "upload" or "download"
+        size (int): Bytes transferred
+        elapsed (float): Seconds the transfer took
+    """
+    TRANSFER_BYTES.inc(size, direction=direction)
+    if size and elapsed > 0:
+        TRANSFER_RATE.observe(size / elapsed, direction=direction)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Records the latency of every MongoDB command.
+
+    Pass an instance to MongoClient(event_listeners=[...]).
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome="ok")
+
+    def failed(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome="error")
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for one thread.
+
+    A background thread samples the target thread's stack every interval
+    seconds. The result is a count per distinct stack in the "folded"
+    format read by flamegraph.pl and speedscope. Overhead is one stack walk
+    per sample, so it is meant to be switched on for single requests.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        """
+        Initialize the profiler (call start() to begin sampling).
+
+        Args:
+            thread_id (int): Thread to sample (defaults to the calling thread)
+            interval (float): Seconds between samples
+        """
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started_at = None
+        self.elapsed = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop sampling.
+
+        Returns:
+            SamplingProfiler: self
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started_at
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        """
+        Get the samples in the folded stack format.
+
+        Returns:
+            str: One "frame;frame;... count" line per distinct stack, most sampled first
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top=20):
+        """
+        Get the functions seen most often, by inclusive sample count.
+
+        Args:
+            top (int): Number of functions to return
+
+        Returns:
+            dict: samples, interval, elapsed and top (list of {frame, samples, percent})
+        """
+        inclusive = collections.Counter()
+        for stack, count in self.stacks.items():
+            # Count each function once per sample, even when recursive
+            for frame in {frame.rsplit(":", 1)[0] for frame in stack.split(";")}:
+                inclusive[frame] += count
+        return {
+            "samples": self.samples,
+            "interval": self.interval,
+            "elapsed": self.elapsed,
+            "top": [{"frame": frame, "samples": count,
+                     "percent": round(100 * count / self.samples, 1) if self.samples else 0.0}
+                    for frame, count in inclusive.most_common(top)]
+        }
@@ -0,0 +1,30 @@
+# Moves file bodies stored as base64 strings in the files collection into
+# GridFS, leaving only metadata in files. Safe to run more than once.
+#
+# Usage: python migrate_files.py
+
+import os
+from pymongo import MongoClient
+from dotenv import load_dotenv
+from FileStore import FileStore
+
+load_dotenv()
+
+MONGODB_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017/file_storage")
+
+
+def main():
+    client = MongoClient(MONGODB_URI)
+    db = client["file_storage"]
+    files_col = db["files"]
+
+    remaining = files_col.count_documents({"file_content": {"$exists": True}})
+    print(f"Documents with base64 content: {remaining}")
+
+    store = FileStore(db, "app/static/Uploads")
+    migrated = store.migrate_base64(files_col)
+    print(f"Migrated {migrated} documents to GridFS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Proof-of-work targets and multi-process nonce search.
+
+A hash is valid when its raw 32-byte digest, read as a big-endian number,
+is below the target. A difficulty d (d leading hex zeros) is the target
+2 ** (256 - 4 * d), so targets also express every old difficulty exactly.
+
+The nonce space is split into fixed-size chunks that are dealt out to the
+worker processes round-robin, so every worker scans a disjoint set of
+ranges. The first worker that finds a valid hash signals the others to stop.
+"""
+
+import math
+import multiprocessing
+import os
+import queue
+from hashlib import sha256
+
+# Number of nonces a worker scans before moving to its next range
+CHUNK_SIZE = 10000
+
+# How often (in attempts) a worker checks whether another worker already won
+CHECK_EVERY = 1000
+
+# How often (in seconds) the parent process checks whether to give up
+POLL_INTERVAL = 0.1
+
+# How often (in seconds) a miner updates the solve time recorded in the
+# block; the hash template changes, so the search restarts from it
+SOLVE_TIME_STEP = 0.5
+
+# Largest target that fits in a digest (every hash is below it)
+MAX_TARGET = 2 ** 256 - 1
+
+
+def difficulty_to_target(difficulty):
+    """
+    Convert a difficulty in leading hex zeros to a target.
+
+    Args:
+        difficulty (int|float): Leading zeros; fractions give targets in between
+
+    Returns:
+        int: Target a digest must be below
+    """
+    if isinstance(difficulty, int):
+        return min(1 << (256 - 4 * difficulty), MAX_TARGET)
+    return min(int(2.0 ** (256 - 4 * difficulty)), MAX_TARGET)
+
+
+def target_to_difficulty(target):
+    """
+    Convert a target to a (fractional) difficulty in leading hex zeros.
+
+    Args:
+        target (int): Target a digest must be below
+
+    Returns:
+        float: Equivalent difficulty
+    """
+    return (256 - math.log2(target)) / 4
+
+
+def target_to_hex(target):
+    """
+    Format a target the way blocks store it.
+
+    Args:
+        target (int): Target a digest must be below
+
+    Returns:
+        str: 64 lowercase hex digits
+    """
+    return "%064x" % target
+
+
+def target_bytes(target):
+    """
+    Encode a target for comparison with raw digests.
+
+    Equal-length byte strings compare like the big-endian numbers they
+    encode, so digest < target_bytes(target) needs no conversion per attempt.
+
+    Args:
+        target (int): Target a digest must be below
+
+    Returns:
+        bytes: 32-byte big-endian target
+    """
+    return min(target, MAX_TARGET).to_bytes(32, "big")
+
+
+def target_to_work(target):
+    """
+    Get the expected number of attempts to find a hash below a target.
+
+    Chains are compared by the sum of this over their blocks.
+
+    Args:
+        target (int): Target a digest must be below
+
+    Returns:
+        int: About 2 ** 256 / target
+    """
+    return (1 << 256) // (target + 1)
+
+
+def _search(prefix_bytes, suffix_bytes, target, first_nonce, stride, chunk_size, found, results):
+    """
+    Worker loop: scan chunks starting at first_nonce, stride apart.
+
+    Args:
+        prefix_bytes (bytes): Preimage bytes before the nonce (Block.hash_template())
+        suffix_bytes (bytes): Preimage bytes after the nonce
+        target (bytes): Digests must be below this (see target_bytes())
+        first_nonce (int): First nonce of this worker's first chunk
+        stride (int): Distance between the starts of consecutive chunks
+        chunk_size (int): Number of nonces per chunk
+        found (Event): Set once any worker has a valid hash
+        results (Queue): Receives the winning (nonce, hash) tuple
+    """
+    # SHA256 state over the nonce-independent prefix, copied per attempt
+    base = sha256(prefix_bytes)
+
+    start = first_nonce
+    while not found.is_set():
+        for nonce in range(start, start + chunk_size):
+            if nonce % CHECK_EVERY == 0 and found.is_set():
+                return
+            h = base.copy()
+            h.update(b"%d" % nonce)
+            h.update(suffix_bytes)
+            if h.digest() < target:
+                found.set()
+                results.put((nonce, h.hexdigest()))
+                return
+        start += stride
+
+
+def parallel_p_o_w(block, target, workers=None, chunk_size=CHUNK_SIZE, start_nonce=0, stop=None):
+    """
+    Search for a valid nonce using a pool of worker processes.
+
+    The block itself is not modified; the caller decides what to do
+    with the result.
+
+    Args:
+        block (Block): Block to mine
+        target (int): Target the hash must be below
+        workers (int): Number of processes (defaults to the CPU count)
+        chunk_size (int): Number of nonces per range handed to a worker
+        start_nonce (int): Nonce where the search begins
+        stop (callable): Polled while searching; returning True abandons the search
+
+    Returns:
+        tuple|None: (nonce, hash) where hash equals block.generate_hash() for
+            that nonce, or None if the search was stopped
+    """
+    workers = workers or os.cpu_count() or 1
+    # Serialize the block once; workers only append the nonce bytes
+    prefix_bytes, suffix_bytes = block.hash_template()
+
+    ctx = multiprocessing.get_context()
+    found = ctx.Event()
+    results = ctx.Queue()
+
+    procs = []
+    for i in range(workers):
+        proc = ctx.Process(
+            target=_search,
+            args=(prefix_bytes, suffix_bytes, target_bytes(target), start_nonce + i * chunk_size,
+                  workers * chunk_size, chunk_size, found, results),
+            daemon=True
+        )
+        proc.start()
+        procs.append(proc)
+
+    try:
+        while True:
+            try:
+                nonce, get_hash = results.get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                if stop is not None and stop():
+                    return None
+    finally:
+        # Stop the remaining workers
+        found.set()
+        for proc in procs:
+            proc.join(timeout=1)
+            if proc.is_alive():
+                proc.terminate()
+
+    return nonce, get_hash
@@ -1,9 +1,12 @@
 # Import libraries
 import json
 import argparse
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from Blockchain import Blockchain
 from Block import Block
+from Mempool import MempoolFull
+from MiningScheduler import MiningScheduler
+import metrics
 
 # Create Flask app
 app = Flask(__name__)
@@ -11,6 +14,9 @@ app = Flask(__name__)
 # Create blockchain instance
 blockchain = Blockchain()
 
+# Background miner, started in __main__ (only mines on /mine by default)
+miner = MiningScheduler(blockchain, threshold=0, interval=0)
+
 # Store port for this peer
 peer_port = 8800
 
@@ -35,8 +41,13 @@ def new_transaction():
             return jsonify({"error": f"Missing field: {field}"}), 400
     
     # Add to pending transactions
-    blockchain.add_pending(file_data)
+    try:
+        added = blockchain.add_pending(file_data)
+    except MempoolFull as e:
+        return jsonify({"error": str(e)}), 503
     
+    if not added:
+        return jsonify({"message": "Transaction already pending"}), 200
     return jsonify({"message": "Transaction added to pending"}), 201
 
 
@@ -52,14 +63,7 @@ def get_chain():
     # Convert chain to JSON-serializable format
     chain = []
     for block in blockchain.chain:
-        chain.append({
-            "index": block.index,
-            "timestamp": block.timestamp,
-            "transactions": block.transactions,
-            "prev_hash": block.prev_hash,
-            "nonce": block.nonce,
-            "hash": block.hash
-        })
+        chain.append(block.to_dict())
     
     print(f"Chain Len: {len(chain)}")
     
@@ -69,36 +73,82 @@ def get_chain():
     })
 
 
+@app.route("/headers", methods=["GET"])
+def get_headers():
+    """
+    Get block headers (no transactions) starting at a height.
+    
+    Query parameters:
+    - start: Height of the first header (default 0)
+    - limit: Maximum number of headers to return
+    """
+    start = request.args.get("start", 0, type=int)
+    limit = request.args.get("limit", None, type=int)
+    
+    return jsonify({
+        "length": len(blockchain.chain),
+        "headers": blockchain.get_headers(start, limit)
+    })
+
+
+@app.route("/blocks", methods=["GET"])
+def get_blocks():
+    """
+    Get full blocks for a height range, used to fetch only missing bodies.
+    
+    Query parameters:
+    - start: Height of the first block (default 0)
+    - end: Height after the last block (default: chain length)
+    """
+    start = request.args.get("start", 0, type=int)
+    end = request.args.get("end", None, type=int)
+    
+    return jsonify({
+        "length": len(blockchain.chain),
+        "blocks": blockchain.get_blocks(start, end)
+    })
+
+
 @app.route("/mine", methods=["GET"])
 def mine_unconfirmed_transactions():
     """
-    Mine pending transactions into a new block.
-    After mining, announce the block to all peers.
+    Ask the background miner to mine pending transactions into a new block.
+    Returns immediately; the miner announces the block to all peers once
+    it is found. Progress is reported by /mining/status.
     """
-    result = blockchain.mine()
-    
-    if result:
-        # Get the newly mined block
-        new_block = blockchain.chain[result]
-        
-        # Announce to all peers
-        blockchain.announce_block(new_block)
-        
-        return jsonify({
-            "message": f"Block #{result} mined successfully",
-            "index": result,
-            "hash": new_block.hash
-        }), 200
-    else:
+    if len(blockchain.pending) == 0:
         return jsonify({"message": "No pending transactions to mine"}), 200
+    
+    return jsonify({
+        "message": "Mining scheduled",
+        "status": miner.trigger()
+    }), 202
+
+
+@app.route("/mining/status", methods=["GET"])
+def mining_status():
+    """Get the background miner's current and last job."""
+    return jsonify(miner.status())
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Get mining, validation and consensus metrics in the Prometheus text format."""
+    metrics.CHAIN_HEIGHT.set(len(blockchain.chain))
+    metrics.MEMPOOL_SIZE.set(len(blockchain.pending))
+    metrics.DIFFICULTY.set(blockchain.difficulty)
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.route("/pending_tx")
 def get_pending_tx():
-    """Get all pending transactions."""
+    """Get pending transactions in mining order, paged with ?page=&per_page=."""
+    page = request.args.get("page", 1, type=int)
+    per_page = min(max(request.args.get("per_page", 100, type=int), 1), 1000)
     return jsonify({
         "count": len(blockchain.pending),
-        "transactions": blockchain.pending
+        "page": page,
+        "transactions": blockchain.pending.page(page, per_page)
     })
 
 
@@ -111,14 +161,11 @@ def validate_and_add_block():
     block_data = request.get_json()
     
     # Create block from received data
-    block = Block(
-        block_data["index"],
-        block_data["transactions"],
-        block_data["prev_hash"]
-    )
-    block.timestamp = block_data.get("timestamp", block.timestamp)
-    block.nonce = block_data["nonce"]
-    hashl = block_data["hash"]
+    try:
+        block = Block.from_dict(block_data)
+    except (KeyError, TypeError, AttributeError):
+        return jsonify({"message": "Block discarded by node"}), 400
+    hashl = block.hash
     
     # Try to add the block
     added = blockchain.add_block(block, hashl)
@@ -129,6 +176,46 @@ def validate_and_add_block():
     return jsonify({"message": "Block added to chain"}), 201
 
 
+@app.route("/merkle_proof/<int:block_index>/<int:tx_index>", methods=["GET"])
+def get_merkle_proof(block_index, tx_index):
+    """
+    Get a Merkle inclusion proof for one transaction.
+    Lets a client verify a single file transaction against the block
+    header without downloading the whole block.
+    """
+    proof = blockchain.merkle_proof(block_index, tx_index)
+    
+    if proof is None:
+        return jsonify({"error": "No Merkle proof for this block/transaction"}), 404
+    
+    return jsonify(proof), 200
+
+
+@app.route("/add_blocks", methods=["POST"])
+def validate_and_add_blocks():
+    """
+    Receive a batch of consecutive blocks from another peer.
+    
+    Request body should contain:
+    - blocks: List of blocks in chain order
+    """
+    blocks_data = request.get_json().get("blocks", [])
+    try:
+        blocks = [Block.from_dict(block_data) for block_data in blocks_data]
+    except (KeyError, TypeError, AttributeError):
+        return jsonify({"message": "Blocks discarded by node", "added": 0}), 400
+    
+    added = blockchain.add_blocks(blocks)
+    
+    if added == 0 and blocks:
+        return jsonify({"message": "Blocks discarded by node", "added": 0}), 400
+    
+    return jsonify({
+        "message": f"{added} of {len(blocks)} blocks added to chain",
+        "added": added
+    }), 201
+
+
 @app.route("/register_node", methods=["POST"])
 def register_node():
     """
@@ -148,14 +235,7 @@ def register_node():
     # Return current chain for the new peer to sync
     chain = []
     for block in blockchain.chain:
-        chain.append({
-            "index": block.index,
-            "timestamp": block.timestamp,
-            "transactions": block.transactions,
-            "prev_hash": block.prev_hash,
-            "nonce": block.nonce,
-            "hash": block.hash
-        })
+        chain.append(block.to_dict())
     
     
     return jsonify({
@@ -175,7 +255,7 @@ def sync_chain():
     
     if replaced:
         return jsonify({
-            "message": "Chain replaced with longer chain from network",
+            "message": "Chain replaced with heavier chain from network",
             "length": len(blockchain.chain)
         }), 200
     else:
@@ -187,10 +267,11 @@ def sync_chain():
 
 @app.route("/peers", methods=["GET"])
 def get_peers():
-    """Get list of registered peer nodes."""
+    """Get list of registered peer nodes and block delivery latency."""
     return jsonify({
         "count": len(blockchain.peers),
-        "peers": list(blockchain.peers)
+        "peers": blockchain.peer_list(),
+        "latency": blockchain.client.latency_stats()
     })
 
 
@@ -201,6 +282,7 @@ def get_info():
         "port": peer_port,
         "chain_length": len(blockchain.chain),
         "pending_transactions": len(blockchain.pending),
+        "mempool": blockchain.pending.stats(),
         "difficulty": blockchain.difficulty,
         "peers": len(blockchain.peers)
     })
@@ -210,12 +292,36 @@ if __name__ == "__main__":
     # Parse command line arguments for port
     parser = argparse.ArgumentParser(description='Run blockchain peer node')
     parser.add_argument('--port', type=int, default=8800, help='Port to run peer on')
+    parser.add_argument('--workers', type=int, default=1, help='Processes used for mining')
+    parser.add_argument('--merkle', action='store_true', help='Mine Merkle-root format blocks')
+    parser.add_argument('--max-pending', type=int, default=10000, help='Mempool size cap')
+    parser.add_argument('--max-block-txs', type=int, default=500, help='Transactions per mined block')
+    parser.add_argument('--mine-threshold', type=int, default=0, help='Pending transactions that start mining (0 = off)')
+    parser.add_argument('--mine-interval', type=float, default=0, help='Seconds between automatic mining runs (0 = off)')
+    parser.add_argument('--target-block-time', type=float, default=Blockchain.target_block_time,
+                        help='Seconds of proof of work per block that difficulty retargeting aims for (0 = fixed difficulty)')
+    parser.add_argument('--retarget-window', type=int, default=Blockchain.retarget_window,
+                        help='Blocks between difficulty retargets')
+    parser.add_argument('--header-store', action='store_true',
+                        help='Serve /headers from a columnar copy of every header (more memory, faster /headers)')
     args = parser.parse_args()
     
     peer_port = args.port
+    blockchain.workers = args.workers
+    blockchain.merkle = args.merkle
+    blockchain.pending.max_size = args.max_pending
+    blockchain.pending.max_block_txs = args.max_block_txs
+    blockchain.target_block_time = args.target_block_time
+    blockchain.retarget_window = args.retarget_window
+    if args.header_store:
+        blockchain.enable_header_store()
+    miner.threshold = args.mine_threshold
+    miner.interval = args.mine_interval
+    miner.start()
     
     print(f"Starting blockchain peer on port {peer_port}")
-    print(f"Difficulty: {blockchain.difficulty}")
+    print(f"Difficulty: {blockchain.difficulty} (target solve time {blockchain.target_block_time}s)")
+    print(f"Mining workers: {blockchain.workers}")
     print(f"Genesis block hash: {blockchain.chain[0].hash}")
     
     # Run Flask app
@@ -0,0 +1,274 @@
+# Proof-of-work benchmark suite. Measures, with seeded and reproducible
+# inputs:
+#   - hash_rate: raw attempts per second of Block.hasher(raw=True)
+#   - time_to_solution: distribution of p_o_w (random nonce) and p_o_w_2
+#     (incremental nonce) solve times over many trials per difficulty
+#   - block_size: hash rate as the number of transactions grows, for the
+#     legacy and the Merkle-root block formats
+#   - parallel: solve time and effective hash rate of parallel_p_o_w by
+#     number of worker processes
+# Difficulties are leading hex zeros and may be fractional (e.g. 3.5); each
+# is mined as the equivalent 256-bit target.
+# Results are written as JSON so runs on different commits can be compared;
+# --baseline fails the run when hash rates drop by more than --tolerance.
+#
+# Usage: python pow_benchmark.py [--quick] [--output results.json]
+#        python pow_benchmark.py --baseline results.json
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import time
+from timeit import default_timer as timer
+from Block import Block
+from Blockchain import Blockchain
+from mining import parallel_p_o_w, difficulty_to_target, target_to_hex
+
+
+def random_transaction(rng):
+    """Build a file transaction with random contents."""
+    def text(n):
+        return "".join(rng.choice(string.ascii_letters) for _ in range(n))
+
+    return {
+        "user": text(rng.randint(1, 20)),
+        "v_file": text(rng.randint(1, 20)),
+        "file_key": text(32),
+        "file_data": text(rng.randint(0, 200)),
+        "file_size": rng.randint(0, 1000)
+    }
+
+
+def make_block(rng, transactions, merkle=False):
+    """Build a block whose contents (and therefore solutions) depend only on rng."""
+    block = Block(rng.randint(1, 100000), [random_transaction(rng) for _ in range(transactions)],
+                  "%064x" % rng.getrandbits(256), merkle=merkle)
+    block.timestamp = 1_600_000_000 + rng.random() * 100_000_000
+    return block
+
+
+def difficulty_arg(text):
+    """Parse a difficulty, keeping whole numbers exact."""
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def summarize(samples):
+    """Distribution summary of a list of numbers."""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "min": ordered[0],
+        "p50": pct(50),
+        "p90": pct(90),
+        "p99": pct(99),
+        "max": ordered[-1]
+    }
+
+
+def measure_hash_rate(block, seconds):
+    """Attempts per second of the per-nonce hash function for one block."""
+    hash_nonce = block.hasher(raw=True)
+    attempts = 0
+    start = timer()
+    deadline = start + seconds
+    while True:
+        for nonce in range(attempts, attempts + 1000):
+            hash_nonce(nonce)
+        attempts += 1000
+        now = timer()
+        if now >= deadline:
+            return attempts / (now - start)
+
+
+def bench_hash_rate(seed, transactions, seconds, repeats):
+    rng = random.Random(seed)
+    rates = [measure_hash_rate(make_block(rng, transactions), seconds) for _ in range(repeats)]
+    return {"transactions": transactions, "hashes_per_sec": summarize(rates)}
+
+
+def bench_time_to_solution(seed, difficulties, trials, transactions):
+    chain = Blockchain()
+    results = []
+
+    for difficulty in difficulties:
+        rng = random.Random(f"{seed}-{difficulty}")
+        random_times, incremental_times, incremental_attempts = [], [], []
+
+        for trial in range(trials):
+            block = make_block(rng, transactions)
+            block.target = target_to_hex(difficulty_to_target(difficulty))
+
+            # p_o_w draws its nonces from the global random module
+            random.seed(f"{seed}-{difficulty}-{trial}")
+            start = timer()
+            chain.p_o_w(block)
+            random_times.append(timer() - start)
+
+            start = timer()
+            chain.p_o_w_2(block)
+            incremental_times.append(timer() - start)
+            incremental_attempts.append(block.nonce + 1)
+
+        results.append({
+            "difficulty": difficulty,
+            "expected_attempts": 2 ** 256 / difficulty_to_target(difficulty),
+            "random_nonce_sec": summarize(random_times),
+            "incremental_nonce_sec": summarize(incremental_times),
+            "incremental_nonce_attempts": summarize(incremental_attempts)
+        })
+
+    return results
+
+
+def bench_block_size(seed, sizes, seconds):
+    results = []
+    for merkle in (False, True):
+        for size in sizes:
+            rng = random.Random(f"{seed}-{size}")
+            block = make_block(rng, size, merkle=merkle)
+            results.append({
+                "format": "merkle" if merkle else "legacy",
+                "transactions": size,
+                "hashes_per_sec": measure_hash_rate(block, seconds)
+            })
+    return results
+
+
+def bench_parallel(seed, difficulty, worker_counts, trials, transactions):
+    results = []
+    for workers in worker_counts:
+        rng = random.Random(f"{seed}-parallel")
+        times = []
+        for _ in range(trials):
+            block = make_block(rng, transactions)
+            start = timer()
+            parallel_p_o_w(block, difficulty_to_target(difficulty), workers)
+            times.append(timer() - start)
+
+        summary = summarize(times)
+        results.append({
+            "workers": workers,
+            "difficulty": difficulty,
+            "solve_sec": summary,
+            # Expected attempts per solution divided by the mean solve time
+            "effective_hashes_per_sec": 2 ** 256 / difficulty_to_target(difficulty) / summary["mean"]
+        })
+
+    baseline = results[0]["solve_sec"]["mean"]
+    for entry in results:
+        entry["speedup"] = baseline / entry["solve_sec"]["mean"]
+    return results
+
+
+def environment(seed):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "started_at": time.time()
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare hash rates with a baseline run.
+
+    Returns:
+        list: Descriptions of the metrics that regressed by more than tolerance
+    """
+    regressions = []
+
+    def check(name, current, previous):
+        if previous and current < previous * (1 - tolerance):
+            regressions.append(f"{name}: {current:,.0f} < {previous:,.0f} hashes/sec "
+                               f"({(1 - current / previous) * 100:.1f}% slower)")
+
+    check("hash_rate",
+          results["hash_rate"]["hashes_per_sec"]["p50"],
+          baseline.get("hash_rate", {}).get("hashes_per_sec", {}).get("p50"))
+
+    previous = {(e["format"], e["transactions"]): e["hashes_per_sec"] for e in baseline.get("block_size", [])}
+    for entry in results["block_size"]:
+        key = (entry["format"], entry["transactions"])
+        check(f"block_size[{key[0]}, {key[1]} txs]", entry["hashes_per_sec"], previous.get(key))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark proof of work")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for blocks and nonces")
+    parser.add_argument("--difficulties", type=difficulty_arg, nargs="+", default=[2, 3, 4], help="Difficulties for time to solution")
+    parser.add_argument("--trials", type=int, default=50, help="Solves per difficulty")
+    parser.add_argument("--transactions", type=int, default=15, help="Transactions per block")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 10, 100, 1000], help="Block sizes for the size sweep")
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="Worker counts for parallel scaling")
+    parser.add_argument("--parallel-difficulty", type=difficulty_arg, default=5, help="Difficulty for parallel scaling")
+    parser.add_argument("--parallel-trials", type=int, default=5, help="Solves per worker count")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Duration of each hash rate measurement")
+    parser.add_argument("--quick", action="store_true", help="Small run for smoke testing")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed hash rate drop vs baseline (fraction)")
+    args = parser.parse_args()
+
+    if args.workers is None:
+        cpus = os.cpu_count() or 1
+        args.workers = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+    if args.quick:
+        args.difficulties = [2, 3]
+        args.trials = 10
+        args.sizes = [0, 100]
+        args.workers = args.workers[:2]
+        args.parallel_difficulty = 4
+        args.parallel_trials = 2
+        args.seconds = 0.2
+
+    results = {"environment": environment(args.seed), "parameters": vars(args)}
+    results["hash_rate"] = bench_hash_rate(args.seed, args.transactions, args.seconds, repeats=5)
+    results["time_to_solution"] = bench_time_to_solution(args.seed, args.difficulties, args.trials, args.transactions)
+    results["block_size"] = bench_block_size(args.seed, args.sizes, args.seconds)
+    results["parallel"] = bench_parallel(args.seed, args.parallel_difficulty, args.workers,
+                                         args.parallel_trials, args.transactions)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+# Shared fixtures for the test suite
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to peer.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    """In-memory MongoDB database (mongomock), fresh for every test."""
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient().db
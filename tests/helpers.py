@@ -0,0 +1,56 @@
+# Helpers shared by the tests
+from Block import Block
+from mining import target_to_hex
+
+
+def transaction(n, user="u"):
+    """
+    Build a file transaction.
+
+    Args:
+        n (int): Number making the file name and key unique
+        user (str): Uploading user
+
+    Returns:
+        dict: Transaction data
+    """
+    return {
+        "user": user,
+        "v_file": f"file{n}.txt",
+        "file_key": f"key{n}",
+        "file_data": "ZGF0YQ==",
+        "file_size": 4
+    }
+
+
+def next_block(blockchain, transactions=None, legacy=False, chain=None):
+    """
+    Mine a block on top of a chain without adding it.
+
+    Args:
+        blockchain (Blockchain): Chain whose difficulty rules apply
+        transactions (list): Block transactions (default: one new transaction)
+        legacy (bool): Mine a legacy block (no target, difficulty 3)
+        chain (list): Blocks to extend (default: blockchain.chain)
+
+    Returns:
+        Block: Block with its hash set
+    """
+    chain = blockchain.chain if chain is None else chain
+    prev = chain[-1]
+    if transactions is None:
+        transactions = [transaction(len(chain))]
+
+    block = Block(len(chain), transactions, prev.hash, merkle=blockchain.merkle)
+    if not legacy:
+        block.target = target_to_hex(blockchain.expected_target(chain, len(chain)))
+        block.solve_time = 0.0
+    block.hash = blockchain.p_o_w_2(block)
+    return block
+
+
+def grow(blockchain, count, legacy=False):
+    """Mine and add count blocks to a chain."""
+    for _ in range(count):
+        block = next_block(blockchain, legacy=legacy)
+        assert blockchain.add_block(block, block.hash)
@@ -0,0 +1,55 @@
+# Tests for Block hashing: the miners' fast paths must reproduce generate_hash()
+import json
+
+import pytest
+
+from Block import Block
+from mining import target_to_hex
+from helpers import transaction
+
+NONCES = [0, 1, 9, 10, 123456789, 2 ** 64 - 1]
+
+# Every header format the chain accepts
+KINDS = ["legacy", "merkle", "target", "target_merkle"]
+
+
+def make_block(kind):
+    """Block in one of KINDS, with transactions that look like header fields."""
+    transactions = [
+        transaction(1),
+        dict(transaction(2, user='quote " and é'), nonce=0, index=7)
+    ]
+    if kind in ("legacy", "merkle"):
+        return Block(3, transactions, "ab" * 32, merkle=kind == "merkle")
+    return Block(3, transactions, "ab" * 32, merkle=kind == "target_merkle",
+                 target=target_to_hex(2 ** 240), solve_time=12.34)
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_hasher_matches_generate_hash(kind):
+    block = make_block(kind)
+    hash_nonce = block.hasher()
+    digest_nonce = block.hasher(raw=True)
+
+    for nonce in NONCES:
+        block.nonce = nonce
+        assert hash_nonce(nonce) == block.generate_hash()
+        assert digest_nonce(nonce) == bytes.fromhex(block.generate_hash())
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_hash_template_splits_preimage_at_nonce(kind):
+    block = make_block(kind)
+    block.nonce = 4242
+    prefix, suffix = block.hash_template()
+
+    assert prefix + b"4242" + suffix == json.dumps(block.hash_fields(), sort_keys=True).encode()
+
+
+def test_hasher_does_not_depend_on_stored_nonce():
+    block = make_block("target")
+    block.nonce = 77
+    hash_nonce = block.hasher()
+    block.nonce = 5
+
+    assert hash_nonce(5) == block.generate_hash()
@@ -0,0 +1,192 @@
+# Tests for ChainStore, BodyCache and loading a chain back from MongoDB
+import pytest
+
+from Block import Block
+from Blockchain import Blockchain
+from ChainStore import ChainStore, BodyCache
+from helpers import transaction, next_block, grow
+
+
+def make_blocks(count, start=0, tag=""):
+    """Build count linked blocks (hashes only, no proof of work)."""
+    blocks = []
+    prev_hash = "0"
+    for index in range(start, start + count):
+        block = Block(index, [transaction(index, user=f"u{tag}")], prev_hash)
+        block.hash = block.generate_hash()
+        prev_hash = block.hash
+        blocks.append(block)
+    return blocks
+
+
+@pytest.fixture
+def store(db):
+    return ChainStore(db)
+
+
+def test_save_and_load_in_chain_order(store):
+    blocks = make_blocks(5)
+    for block in reversed(blocks):
+        store.save_block(block)
+
+    assert [doc["hash"] for doc in store.load()] == [block.hash for block in blocks]
+    assert [doc["index"] for doc in store.load(3)] == [3, 4]
+    assert all("_id" not in doc for doc in store.load())
+
+
+def test_save_block_is_idempotent(store):
+    block = make_blocks(1)[0]
+    store.save_block(block)
+    store.save_block(block)
+
+    assert store.col.count_documents({}) == 1
+
+
+def test_load_headers_leaves_out_transactions(store):
+    for block in make_blocks(3):
+        store.save_block(block)
+
+    headers = store.load_headers(1)
+    assert [doc["index"] for doc in headers] == [1, 2]
+    assert all("transactions" not in doc for doc in headers)
+
+
+def test_tip(store):
+    assert store.tip() is None
+
+    blocks = make_blocks(4)
+    for block in blocks:
+        store.save_block(block)
+
+    assert store.tip() == {"index": 3, "hash": blocks[3].hash}
+
+
+def test_insert_block_first_writer_wins(store):
+    ours, theirs = make_blocks(1, tag="a")[0], make_blocks(1, tag="b")[0]
+
+    assert store.insert_block(ours)
+    assert not store.insert_block(theirs)
+    assert store.tip()["hash"] == ours.hash
+
+
+def test_insert_block_requires_stored_parent(store):
+    old = make_blocks(4, tag="a")
+    for block in old[:3]:
+        assert store.insert_block(block)
+
+    # Another process adopts a shorter chain; our old tip's parent is gone
+    store.replace_range(make_blocks(2, tag="b"))
+    assert not store.insert_block(old[3])
+    assert not store.insert_block(old[2])
+    assert store.tip()["index"] == 1
+
+
+def test_delete_blocks_matches_hashes(store):
+    blocks = make_blocks(3)
+    for block in blocks:
+        store.save_block(block)
+
+    store.delete_blocks(blocks[2:] + make_blocks(2, tag="b")[1:])
+    assert [doc["hash"] for doc in store.load()] == [block.hash for block in blocks[:2]]
+
+
+def test_replace_range_rewrites_fork_and_drops_old_tip(store):
+    for block in make_blocks(6, tag="a"):
+        store.save_block(block)
+
+    replacement = make_blocks(4, tag="b")[2:]
+    store.replace_range(replacement)
+
+    stored = store.load()
+    assert [doc["index"] for doc in stored] == [0, 1, 2, 3]
+    assert [doc["hash"] for doc in stored[2:]] == [block.hash for block in replacement]
+
+
+def test_load_transactions(store):
+    block = make_blocks(1)[0]
+    store.save_block(block)
+
+    assert store.load_transactions(block.hash) == block.transactions
+    assert store.load_transactions("missing") is None
+
+
+def test_load_transaction_fields_projects_transactions(store):
+    for block in make_blocks(3):
+        store.save_block(block)
+
+    docs = store.load_transaction_fields(("user", "file_key"), start=1)
+    assert [doc["index"] for doc in docs] == [1, 2]
+    assert docs[0]["transactions"] == [{"user": "u", "file_key": "key1"}]
+
+
+def test_body_cache_evicts_least_recently_used(store):
+    blocks = make_blocks(3)
+    for block in blocks:
+        store.save_block(block)
+
+    probe = BodyCache(store)
+    probe.put("x", blocks[0].transactions)
+    body_size = probe.size
+
+    # Room for exactly two bodies
+    cache = BodyCache(store, max_bytes=2 * body_size)
+    for block in blocks[:2]:
+        assert cache.get(block.hash) == block.transactions
+    cache.get(blocks[0].hash)  # blocks[1] is now least recently used
+    cache.get(blocks[2].hash)
+
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] <= stats["max_bytes"]
+    assert stats["misses"] == 3 and stats["hits"] == 1
+
+    cache.get(blocks[1].hash)
+    assert cache.stats()["misses"] == 4
+    assert cache.get("missing") == []
+
+
+def test_blockchain_reloads_persisted_chain(db):
+    blockchain = Blockchain(db=db, difficulty=1, target_block_time=0)
+    grow(blockchain, 3)
+
+    reloaded = Blockchain(db=db, difficulty=1, target_block_time=0)
+    assert [block.hash for block in reloaded.chain] == [block.hash for block in blockchain.chain]
+    assert reloaded.verified_height == 3
+    assert reloaded.get_headers(0) == blockchain.get_headers(0)
+    assert reloaded.check_chain_validity(reloaded.chain)
+
+
+def test_lazy_chain_loads_bodies_on_demand(db):
+    blockchain = Blockchain(db=db, difficulty=1, target_block_time=0)
+    grow(blockchain, 2)
+
+    lazy = Blockchain(db=db, lazy=True, difficulty=1, target_block_time=0)
+    assert lazy.body_cache.stats()["entries"] == 0
+    assert lazy.chain[2].transactions == blockchain.chain[2].transactions
+    assert lazy.body_cache.stats()["misses"] == 1
+
+
+def test_save_chain_to_db_drops_blocks_past_tip(db):
+    blockchain = Blockchain(db=db, difficulty=1, target_block_time=0)
+    grow(blockchain, 3)
+    blockchain.chain = blockchain.chain[:2]
+    blockchain.save_chain_to_db(1)
+
+    assert [doc["index"] for doc in blockchain.store.load()] == [0, 1]
+
+
+def test_refresh_drops_stored_blocks_not_linked_to_chain(db):
+    blockchain = Blockchain(db=db, shared=True, difficulty=1, target_block_time=0)
+    grow(blockchain, 2)
+    # Written by a process that validated against a parent replaced since
+    stray = next_block(blockchain)
+    stray.prev_hash = "f" * 64
+    stray.hash = blockchain.p_o_w_2(stray)
+    blockchain.store.col.insert_one(stray.to_dict())
+
+    assert not blockchain.refresh_from_db()
+    assert len(blockchain.chain) == 3
+    assert blockchain.store.tip()["index"] == 2
+
+    # The height is free again for a block on the real tip
+    grow(blockchain, 1)
+    assert blockchain.store.tip() == {"index": 3, "hash": blockchain.chain[3].hash}
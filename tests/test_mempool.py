@@ -0,0 +1,162 @@
+# Tests for Mempool and MongoMempool, which share one interface
+import time
+
+import pytest
+
+from Mempool import Mempool, MongoMempool, MempoolFull, EVICT_OLDEST
+from helpers import transaction
+
+
+@pytest.fixture(params=["memory", "mongo"])
+def make_pool(request):
+    """Factory for an empty pool of either kind."""
+    def make(**kwargs):
+        if request.param == "memory":
+            return Mempool(**kwargs)
+        return MongoMempool(request.getfixturevalue("db"), **kwargs)
+    return make
+
+
+def test_add_deduplicates_by_key(make_pool):
+    pool = make_pool()
+
+    assert pool.add(transaction(1))
+    assert not pool.add(transaction(1))
+    assert len(pool) == 1 and transaction(1) in pool
+
+
+def test_take_orders_by_priority_then_fifo(make_pool):
+    pool = make_pool(max_block_txs=3)
+    pool.add(transaction(1))
+    pool.add(transaction(2), priority=5)
+    pool.add(transaction(3))
+    pool.add(transaction(4), priority=5)
+
+    batch = pool.take()
+    assert [trans["file_key"] for trans in batch] == ["key2", "key4", "key1"]
+    assert len(pool) == 1
+    assert pool.take(limit=10) == [transaction(3)]
+
+
+def test_taken_batch_still_deduplicates(make_pool):
+    pool = make_pool()
+    pool.add(transaction(1))
+    pool.take()
+
+    assert not pool.add(transaction(1))
+
+
+def test_requeue_puts_batch_back_in_order(make_pool):
+    pool = make_pool(max_block_txs=2)
+    for n in range(4):
+        pool.add(transaction(n))
+
+    batch = pool.take()
+    assert pool.requeue(batch) == 2
+    assert [trans["file_key"] for trans in pool.list()] == ["key0", "key1", "key2", "key3"]
+
+
+def test_remove_drops_queued_and_taken(make_pool):
+    pool = make_pool(max_block_txs=1)
+    pool.add(transaction(1))
+    pool.add(transaction(2))
+    batch = pool.take()
+
+    assert pool.remove(batch + [transaction(2), transaction(9)]) == 2
+    assert len(pool) == 0
+    assert pool.requeue(batch) == 0
+
+
+def test_reject_policy_raises_when_full(make_pool):
+    pool = make_pool(max_size=2)
+    pool.add(transaction(1))
+    pool.add(transaction(2))
+
+    with pytest.raises(MempoolFull):
+        pool.add(transaction(3))
+    assert not pool.accepting()
+
+
+def test_evict_oldest_policy_drops_lowest_priority(make_pool):
+    pool = make_pool(max_size=2, policy=EVICT_OLDEST)
+    pool.add(transaction(1), priority=1)
+    pool.add(transaction(2))
+    pool.add(transaction(3), priority=1)
+
+    assert [trans["file_key"] for trans in pool.list()] == ["key1", "key3"]
+    assert pool.stats()["evicted"] == 1
+
+
+def test_unknown_policy_is_rejected(make_pool):
+    with pytest.raises(ValueError):
+        make_pool(policy="drop_everything")
+
+
+def test_page(make_pool):
+    pool = make_pool()
+    for n in range(5):
+        pool.add(transaction(n))
+
+    assert [trans["file_key"] for trans in pool.page(2, 2)] == ["key2", "key3"]
+    assert pool.page(4, 2) == []
+
+
+def test_renew_counts_claimed_transactions(make_pool):
+    pool = make_pool()
+    pool.add(transaction(1))
+    pool.add(transaction(2))
+    batch = pool.take()
+
+    assert pool.renew(batch) == 2
+    pool.remove(batch[:1])
+    assert pool.renew(batch) == 1
+
+
+def test_mongo_claims_expire_unless_renewed(db):
+    pool = MongoMempool(db, claim_ttl=0.2)
+    other = MongoMempool(db, claim_ttl=0.2)
+    pool.add(transaction(1))
+
+    batch = pool.take()
+    assert other.take() == []
+
+    # A live miner renews its claim, so nobody else gets the batch
+    time.sleep(0.15)
+    pool.renew(batch)
+    time.sleep(0.15)
+    assert other.take() == []
+
+    # A dead miner's claim is released after claim_ttl
+    time.sleep(0.25)
+    assert other.take() == batch
+
+
+def test_mongo_expired_claim_taken_over(db):
+    pool = MongoMempool(db, claim_ttl=0.1)
+    other = MongoMempool(db, claim_ttl=0.1)
+    pool.add(transaction(1))
+    batch = pool.take()
+
+    time.sleep(0.15)
+    taken_over = other.take()
+    assert taken_over == batch
+
+    # The first miner lost its claim and cannot touch the new one
+    assert pool.renew(batch) == 0
+    assert pool.requeue(batch) == 0
+    assert other.renew(taken_over) == 1
+    assert pool.take() == []
+
+
+def test_mongo_pools_share_state(db):
+    first = MongoMempool(db)
+    second = MongoMempool(db)
+
+    first.add(transaction(1))
+    assert transaction(1) in second
+    assert not second.add(transaction(1))
+
+    batch = second.take()
+    assert first.take() == []
+    first.remove(batch)
+    assert len(second) == 0
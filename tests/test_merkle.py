@@ -0,0 +1,87 @@
+# Tests for the Merkle tree helpers and Merkle-format blocks
+import pytest
+
+import merkle
+from Block import Block
+from Blockchain import Blockchain
+from helpers import transaction, next_block
+
+
+def leaves(count):
+    return [merkle.tx_hash(transaction(n)) for n in range(count)]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 4, 5, 7, 8, 13])
+def test_every_proof_verifies(count):
+    hashes = leaves(count)
+    root = merkle.merkle_root(hashes)
+
+    for position, leaf in enumerate(hashes):
+        assert merkle.verify_proof(leaf, merkle.merkle_proof(hashes, position), root)
+
+
+def test_proof_fails_for_other_leaf_or_root():
+    hashes = leaves(5)
+    root = merkle.merkle_root(hashes)
+    proof = merkle.merkle_proof(hashes, 2)
+
+    assert not merkle.verify_proof(hashes[3], proof, root)
+    assert not merkle.verify_proof(hashes[2], proof, merkle.merkle_root(hashes[:4]))
+    assert not merkle.verify_proof(hashes[2], [{"side": "left"}], root)
+
+
+def test_odd_leaf_is_promoted_not_duplicated():
+    a, b, c = leaves(3)
+    pair = merkle._hash_pair(a, b)
+
+    assert merkle.merkle_root([a, b, c]) == merkle._hash_pair(pair, c)
+    assert merkle.merkle_root([a, b, c]) != merkle.merkle_root([a, b, c, c])
+    # The promoted leaf has no sibling on the first level
+    assert merkle.merkle_proof([a, b, c], 2) == [{"hash": pair, "side": "left"}]
+
+
+def test_leaf_and_node_hashes_are_separated():
+    a, b = leaves(2)
+
+    assert merkle.merkle_root([a]) == a
+    assert merkle.merkle_root([]) == merkle.EMPTY_ROOT
+    # Leaves are hashed with 0x00 and inner nodes with 0x01 in front
+    raw = bytes.fromhex(a) + bytes.fromhex(b)
+    assert merkle.merkle_root([a, b]) == merkle.sha256(b"\x01" + raw).hexdigest()
+    assert merkle.merkle_root([a, b]) != merkle.sha256(b"\x00" + raw).hexdigest()
+
+
+def test_proof_position_out_of_range():
+    with pytest.raises(IndexError):
+        merkle.merkle_proof(leaves(2), 2)
+
+
+def test_verify_transactions_rejects_tampered_body():
+    block = Block(1, [transaction(n) for n in range(3)], "ab" * 32, merkle=True)
+    assert block.verify_transactions()
+
+    block.transactions = [transaction(0), transaction(1), transaction(9)]
+    assert not block.verify_transactions()
+    block.transactions = [transaction(0), transaction(1)]
+    assert not block.verify_transactions()
+
+
+def test_tampered_merkle_block_is_not_added():
+    blockchain = Blockchain(merkle=True, difficulty=1, target_block_time=0)
+    block = next_block(blockchain, [transaction(1), transaction(2)])
+    assert block.merkle_root is not None
+    block.transactions = [transaction(1), transaction(3)]
+
+    assert not blockchain.add_block(block, block.hash)
+    assert len(blockchain.chain) == 1
+
+
+def test_blockchain_proof_verifies_against_header():
+    blockchain = Blockchain(merkle=True, difficulty=1, target_block_time=0)
+    block = next_block(blockchain, [transaction(n) for n in range(5)])
+    assert blockchain.add_block(block, block.hash)
+
+    proof = blockchain.merkle_proof(1, 3)
+    assert proof["transaction"] == transaction(3)
+    assert merkle.verify_proof(proof["tx_hash"], proof["proof"], proof["block"]["merkle_root"])
+    assert blockchain.merkle_proof(1, 5) is None
@@ -0,0 +1,41 @@
+# Tests for the proof-of-work searches: every result must be a hash that
+# generate_hash() reproduces and that is below the block's target
+import pytest
+
+from Block import Block
+from Blockchain import Blockchain
+from mining import parallel_p_o_w, difficulty_to_target, target_to_hex
+from helpers import transaction
+
+TARGET = difficulty_to_target(2)
+
+
+def make_block():
+    return Block(1, [transaction(1)], "ab" * 32, target=target_to_hex(TARGET), solve_time=0.0)
+
+
+@pytest.mark.parametrize("workers, chunk_size", [(1, 1000), (2, 50), (3, 7)])
+def test_parallel_p_o_w_result_matches_generate_hash(workers, chunk_size):
+    block = make_block()
+    nonce, get_hash = parallel_p_o_w(block, TARGET, workers=workers, chunk_size=chunk_size)
+
+    block.nonce = nonce
+    assert get_hash == block.generate_hash()
+    assert int(get_hash, 16) < TARGET
+
+
+def test_parallel_p_o_w_can_be_stopped():
+    block = make_block()
+
+    assert parallel_p_o_w(block, 1, workers=2, stop=lambda: True) is None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_blockchain_p_o_w_result_matches_generate_hash(workers):
+    blockchain = Blockchain(workers=workers, difficulty=2, target_block_time=0)
+    for p_o_w in (blockchain.p_o_w, blockchain.p_o_w_2, blockchain.p_o_w_parallel):
+        block = make_block()
+        get_hash = p_o_w(block)
+
+        assert get_hash == block.generate_hash()
+        assert blockchain.is_valid(block, get_hash)
@@ -0,0 +1,321 @@
+# Peer tests: consensus, header-first sync and block checks, served by
+# peer.app through the Flask test client instead of real HTTP
+import threading
+import time
+
+import pytest
+
+import metrics
+import peer
+from Blockchain import Blockchain
+from helpers import transaction, next_block, grow
+
+
+class TestResponse:
+    """The parts of requests.Response the peer code uses."""
+
+    __test__ = False
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self._data = response.get_json()
+
+    def json(self):
+        return self._data
+
+
+class FakeClient:
+    """
+    Stand-in for PeerClient that serves every peer URL from peer.app,
+    with peer.blockchain swapped for that peer's node.
+    """
+
+    def __init__(self, nodes, missing=()):
+        self.nodes = nodes
+        self.missing = set(missing)  # paths answered with 404
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def _call(self, peer_url, method, path, **kwargs):
+        with self._lock:
+            self.requests.append((peer_url, path, kwargs.get("params")))
+            client = peer.app.test_client()
+            served = peer.blockchain
+            peer.blockchain = self.nodes[peer_url]
+            try:
+                if path in self.missing:
+                    response = client.get("/no_such_endpoint")
+                elif method == "get":
+                    response = client.get(path, query_string=kwargs.get("params"))
+                else:
+                    response = client.post(path, json=kwargs.get("json"))
+                return TestResponse(response)
+            finally:
+                peer.blockchain = served
+
+    def get(self, peer_url, path, **kwargs):
+        return self._call(peer_url, "get", path, **kwargs)
+
+    def post(self, peer_url, path, **kwargs):
+        return self._call(peer_url, "post", path, **kwargs)
+
+    def broadcast(self, peers, path, payload):
+        return {peer_url: self.post(peer_url, path, json=payload) for peer_url in peers}
+
+
+def make_node(genesis_from=None):
+    """New node with easy targets, sharing genesis with another node."""
+    node = Blockchain(difficulty=1, target_block_time=0, header_store=True)
+    if genesis_from is not None:
+        node.chain = list(genesis_from.chain[:1])
+        node.enable_header_store()
+    return node
+
+
+def copy_blocks(node, source, end):
+    """Add source's blocks up to height end to node."""
+    for block in source.chain[len(node.chain):end]:
+        assert node.add_block(block, block.hash)
+
+
+def connect(node, missing=(), **others):
+    """Let node reach the other nodes by name (and no one else)."""
+    node.client = FakeClient(others, missing)
+    for name in others:
+        node.register_peer(name)
+    return node.client
+
+
+def hashes(chain):
+    return [block.hash for block in chain]
+
+
+@pytest.fixture
+def light_and_heavy():
+    """Six easy target blocks against two legacy blocks (difficulty 3)."""
+    light = make_node()
+    heavy = make_node(light)
+    grow(light, 6)
+    grow(heavy, 2, legacy=True)
+    assert heavy.chain_work(heavy.chain) > light.chain_work(light.chain)
+    return light, heavy
+
+
+@pytest.fixture
+def served(monkeypatch):
+    """Node answering direct requests to peer.app."""
+    node = make_node()
+    monkeypatch.setattr(peer, "blockchain", node)
+    return node
+
+
+def post_block(block_data):
+    return peer.app.test_client().post("/add_block", json=block_data)
+
+
+def test_heavier_shorter_chain_wins(light_and_heavy):
+    light, heavy = light_and_heavy
+    connect(light, heavy=heavy)
+    # key1 and key2 are confirmed again by the heavy chain
+    orphaned = [trans for block in light.chain[3:] for trans in block.transactions]
+
+    assert light.consensus()
+    assert hashes(light.chain) == hashes(heavy.chain)
+    assert len(light.headers) == 3 and light.headers.hash_at(2) == heavy.chain[2].hash
+    assert light.verified_height == 2
+    assert len(light.pending) == len(orphaned)
+    assert all(trans in light.pending for trans in orphaned)
+
+
+def test_lazy_node_restores_orphaned_transactions(db):
+    # Orphaned bodies are loaded from the DB, which the reorg overwrites
+    grow(Blockchain(db=db, difficulty=1, target_block_time=0), 4)
+    light = Blockchain(db=db, lazy=True, difficulty=1, target_block_time=0)
+    assert light.body_cache.stats()["entries"] == 0
+    heavy = make_node(light)
+    grow(heavy, 2, legacy=True)
+    connect(light, heavy=heavy)
+    orphaned = [transaction(3), transaction(4)]
+
+    assert light.consensus()
+    assert hashes(light.chain) == hashes(heavy.chain)
+    assert len(light.pending) == 2
+    assert all(trans in light.pending for trans in orphaned)
+
+
+def test_own_heavier_chain_is_kept(light_and_heavy):
+    light, heavy = light_and_heavy
+    before = hashes(heavy.chain)
+    connect(heavy, light=light)
+
+    assert heavy.sync_peer_chain("light") is None
+    assert not heavy.consensus()
+    assert hashes(heavy.chain) == before
+
+
+def test_sync_downloads_only_bodies_past_fork():
+    ahead = make_node()
+    grow(ahead, 5)
+    behind = make_node(ahead)
+    copy_blocks(behind, ahead, 3)
+    client = connect(behind, ahead=ahead)
+
+    candidate = behind.sync_peer_chain("ahead")
+    assert hashes(candidate) == hashes(ahead.chain)
+    # The shared prefix is our own blocks, not downloaded copies
+    assert candidate[2] is behind.chain[2]
+    starts = [params["start"] for _, path, params in client.requests if path == "/blocks"]
+    assert starts == [3]
+
+    assert behind.consensus()
+    assert hashes(behind.chain) == hashes(ahead.chain)
+
+
+def test_headers_without_header_store():
+    plain = Blockchain(difficulty=1, target_block_time=0)
+    grow(plain, 4)
+    packed = make_node(plain)
+    copy_blocks(packed, plain, 5)
+
+    assert plain.headers is None
+    assert plain.get_headers(0) == packed.get_headers(0)
+    assert plain.get_headers(2, 1) == packed.get_headers(2, 1)
+
+    behind = make_node(plain)
+    connect(behind, plain=plain)
+    assert behind.consensus()
+    assert hashes(behind.chain) == hashes(plain.chain)
+
+
+def test_sync_falls_back_to_full_chain(light_and_heavy):
+    light, heavy = light_and_heavy
+    client = connect(light, missing={"/headers"}, heavy=heavy)
+
+    assert light.consensus()
+    assert hashes(light.chain) == hashes(heavy.chain)
+    assert [path for _, path, _ in client.requests] == ["/headers", "/chain"]
+
+
+def test_invalid_candidate_is_rejected(light_and_heavy):
+    light, heavy = light_and_heavy
+    before = hashes(light.chain)
+    heavy.chain[2].transactions = [transaction(99, user="forger")]
+    connect(light, heavy=heavy)
+
+    assert not light.consensus()
+    assert hashes(light.chain) == before
+    assert len(light.headers) == len(before)
+
+
+@pytest.mark.parametrize("field, value", [
+    ("nonce", 2 ** 64),
+    ("nonce", -1),
+    ("nonce", "7"),
+    ("timestamp", "x"),
+    ("transactions", {"user": "u"}),
+    ("prev_hash", 42),
+    ("target", "zz"),
+])
+def test_add_block_rejects_malformed_fields(served, field, value):
+    block_data = next_block(served).to_dict()
+    block_data[field] = value
+
+    assert post_block(block_data).status_code == 400
+    assert len(served.chain) == 1 and len(served.headers) == 1
+
+
+@pytest.mark.parametrize("payload", [[1, 2], "block", {"index": 1}])
+def test_add_block_rejects_malformed_payloads(served, payload):
+    assert post_block(payload).status_code == 400
+    assert len(served.chain) == 1 and len(served.headers) == 1
+
+
+def test_add_block_rejects_missing_hash(served):
+    block_data = next_block(served).to_dict()
+    del block_data["hash"]
+
+    assert post_block(block_data).status_code == 400
+    assert len(served.chain) == 1
+
+
+def test_add_block_accepts_valid_block(served):
+    block = next_block(served)
+
+    assert post_block(block.to_dict()).status_code == 201
+    assert served.chain[-1].hash == block.hash and served.headers.hash_at(1) == block.hash
+
+
+def test_add_block_rejects_block_from_the_future(served):
+    block = next_block(served)
+    block.timestamp = time.time() + 2 * Blockchain.max_future_drift
+    block.hash = served.p_o_w_2(block)
+
+    assert post_block(block.to_dict()).status_code == 400
+    assert len(served.chain) == 1
+
+
+def test_add_block_rejects_timestamp_before_median(served):
+    grow(served, 3)
+    block = next_block(served)
+    block.timestamp = served.chain[1].timestamp - 1
+    block.hash = served.p_o_w_2(block)
+
+    assert post_block(block.to_dict()).status_code == 400
+    assert len(served.chain) == 4
+
+
+def claim_solve_time(blockchain, block, solve_time):
+    """Record a solve time in a mined block and mine it again."""
+    block.solve_time = solve_time
+    block.hash = blockchain.p_o_w_2(block)
+    return block
+
+
+def test_add_block_rejects_inflated_solve_time(served):
+    # Ends further in the future than the clocks may disagree
+    block = claim_solve_time(served, next_block(served), 2 * Blockchain.max_future_drift)
+    assert post_block(block.to_dict()).status_code == 400
+
+    # Within the drift, but then the next block cannot start before it ends
+    first = claim_solve_time(served, next_block(served), Blockchain.max_future_drift - 5)
+    assert post_block(first.to_dict()).status_code == 201
+    second = next_block(served)
+    assert second.timestamp < first.timestamp + first.solve_time
+    assert post_block(second.to_dict()).status_code == 400
+    assert len(served.chain) == 2
+
+
+def test_inflated_solve_times_do_not_lower_difficulty():
+    node = Blockchain(difficulty=2, target_block_time=10, retarget_window=2)
+    for _ in range(8):
+        block = claim_solve_time(node, next_block(node), 290)
+        node.add_block(block, block.hash)
+        block = claim_solve_time(node, next_block(node), 10)
+        node.add_block(block, block.hash)
+
+    assert len(node.chain) == 2
+    assert node.difficulty == 2
+
+
+def test_add_blocks_accepts_valid_prefix(served):
+    first = next_block(served)
+    second = next_block(served, chain=served.chain + [first])
+    bad = next_block(served, chain=served.chain + [first, second])
+    bad.nonce += 1
+
+    response = peer.app.test_client().post(
+        "/add_blocks", json={"blocks": [block.to_dict() for block in (first, second, bad)]})
+    assert response.status_code == 201
+    assert response.get_json()["added"] == 2
+    assert hashes(served.chain[1:]) == [first.hash, second.hash]
+
+
+def test_peer_metric_labels_are_bounded(monkeypatch):
+    monkeypatch.setattr(metrics, "_peer_labels", set())
+    labels = [metrics.peer_label(f"http://10.0.0.{n}:8800/") for n in range(metrics.MAX_PEER_LABELS + 5)]
+
+    assert labels[0] == "http://10.0.0.0:8800"
+    assert len(set(labels)) == metrics.MAX_PEER_LABELS + 1
+    assert labels[-1] == "other"
+    assert metrics.peer_label("http://10.0.0.1:8800") == "http://10.0.0.1:8800"
+    assert metrics.peer_label("http://" + "a" * 500) == "other"
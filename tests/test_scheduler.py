@@ -0,0 +1,78 @@
+# Tests for MiningScheduler
+import time
+
+import pytest
+
+from Blockchain import Blockchain
+from MiningScheduler import MiningScheduler
+from helpers import transaction
+
+
+class FlakyLease:
+    """Lease whose first acquire() fails as if the DB were unreachable."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def acquire(self):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionError("DB unreachable")
+        return True
+
+    def release(self):
+        pass
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def blockchain():
+    return Blockchain(difficulty=1, target_block_time=0)
+
+
+def start(scheduler):
+    scheduler.start()
+    scheduler.trigger()
+    return scheduler
+
+
+def test_scheduler_survives_errors(blockchain):
+    blockchain.add_pending(transaction(1))
+    scheduler = start(MiningScheduler(blockchain, threshold=0, interval=0, poll=0.01, lease=FlakyLease()))
+    try:
+        # The failed acquire() does not end the thread; the next poll mines
+        wait_for(lambda: scheduler.status()["mined"] == 1)
+        assert scheduler.status()["running"]
+        assert len(blockchain.chain) == 2
+    finally:
+        scheduler.stop(timeout=5)
+
+
+def test_scheduler_announces_the_block_it_mined(blockchain, monkeypatch):
+    blockchain.add_pending(transaction(1))
+    genesis = blockchain.chain[:1]
+    mine = blockchain.mine
+
+    def mine_then_reorg(**kwargs):
+        # Consensus adopts a shorter chain before the scheduler looks
+        block = mine(**kwargs)
+        blockchain.chain = genesis
+        return block
+
+    announced = []
+    monkeypatch.setattr(blockchain, "mine", mine_then_reorg)
+    monkeypatch.setattr(blockchain, "announce_block", announced.append)
+    scheduler = start(MiningScheduler(blockchain, threshold=0, interval=0, poll=0.01))
+    try:
+        wait_for(lambda: scheduler.status()["mined"] == 1)
+        assert scheduler.status()["running"]
+        assert [block.index for block in announced] == [1]
+        assert scheduler.status()["last_job"]["hash"] == announced[0].hash
+    finally:
+        scheduler.stop(timeout=5)